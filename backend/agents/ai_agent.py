@@ -5,7 +5,7 @@ Handles conversation and travel planning
 import json
 import logging
 import time
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime
 
 try:
@@ -22,6 +22,27 @@ from .prompts import (
     create_search_queries
 )
 from .search_tool import SearchTool
+from .speculative_search import SpeculativeSearches
+from .json_repair import parse_json, OK, REPAIRED, FAILED
+from .json_stream import ArrayItemStream
+from .context import AgentContext
+from . import plan_edit
+from .plan_edit import EditTarget, apply_operations, validate_operations
+from .schemas import (
+    OUTLINE_SCHEMA,
+    DAY_SCHEMA,
+    EDIT_PATCH_SCHEMA,
+    EDIT_SECTIONS_SCHEMA,
+    LOCATE_SCHEMA,
+    json_generation_config,
+    validate_outline,
+    validate_day,
+    validate_activity,
+    validate_changes
+)
+from . import instrumentation as llm_metrics
+from utils.circuit_breaker import CircuitOpenError
+from utils.tracing import span, traced
 
 logger = logging.getLogger(__name__)
 
@@ -30,7 +51,9 @@ class TravelAgent:
     """AI Travel Planning Agent using Gemini"""
     
     def __init__(self, api_key: str, model_name: str = "gemini-2.0-flash-lite",
-                 temperature: float = 0.7, max_tokens: int = 10000):
+                 temperature: float = 0.7, max_tokens: int = 10000,
+                 search_tool: Optional[SearchTool] = None, model=None,
+                 structured_output: bool = True, speculative_search: bool = True):
         """
         Initialize Travel Agent
         
@@ -39,14 +62,26 @@ class TravelAgent:
             model_name: Gemini model name
             temperature: Generation temperature
             max_tokens: Maximum tokens
+            search_tool: Web search tool (default: uncached SearchTool)
+            model: Object with Gemini's generate_content interface, used
+                instead of a real Gemini model (offline stubs)
+            structured_output: Send response schemas with the outline, day
+                and edit requests (Gemini JSON mode)
+            speculative_search: Start the destination search during intent
+                analysis when the message names a known destination
         """
         self.api_key = api_key
         self.model_name = model_name
         self.temperature = temperature
         self.max_tokens = max_tokens
+        self.structured_output = structured_output
         
         # Initialize Gemini
-        if genai:
+        if model is not None:
+            self.model = model
+            self.request_timeout = 10000
+            self.use_gemini = True
+        elif genai:
             genai.configure(api_key=api_key)
             self.model = genai.GenerativeModel(
                 model_name="gemini-2.0-flash-lite",
@@ -64,19 +99,54 @@ class TravelAgent:
             self.use_gemini = False
         
         # Initialize search tool
-        self.search = SearchTool(max_results=5)
-        
-        # Conversation state
-        self.conversation_history = []
+        self.search = search_tool or SearchTool(max_results=5)
+        # Without a model intent analysis is instant, nothing to overlap
+        self.speculative_searches = (
+            SpeculativeSearches(self._run_destination_search)
+            if speculative_search and self.model is not None else None
+        )
+        # Shared by every request: per-request state lives in AgentContext
+    
+    def _generate(self, prompt: str, call_site: str, mode: str, schema: Optional[Dict] = None):
+        """
+        Call Gemini (non-streaming) with latency/size/token instrumentation
+
+        With a response schema (and structured output enabled) Gemini is
+        asked for JSON of that shape instead of free text.
+        """
+        if schema is not None and self.structured_output:
+            return llm_metrics.generate(self.model, prompt, call_site, mode,
+                                        generation_config=json_generation_config(schema))
+        return llm_metrics.generate(self.model, prompt, call_site, mode)
     
-    def chat(self, user_message: str, conversation_history: Optional[List[Dict]] = None, current_plan: Optional[Dict] = None) -> Dict:
+    def _generate_stream(self, prompt: str, call_site: str, mode: str, schema: Optional[Dict] = None):
+        """Call Gemini with streaming, yielding chunks, with instrumentation"""
+        if schema is not None and self.structured_output:
+            return llm_metrics.generate_stream(self.model, prompt, call_site, mode,
+                                               generation_config=json_generation_config(schema))
+        return llm_metrics.generate_stream(self.model, prompt, call_site, mode)
+    
+    @staticmethod
+    def _drain(events) -> Any:
+        """Run an event generator to the end, returning its return value"""
+        while True:
+            try:
+                next(events)
+            except StopIteration as stop:
+                return stop.value
+    
+    def chat(self, user_message: str, conversation_history: Optional[List[Dict]] = None, current_plan: Optional[Dict] = None,
+             conversation_summary: str = '', intent_analysis: Optional[Dict] = None) -> Dict:
         """
         Main chat method with LLM-based intent detection
         
         Args:
             user_message: User's message (can include @plan, @ask, @edit_plan)
-            conversation_history: Previous conversation
+            conversation_history: Previous conversation (turns not covered by the summary)
             current_plan: Current plan data for @edit_plan mode
+            conversation_summary: Rolling summary of the earlier turns
+            intent_analysis: Result of analyze_intent() for this message, if
+                the caller already has it
             
         Returns:
             Response dict with message, has_plan, plan_data, mode
@@ -87,13 +157,12 @@ class TravelAgent:
         logger.info(f"History length: {len(conversation_history) if conversation_history else 0}")
         logger.info(f"{'='*80}\n")
         
-        # Update conversation history
-        if conversation_history:
-            self.conversation_history = conversation_history
-            logger.info(f"📚 Updated conversation history ({len(conversation_history)} messages)")
+        ctx = AgentContext.create(user_message, conversation_history, current_plan,
+                                  conversation_summary, intent_analysis)
         
         # Use LLM to analyze intent and determine mode
-        intent_analysis = self._analyze_user_intent(user_message, current_plan)
+        intent_analysis = ctx.intent or self._analyze_user_intent(ctx)
+        ctx = ctx.with_intent(intent_analysis)
         logger.info(f"🎯 Intent Analysis:")
         logger.info(f"   Mode: {intent_analysis['mode']}")
         logger.info(f"   Confidence: {intent_analysis.get('confidence', 'N/A')}")
@@ -117,25 +186,30 @@ class TravelAgent:
         if mode == 'plan':
             # Pass requirements from intent analysis if available
             requirements = intent_analysis.get('requirements')
-            return self._handle_plan_mode(clean_message, requirements=requirements)
+            return self._handle_plan_mode(ctx, clean_message, requirements=requirements)
         elif mode == 'edit_plan':
-            return self._handle_edit_plan_mode(clean_message, current_plan)
+            return self._handle_edit_plan_mode(ctx, clean_message)
         else:  # ask mode
-            return self._handle_ask_mode(clean_message, current_plan)
+            return self._handle_ask_mode(ctx, clean_message)
     
-    def chat_stream(self, user_message: str, conversation_history: Optional[List[Dict]] = None, current_plan: Optional[Dict] = None):
+    def chat_stream(self, user_message: str, conversation_history: Optional[List[Dict]] = None, current_plan: Optional[Dict] = None,
+                    conversation_summary: str = '', intent_analysis: Optional[Dict] = None):
         """
         Streaming version of chat method - yields chunks as they're generated
         
         Args:
             user_message: User's message
-            conversation_history: Previous conversation
+            conversation_history: Previous conversation (turns not covered by the summary)
             current_plan: Current plan data for @edit_plan mode
+            conversation_summary: Rolling summary of the earlier turns
+            intent_analysis: Result of analyze_intent() for this message, if
+                the caller already has it
             
         Yields:
             Dict chunks with type and content:
             - {'type': 'thinking', 'content': 'analyzing|processing|searching|generating'}
             - {'type': 'text', 'content': 'text chunk'}
+            - {'type': 'activity', 'content': {'day': 1, 'index': 0, 'activity': {...}}}
             - {'type': 'plan', 'content': {plan_data}}
         """
         logger.info(f"\n{'='*80}")
@@ -143,15 +217,15 @@ class TravelAgent:
         logger.info(f"User message: '{user_message}'")
         logger.info(f"{'='*80}\n")
         
-        # Update conversation history
-        if conversation_history:
-            self.conversation_history = conversation_history
+        ctx = AgentContext.create(user_message, conversation_history, current_plan,
+                                  conversation_summary, intent_analysis)
         
         # Yield thinking status
         yield {'type': 'thinking', 'content': 'analyzing'}
         
-        # Analyze intent
-        intent_analysis = self._analyze_user_intent(user_message, current_plan)
+        # Analyze intent (unless the caller already did)
+        intent_analysis = ctx.intent or self._analyze_user_intent(ctx)
+        ctx = ctx.with_intent(intent_analysis)
         mode = intent_analysis['mode']
         
         yield {'type': 'thinking', 'content': 'processing'}
@@ -176,16 +250,17 @@ class TravelAgent:
         if mode == 'plan':
             requirements = intent_analysis.get('requirements')
             logger.info(f"   → Calling _handle_plan_mode_stream")
-            yield from self._handle_plan_mode_stream(clean_message, requirements)
+            yield from self._handle_plan_mode_stream(ctx, clean_message, requirements)
         elif mode == 'edit_plan':
             logger.info(f"   → Calling _handle_edit_plan_mode_stream")
-            yield from self._handle_edit_plan_mode_stream(clean_message, current_plan)
+            yield from self._handle_edit_plan_mode_stream(ctx, clean_message)
         else:  # ask mode
             logger.info(f"   → Calling _handle_ask_mode_stream")
-            yield from self._handle_ask_mode_stream(clean_message, current_plan)
+            yield from self._handle_ask_mode_stream(ctx, clean_message)
     
-    def _handle_ask_mode_stream(self, message: str, current_plan: Optional[Dict] = None):
+    def _handle_ask_mode_stream(self, ctx: AgentContext, message: str):
         """Streaming version of ask mode handler with plan context"""
+        current_plan = ctx.current_plan
         logger.info("❓ ASK MODE STREAM - Starting")
         logger.info(f"   Message: '{message}'")
         logger.info(f"   Has current_plan: {current_plan is not None}")
@@ -255,8 +330,7 @@ VÍ DỤ TRẢ LỜI TỐT:
                 
                 try:
                     logger.info("   🤖 Calling Gemini for answer...")
-                    response = self.model.generate_content(prompt, stream=True)
-                    for chunk in response:
+                    for chunk in self._generate_stream(prompt, 'ask_stream', 'ask'):
                         if chunk.text:
                             yield {'type': 'text', 'content': chunk.text}
                     logger.info("   ✅ Answer generated successfully")
@@ -265,6 +339,7 @@ VÍ DỤ TRẢ LỜI TỐT:
                     yield {'type': 'text', 'content': f"⚠️ Xin lỗi, có lỗi khi xử lý câu hỏi. Vui lòng thử lại."}
             else:
                 # Fallback
+                llm_metrics.record_fallback('ask_stream', 'ask', 'search_results')
                 answer = f"Đây là thông tin về '{message}':\n\n{formatted_results}"
                 for word in answer.split(' '):
                     yield {'type': 'text', 'content': word + ' '}
@@ -279,8 +354,9 @@ VÍ DỤ TRẢ LỜI TỐT:
         finally:
             logger.info("   ✅ Ask mode stream completed")
     
-    def _handle_edit_plan_mode_stream(self, message: str, current_plan: Optional[Dict]):
+    def _handle_edit_plan_mode_stream(self, ctx: AgentContext, message: str):
         """Streaming version of edit plan mode handler - Actually modifies the plan"""
+        current_plan = ctx.current_plan
         logger.info("✏️ EDIT_PLAN MODE STREAM - Starting")
         logger.info(f"   Message: '{message}'")
         logger.info(f"   Has current_plan: {current_plan is not None}")
@@ -299,58 +375,16 @@ VÍ DỤ TRẢ LỜI TỐT:
             if self.use_gemini and self.model:
                 logger.info("   🤖 Calling Gemini to modify plan...")
                 
-                # Create a concise summary of current plan for context
-                plan_summary = {
-                    'plan_name': current_plan.get('plan_name'),
-                    'destination': current_plan.get('destination'),
-                    'duration_days': current_plan.get('duration_days'),
-                    'budget': current_plan.get('budget'),
-                    'itinerary_count': len(current_plan.get('itinerary', [])),
-                    'itinerary': current_plan.get('itinerary', [])  # Include full itinerary
-                }
+                # Stage 1: which days the request is about
+                target = self._locate_edit(message, current_plan)
+                logger.info(f"   🎯 Edit target ({target.source}): days {target.days}, "
+                            f"activities {target.activities}")
+                if not target.days:
+                    yield {'type': 'text', 'content': '⚠️ Kế hoạch này chưa có lịch trình để chỉnh sửa.'}
+                    return
                 
-                prompt = f"""Bạn là trợ lý du lịch. Người dùng muốn chỉnh sửa kế hoạch hiện tại.
-
-KẾ HOẠCH HIỆN TẠI:
-```json
-{json.dumps(plan_summary, ensure_ascii=False, indent=2)}
-```
-
-YÊU CẦU CHỈNH SỬA: {message}
-
-HÃY:
-1. Phân tích yêu cầu: Người dùng muốn thay đổi gì? (hoạt động nào, ngày nào)
-2. Tìm hoạt động cần thay đổi trong lịch trình
-3. Tạo hoạt động mới thay thế phù hợp với yêu cầu
-4. Trả về JSON với cấu trúc:
-
-{{
-  "understanding": "Tóm tắt ngắn gọn hiểu yêu cầu của người dùng",
-  "changes": [
-    {{
-      "day": 1,
-      "activity_index": 0,
-      "action": "replace",
-      "old_activity": "Tên hoạt động cũ",
-      "new_activity": {{
-        "time": "07:00",
-        "type": "breakfast",
-        "title": "Tên quán/hoạt động mới",
-        "description": "Mô tả chi tiết, địa chỉ",
-        "location": "Địa chỉ cụ thể",
-        "cost": 50000
-      }}
-    }}
-  ],
-  "explanation": "Giải thích ngắn gọn những gì đã thay đổi và lý do"
-}}
-
-LƯU Ý:
-- CHỈ thay đổi hoạt động được yêu cầu, giữ nguyên các hoạt động khác
-- Hoạt động mới phải phù hợp với ngân sách và địa điểm
-- Cung cấp địa chỉ cụ thể và giá tiền thực tế
-- CHỈ TRẢ VỀ JSON, KHÔNG TEXT KHÁC
-"""
+                # Stage 2: only those days go to the model, patch operations come back
+                prompt = self._edit_patch_prompt(message, current_plan, target)
                 
                 yield {'type': 'thinking', 'content': 'creating_plan'}
                 
@@ -360,55 +394,54 @@ LƯU Ý:
                     retry_delay = 15
                     response_data = None
                     
+                    def validate(data):
+                        operations, dropped = validate_operations(data, current_plan, target.days)
+                        if not operations:
+                            return None, False
+                        explanation = data.get('explanation')
+                        return dict(data, operations=operations,
+                                    explanation=explanation if isinstance(explanation, str) else ''), dropped
+                    
                     for attempt in range(max_retries):
                         try:
-                            response = self.model.generate_content(prompt)
+                            response = self._generate(prompt, 'edit_plan_stream', 'edit_plan',
+                                                      schema=EDIT_PATCH_SCHEMA)
                             response_text = response.text.strip()
                             logger.debug(f"   Gemini response: {response_text[:200]}...")
                             
-                            # Parse JSON response
-                            response_data = self._parse_json_response(response_text)
+                            # Parse (and repair) JSON response
+                            response_data = self._parse_payload(response_text, 'edit_plan_stream', 'edit_plan',
+                                                                validate)
                             break  # Success
                             
+                        except CircuitOpenError:
+                            # Gemini is down: fall back now instead of waiting out the retries
+                            raise
                         except Exception as retry_error:
                             if attempt < max_retries - 1:
                                 logger.warning(f"   ⚠️ Attempt {attempt + 1} failed: {str(retry_error)}. Retrying in {retry_delay}s...")
+                                llm_metrics.record_retry('edit_plan_stream', 'edit_plan')
                                 time.sleep(retry_delay)
                             else:
                                 logger.error(f"   ❌ All {max_retries} attempts failed")
                                 raise
                     
-                    if not response_data or 'changes' not in response_data:
+                    if not response_data:
                         logger.error("   ❌ Invalid response format from Gemini")
                         yield {'type': 'text', 'content': '⚠️ Xin lỗi, tôi không thể xử lý yêu cầu chỉnh sửa này. Vui lòng thử lại với yêu cầu cụ thể hơn.'}
                         return
                     
-                    # Apply changes to current plan
-                    modified_plan = current_plan.copy()
-                    modified_plan['itinerary'] = json.loads(json.dumps(current_plan.get('itinerary', [])))  # Deep copy
-                    
-                    logger.info(f"   ✏️ Applying {len(response_data['changes'])} change(s)...")
-                    
-                    for change in response_data['changes']:
-                        day = change.get('day', 1)
-                        activity_index = change.get('activity_index', 0)
-                        new_activity = change.get('new_activity')
-                        
-                        if (modified_plan.get('itinerary') and 
-                            day <= len(modified_plan['itinerary']) and
-                            new_activity):
-                            
-                            day_data = modified_plan['itinerary'][day - 1]
-                            if 'activities' in day_data and activity_index < len(day_data['activities']):
-                                old_title = day_data['activities'][activity_index].get('title', 'N/A')
-                                day_data['activities'][activity_index] = new_activity
-                                logger.info(f"      ✅ Day {day}, Activity {activity_index}: '{old_title}' → '{new_activity.get('title')}'")
+                    # Apply the operations to a copy of the current plan
+                    logger.info(f"   ✏️ Applying {len(response_data['operations'])} operation(s)...")
+                    modified_plan, change_log = apply_operations(current_plan, response_data['operations'])
+                    for line in change_log:
+                        logger.info(f"      ✅ {line}")
                     
                     # Yield the modified plan
                     yield {'type': 'plan', 'content': modified_plan}
                     
                     # Stream explanation
-                    explanation = response_data.get('explanation', 'Đã cập nhật kế hoạch theo yêu cầu của bạn.')
+                    explanation = response_data.get('explanation') or 'Đã cập nhật kế hoạch theo yêu cầu của bạn.'
                     response_message = f"✅ **Đã chỉnh sửa kế hoạch!**\n\n{explanation}\n\n💡 Bạn có thể xem kế hoạch đã cập nhật bên dưới hoặc tiếp tục yêu cầu chỉnh sửa khác."
                     
                     logger.info(f"   ✅ Plan modified successfully")
@@ -429,6 +462,7 @@ LƯU Ý:
             else:
                 # Fallback if Gemini not available
                 logger.warning("   ⚠️ Gemini not available, using fallback response")
+                llm_metrics.record_fallback('edit_plan_stream', 'edit_plan', 'template')
                 response = f"📝 Tôi đã ghi nhận yêu cầu chỉnh sửa: '{message}'\n\n⚙️ Để chỉnh sửa kế hoạch, bạn có thể:\n• Tự chỉnh sửa bằng nút '✏️ Chỉnh sửa' trên trang chi tiết kế hoạch\n• Hoặc yêu cầu tạo kế hoạch mới với @plan"
                 
                 for word in response.split(' '):
@@ -448,16 +482,18 @@ LƯU Ý:
         finally:
             logger.info("   ✅ Edit mode stream completed")
     
-    def _handle_plan_mode_stream(self, message: str, requirements: Optional[Dict] = None):
+    def _handle_plan_mode_stream(self, ctx: AgentContext, message: str, requirements: Optional[Dict] = None):
         """Streaming version of plan mode handler"""
         search_sources = []  # Track search sources
+        # Released on every exit that does not search
+        speculated = (ctx.intent or {}).get('speculative_destination')
         
         try:
             yield {'type': 'thinking', 'content': 'extracting_requirements'}
             
             # Use requirements from intent analysis or extract
             if not requirements:
-                requirements = self._extract_requirements(message)
+                requirements = self._extract_requirements(ctx, message)
             
             # Check if ready to plan
             has_destination = requirements.get('destination') is not None
@@ -487,16 +523,18 @@ LƯU Ý:
             # Ready to plan - generate itinerary
             yield {'type': 'thinking', 'content': 'searching'}
             
-            # Search for destination
+            # Search for destination (taking or dropping the speculative search)
+            claimed, speculated = speculated, None
             search_results, search_sources = self._search_for_destination(
                 requirements['destination'],
-                requirements.get('preferences')
+                requirements.get('preferences'),
+                speculated=claimed
             )
             
             yield {'type': 'thinking', 'content': 'creating_plan'}
             
-            # Generate itinerary
-            plan_data = self._generate_itinerary(requirements, search_results)
+            # Generate itinerary (activities are forwarded as each one arrives)
+            plan_data = yield from self._generate_itinerary_stream(requirements, search_results)
             
             # Add search sources to plan data
             plan_data['search_sources'] = search_sources
@@ -518,14 +556,60 @@ LƯU Ý:
         except Exception as e:
             logger.error(f"Plan mode streaming error: {str(e)}")
             yield {'type': 'text', 'content': f"Xin lỗi, có lỗi khi tạo kế hoạch: {str(e)}"}
+        
+        finally:
+            self._discard_speculative_search(speculated)
+    
+    @traced('agent.intent')
+    def analyze_intent(self, user_message: str, conversation_history: Optional[List[Dict]] = None,
+                       current_plan: Optional[Dict] = None, conversation_summary: str = '') -> Dict:
+        """
+        Intent of a message, for callers that route on it before chat()/chat_stream()
+        
+        Pass the result back as intent_analysis so it is not analysed twice.
+        """
+        return self._analyze_user_intent(AgentContext.create(
+            user_message, conversation_history, current_plan, conversation_summary
+        ))
+    
+    def _analyze_user_intent(self, ctx: AgentContext) -> Dict:
+        """
+        Intent of the request, with the destination search started meanwhile
+        when the message names a known destination (used if it is a plan)
+        """
+        destination = self._speculate_search(ctx.user_message)
+        intent = self._detect_intent(ctx)
+        if not destination:
+            return intent
+        if intent.get('mode') != 'plan' or intent.get('direct_response'):
+            self.speculative_searches.discard(destination)
+            return intent
+        # The plan handler takes or discards exactly this search
+        return dict(intent, speculative_destination=destination)
+    
+    def _speculate_search(self, message: str) -> Optional[str]:
+        """Start the destination search early; returns the destination it started"""
+        if self.speculative_searches is None:
+            return None
+        destination = self._match_destination(message.lower())
+        if destination:
+            self.speculative_searches.start(destination)
+        return destination
+    
+    def discard_speculative_search(self, intent_analysis: Optional[Dict]):
+        """Drop the search analyze_intent() started, when its result is not passed on to chat()/chat_stream()"""
+        self._discard_speculative_search((intent_analysis or {}).get('speculative_destination'))
     
-    def _analyze_user_intent(self, message: str, current_plan: Optional[Dict] = None) -> Dict:
+    def _discard_speculative_search(self, destination: Optional[str]):
+        if destination and self.speculative_searches is not None:
+            self.speculative_searches.discard(destination)
+    
+    def _detect_intent(self, ctx: AgentContext) -> Dict:
         """
         Use LLM to analyze user intent and determine appropriate mode and response
         
         Args:
-            message: User's message
-            current_plan: Current plan if exists
+            ctx: Request context (message, history, current plan)
             
         Returns:
             Dict with:
@@ -536,11 +620,9 @@ LƯU Ý:
                 - response: direct response if applicable
                 - reasoning: why this mode was chosen
         """
-        # Format conversation history
-        history_text = "\n".join([
-            f"User: {msg['user']}\nBot: {msg['bot']}"
-            for msg in self.conversation_history[-3:]  # Last 3 exchanges
-        ]) if self.conversation_history else "Chưa có lịch sử hội thoại"
+        message, current_plan = ctx.user_message, ctx.current_plan
+        # Summary of earlier turns + the latest turn(s), bounded in size
+        history_text = ctx.history_text() or "Chưa có lịch sử hội thoại"
         
         # Build intent analysis prompt
         intent_prompt = f"""Bạn là trợ lý phân tích ý định người dùng cho hệ thống du lịch thông minh.
@@ -618,26 +700,26 @@ TRẢ VỀ CHỈ JSON, KHÔNG CÓ TEXT KHÁC:"""
                 
                 for attempt in range(max_retries):
                     try:
-                        response = self.model.generate_content(intent_prompt)
+                        response = self._generate(intent_prompt, 'analyze_user_intent', 'intent')
                         response_text = response.text.strip()
                         
-                        # Clean markdown code blocks if present
-                        if response_text.startswith('```'):
-                            response_text = response_text.split('```')[1]
-                            if response_text.startswith('json'):
-                                response_text = response_text[4:]
-                            response_text = response_text.strip()
-                        
                         logger.debug(f"LLM Response: {response_text}")
                         
-                        # Parse JSON response
-                        intent_data = json.loads(response_text)
+                        # Parse (and repair) JSON response
+                        intent_data, outcome = parse_json(response_text)
+                        llm_metrics.record_json_parse('analyze_user_intent', 'intent', outcome)
+                        if not isinstance(intent_data, dict):
+                            raise ValueError(f"Intent response is not a JSON object: {response_text[:80]!r}")
                         break  # Success, exit retry loop
                         
+                    except CircuitOpenError:
+                        # Gemini is down: fall back now instead of waiting out the retries
+                        raise
                     except Exception as e:
                         last_error = e
                         if attempt < max_retries - 1:
                             logger.warning(f"⚠️ Attempt {attempt + 1} failed: {str(e)}. Retrying in {retry_delay}s...")
+                            llm_metrics.record_retry('analyze_user_intent', 'intent')
                             time.sleep(retry_delay)
                         else:
                             logger.error(f"❌ All {max_retries} attempts failed")
@@ -665,14 +747,17 @@ TRẢ VỀ CHỈ JSON, KHÔNG CÓ TEXT KHÁC:"""
                 
             else:
                 logger.warning("⚠️ Gemini not available, using fallback detection")
+                llm_metrics.record_fallback('analyze_user_intent', 'intent', 'rules')
                 return self._fallback_intent_detection(message, current_plan)
                 
         except json.JSONDecodeError as e:
             logger.error(f"❌ Failed to parse LLM response as JSON: {e}")
             logger.error(f"Response was: {response_text[:200]}")
+            llm_metrics.record_fallback('analyze_user_intent', 'intent', 'rules')
             return self._fallback_intent_detection(message, current_plan)
         except Exception as e:
             logger.error(f"❌ Intent analysis error: {str(e)}")
+            llm_metrics.record_fallback('analyze_user_intent', 'intent', 'rules')
             return self._fallback_intent_detection(message, current_plan)
     
     def _fallback_intent_detection(self, message: str, current_plan: Optional[Dict] = None) -> Dict:
@@ -784,10 +869,11 @@ TRẢ VỀ CHỈ JSON, KHÔNG CÓ TEXT KHÁC:"""
             'reasoning': 'No clear pattern, defaulting to plan mode'
         }
     
-    def _handle_ask_mode(self, message: str, current_plan: Optional[Dict] = None) -> Dict:
+    def _handle_ask_mode(self, ctx: AgentContext, message: str) -> Dict:
         """
         Handle @ask mode - Answer general questions using RAG with plan context
         """
+        current_plan = ctx.current_plan
         logger.info("❓ ASK MODE - Answering general question")
         logger.info(f"   Has current_plan: {current_plan is not None}")
         
@@ -833,8 +919,6 @@ YÊU CẦU TRẢ LỜI:
 - Nếu thông tin tìm kiếm không liên quan, hãy trả lời dựa trên kiến thức về du lịch của bạn
 - Hôm nay là ngày {datetime.now().strftime('%d/%m/%Y')}
 """
-                    logger.debug(prompt)
-                    
                     # Retry logic with 15s delay
                     max_retries = 3
                     retry_delay = 15
@@ -842,12 +926,16 @@ YÊU CẦU TRẢ LỜI:
                     
                     for attempt in range(max_retries):
                         try:
-                            response = self.model.generate_content(prompt)
+                            response = self._generate(prompt, 'ask', 'ask')
                             answer = response.text
                             break  # Success
+                        except CircuitOpenError:
+                            # Gemini is down: fall back now instead of waiting out the retries
+                            raise
                         except Exception as retry_error:
                             if attempt < max_retries - 1:
                                 logger.warning(f"⚠️ Attempt {attempt + 1} failed: {str(retry_error)}. Retrying in {retry_delay}s...")
+                                llm_metrics.record_retry('ask', 'ask')
                                 time.sleep(retry_delay)
                             else:
                                 raise
@@ -868,6 +956,7 @@ YÊU CẦU TRẢ LỜI:
                     pass
             
             # Fallback: Simple formatted response from search results
+            llm_metrics.record_fallback('ask', 'ask', 'search_results')
             if search_results:
                 answer = f"Đây là thông tin tôi tìm được về '{message}':\n\n"
                 answer += formatted_results
@@ -890,10 +979,11 @@ YÊU CẦU TRẢ LỜI:
                 'mode': 'ask'
             }
     
-    def _handle_edit_plan_mode(self, message: str, current_plan: Optional[Dict]) -> Dict:
+    def _handle_edit_plan_mode(self, ctx: AgentContext, message: str) -> Dict:
         """
         Handle @edit_plan mode - Modify existing plan based on user request
         """
+        current_plan = ctx.current_plan
         logger.info("✏️ EDIT_PLAN MODE - Modifying existing plan")
         
         if not current_plan:
@@ -945,67 +1035,15 @@ HÃY:
 CHỈ TRẢ VỀ JSON NGẮN GỌN, KHÔNG TRẢ VỀ TOÀN BỘ KẾ HOẠCH."""
                     
                     logger.info("🤖 Calling Gemini to modify plan...")
-                    response = self.model.generate_content(prompt)
+                    response = self._generate(prompt, 'edit_plan', 'edit_plan', schema=EDIT_SECTIONS_SCHEMA)
                     result_text = response.text.strip()
                     
                     logger.debug(f"Gemini response: {result_text[:200]}...")
                     
-                    # Clean markdown code blocks if present
-                    if result_text.startswith('```'):
-                        parts = result_text.split('```')
-                        if len(parts) >= 2:
-                            result_text = parts[1]
-                            if result_text.startswith('json'):
-                                result_text = result_text[4:]
-                        result_text = result_text.strip()
+                    # Parse (and repair) the JSON response
+                    edit_result = self._parse_payload(result_text, 'edit_plan', 'edit_plan', self._validate_sections)
                     
-                    # Try to parse JSON response
-                    try:
-                        edit_result = json.loads(result_text)
-                        
-                        if edit_result.get('success'):
-                            # Apply modifications to the plan
-                            modified_plan = current_plan.copy()
-                            
-                            # Apply changes from modified_sections
-                            if 'modified_sections' in edit_result:
-                                for modification in edit_result['modified_sections']:
-                                    day_num = modification.get('day', 1)
-                                    activity_idx = modification.get('activity_index', 0)
-                                    new_activity = modification.get('new_activity')
-                                    
-                                    # Update the specific activity
-                                    if (modified_plan.get('itinerary') and 
-                                        day_num <= len(modified_plan['itinerary']) and
-                                        new_activity):
-                                        
-                                        day_data = modified_plan['itinerary'][day_num - 1]
-                                        if activity_idx < len(day_data.get('activities', [])):
-                                            day_data['activities'][activity_idx] = new_activity
-                                            logger.info(f"   Updated Day {day_num}, Activity {activity_idx}")
-                            
-                            # Or use full modified_plan if provided (backward compatible)
-                            elif 'modified_plan' in edit_result:
-                                modified_plan = edit_result['modified_plan']
-                                logger.info(f"   Using full modified plan from response")
-                            
-                            changes_description = edit_result.get('changes', 'Đã cập nhật kế hoạch theo yêu cầu')
-                            
-                            logger.info(f"✅ Plan modified successfully")
-                            logger.info(f"   Changes: {changes_description[:100]}...")
-                            
-                            return {
-                                'success': True,
-                                'message': f"✅ Đã chỉnh sửa kế hoạch!\n\n**Những gì đã thay đổi:**\n{changes_description}\n\n💡 Bạn có thể xem chi tiết kế hoạch đã cập nhật bên dưới.",
-                                'has_plan': True,
-                                'plan_data': modified_plan,
-                                'mode': 'edit_plan'
-                            }
-                        else:
-                            logger.warning("⚠️ JSON response has success=false")
-                            
-                    except json.JSONDecodeError as json_err:
-                        logger.error(f"❌ Failed to parse JSON: {json_err}")
+                    if edit_result is None:
                         logger.debug(f"Response text: {result_text[:300]}")
                         
                         # Fallback: Use Gemini text response as explanation
@@ -1017,6 +1055,46 @@ CHỈ TRẢ VỀ JSON NGẮN GỌN, KHÔNG TRẢ VỀ TOÀN BỘ KẾ HOẠCH.""
                             'mode': 'edit_plan'
                         }
                     
+                    if edit_result.get('success'):
+                        # Apply modifications to the plan
+                        modified_plan = current_plan.copy()
+                        
+                        # Apply changes from modified_sections
+                        if 'modified_sections' in edit_result:
+                            for modification in edit_result['modified_sections']:
+                                day_num = modification['day']
+                                activity_idx = modification['activity_index']
+                                new_activity = modification['new_activity']
+                                
+                                # Update the specific activity
+                                if (modified_plan.get('itinerary') and 
+                                    day_num <= len(modified_plan['itinerary'])):
+                                    
+                                    day_data = modified_plan['itinerary'][day_num - 1]
+                                    if activity_idx < len(day_data.get('activities', [])):
+                                        day_data['activities'][activity_idx] = new_activity
+                                        logger.info(f"   Updated Day {day_num}, Activity {activity_idx}")
+                        
+                        # Or use full modified_plan if provided (backward compatible)
+                        elif 'modified_plan' in edit_result:
+                            modified_plan = edit_result['modified_plan']
+                            logger.info(f"   Using full modified plan from response")
+                        
+                        changes_description = edit_result.get('changes') or 'Đã cập nhật kế hoạch theo yêu cầu'
+                        
+                        logger.info(f"✅ Plan modified successfully")
+                        logger.info(f"   Changes: {changes_description[:100]}...")
+                        
+                        return {
+                            'success': True,
+                            'message': f"✅ Đã chỉnh sửa kế hoạch!\n\n**Những gì đã thay đổi:**\n{changes_description}\n\n💡 Bạn có thể xem chi tiết kế hoạch đã cập nhật bên dưới.",
+                            'has_plan': True,
+                            'plan_data': modified_plan,
+                            'mode': 'edit_plan'
+                        }
+                    else:
+                        logger.warning("⚠️ JSON response has success=false")
+                    
                 except Exception as e:
                     logger.error(f"❌ Gemini error: {type(e).__name__}: {str(e)}")
                     import traceback
@@ -1024,6 +1102,7 @@ CHỈ TRẢ VỀ JSON NGẮN GỌN, KHÔNG TRẢ VỀ TOÀN BỘ KẾ HOẠCH.""
             
             # Fallback: Simple acknowledgment message
             logger.info("⚠️ Falling back to simple response")
+            llm_metrics.record_fallback('edit_plan', 'edit_plan', 'template')
             return {
                 'success': True,
                 'message': f"📝 Tôi đã ghi nhận yêu cầu chỉnh sửa: '{message}'\n\n⚙️ Tính năng tự động chỉnh sửa kế hoạch đang được hoàn thiện.\n\nHiện tại bạn có thể:\n• Tự chỉnh sửa bằng nút '✏️ Chỉnh sửa' trên trang chi tiết kế hoạch\n• Hoặc yêu cầu tạo kế hoạch mới với @plan",
@@ -1041,17 +1120,20 @@ CHỈ TRẢ VỀ JSON NGẮN GỌN, KHÔNG TRẢ VỀ TOÀN BỘ KẾ HOẠCH.""
                 'mode': 'edit_plan'
             }
     
-    def _handle_plan_mode(self, message: str, requirements: Optional[Dict] = None) -> Dict:
+    def _handle_plan_mode(self, ctx: AgentContext, message: str, requirements: Optional[Dict] = None) -> Dict:
         """
         Handle @plan mode (default) - Create travel plan
         
         Args:
+            ctx: Request context
             message: User's message
             requirements: Pre-extracted requirements from intent analysis (optional)
         """
         logger.info("📋 PLAN MODE - Creating travel plan")
         
         search_sources = []  # Track search sources
+        # Released on every exit that does not search
+        speculated = (ctx.intent or {}).get('speculative_destination')
         
         try:
             # Use requirements from intent analysis if available, otherwise extract
@@ -1060,7 +1142,7 @@ CHỈ TRẢ VỀ JSON NGẮN GỌN, KHÔNG TRẢ VỀ TOÀN BỘ KẾ HOẠCH.""
                 logger.info(f"   Requirements: {requirements}")
             else:
                 logger.info("🔍 Step 1: Extracting requirements...")
-                requirements = self._extract_requirements(message)
+                requirements = self._extract_requirements(ctx, message)
                 logger.info(f"✅ Requirements extracted: {requirements}")
             
             # Check if we have MINIMUM required info to create plan
@@ -1107,10 +1189,12 @@ CHỈ TRẢ VỀ JSON NGẮN GỌN, KHÔNG TRẢ VỀ TOÀN BỘ KẾ HOẠCH.""
                 
                 # Search for information
                 logger.info(f"🔍 Step 2: Searching for destination '{requirements['destination']}'...")
+                claimed, speculated = speculated, None
                 try:
                     search_results, search_sources = self._search_for_destination(
                         requirements['destination'],
-                        requirements.get('preferences')
+                        requirements.get('preferences'),
+                        speculated=claimed
                     )
                     logger.info(f"✅ Search completed. Results length: {len(search_results)} chars")
                 except Exception as search_error:
@@ -1190,15 +1274,15 @@ CHỈ TRẢ VỀ JSON NGẮN GỌN, KHÔNG TRẢ VỀ TOÀN BỘ KẾ HOẠCH.""
                 'has_plan': False,
                 'mode': 'plan'
             }
+        
+        finally:
+            self._discard_speculative_search(speculated)
     
-    def _extract_requirements(self, user_message: str) -> Dict:
+    @traced('agent.requirements')
+    def _extract_requirements(self, ctx: AgentContext, user_message: str) -> Dict:
         """Extract travel requirements from user message"""
         
-        # Format conversation history
-        history_text = "\n".join([
-            f"User: {msg['user']}\nBot: {msg['bot']}"
-            for msg in self.conversation_history[-3:]  # Last 3 exchanges
-        ])
+        history_text = ctx.history_text()
         
         # Create prompt
         prompt = REQUIREMENTS_PROMPT.format(
@@ -1209,7 +1293,7 @@ CHỈ TRẢ VỀ JSON NGẮN GỌN, KHÔNG TRẢ VỀ TOÀN BỘ KẾ HOẠCH.""
         try:
             if self.model:
                 # Use Gemini to extract requirements
-                response = self.model.generate_content(prompt)
+                response = self._generate(prompt, 'extract_requirements', 'plan')
                 analysis = response.text
                 
                 # Parse the analysis (simplified)
@@ -1222,21 +1306,25 @@ CHỈ TRẢ VỀ JSON NGẮN GỌN, KHÔNG TRẢ VỀ TOÀN BỘ KẾ HOẠCH.""
             
         except Exception as e:
             logger.error(f"Requirements extraction error: {str(e)}")
+            llm_metrics.record_fallback('extract_requirements', 'plan', 'rules')
             return self._simple_extract_requirements(user_message)
     
-    def _simple_extract_requirements(self, text: str) -> Dict:
-        """Simple keyword-based requirement extraction"""
-        text_lower = text.lower()
-        
+    @staticmethod
+    def _match_destination(text_lower: str) -> Optional[str]:
+        """Known destination named in a (lowercased) message"""
         # Common Vietnamese destinations
         destinations = ['đà lạt', 'nha trang', 'phú quốc', 'đà nẵng', 'hội an', 
                        'sapa', 'hạ long', 'vũng tàu', 'hà nội', 'sài gòn', 'huế']
         
-        destination = None
         for dest in destinations:
             if dest in text_lower:
-                destination = dest.title()
-                break
+                return dest.title()
+        return None
+    
+    def _simple_extract_requirements(self, text: str) -> Dict:
+        """Simple keyword-based requirement extraction"""
+        text_lower = text.lower()
+        destination = self._match_destination(text_lower)
         
         # Extract days - improved to handle "3 ngày 2 đêm"
         duration_days = None
@@ -1425,12 +1513,32 @@ CHỈ TRẢ VỀ JSON NGẮN GỌN, KHÔNG TRẢ VỀ TOÀN BỘ KẾ HOẠCH.""
             logger.error(f"Parse error: {str(e)}")
             return self._simple_extract_requirements(original_text)
     
-    def _search_for_destination(self, destination: str, preferences: Optional[str] = None) -> Tuple[str, List[Dict]]:
-        """Search for destination information
+    @traced('agent.search')
+    def _search_for_destination(self, destination: str, preferences: Optional[str] = None,
+                                speculated: Optional[str] = None) -> Tuple[str, List[Dict]]:
+        """Search for destination information, reusing the request's speculative search if one ran
+        
+        Args:
+            speculated: Destination of the speculative search this request
+                started; taken when it is the same place, discarded otherwise
         
         Returns:
             Tuple of (formatted_string_for_llm, list_of_source_dicts)
         """
+        if self.speculative_searches is not None:
+            if speculated and self._match_destination(destination.lower()) != speculated:
+                # The plan is for another place (e.g. named earlier in the history)
+                self.speculative_searches.discard(speculated)
+                speculated = None
+            # take(None) only counts a plan search without a speculative one
+            result = self.speculative_searches.take(speculated)
+            if result is not None:
+                logger.info(f"   🔮 Using speculative search results for: {destination}")
+                return result
+        return self._run_destination_search(destination, preferences)
+    
+    def _run_destination_search(self, destination: str, preferences: Optional[str] = None) -> Tuple[str, List[Dict]]:
+        """Run the destination queries (only the first three are used, none depend on preferences)"""
         logger.info(f"   🔍 Searching for: {destination}")
         logger.info(f"   🎯 Preferences: {preferences}")
         
@@ -1464,6 +1572,10 @@ CHỈ TRẢ VỀ JSON NGẮN GỌN, KHÔNG TRẢ VỀ TOÀN BỘ KẾ HOẠCH.""
         return formatted, sources
     
     def _generate_itinerary(self, requirements: Dict, search_results: str) -> Dict:
+        """Generate detailed itinerary (non-streaming callers)"""
+        return self._drain(self._generate_itinerary_stream(requirements, search_results))
+    
+    def _generate_itinerary_stream(self, requirements: Dict, search_results: str):
         """
         Generate detailed itinerary using progressive API calls to avoid timeout.
         
@@ -1475,10 +1587,17 @@ CHỈ TRẢ VỀ JSON NGẮN GỌN, KHÔNG TRẢ VỀ TOÀN BỘ KẾ HOẠCH.""
         - Avoids API timeout by keeping each request small
         - Provides better error handling per day
         - Cleaner and more maintainable code
+        
+        Yields:
+            {'type': 'activity', 'content': {...}} as each activity is generated
+        
+        Returns:
+            The plan data (generator return value)
         """
         try:
             if not self.model:
                 logger.warning("   ⚠️ Gemini model not available, using mock data")
+                llm_metrics.record_fallback('generate_itinerary', 'plan', 'mock')
                 return self._create_mock_itinerary(requirements)
             
             # Step 1: Generate plan outline
@@ -1487,11 +1606,12 @@ CHỈ TRẢ VỀ JSON NGẮN GỌN, KHÔNG TRẢ VỀ TOÀN BỘ KẾ HOẠCH.""
             
             if not plan_outline:
                 logger.warning("   ⚠️ Failed to generate outline, using mock data")
+                llm_metrics.record_fallback('generate_itinerary', 'plan', 'mock')
                 return self._create_mock_itinerary(requirements)
             
             # Step 2: Generate detailed itinerary for each day
             logger.info(f"   📅 Step 2: Generating detailed itinerary for {requirements.get('duration_days', 3)} days...")
-            itinerary = self._generate_daily_itineraries(requirements, plan_outline, search_results)
+            itinerary = yield from self._generate_daily_itineraries_stream(requirements, plan_outline, search_results)
             
             # Step 3: Combine outline and daily itineraries
             # Calculate end_date from start_date and duration
@@ -1534,8 +1654,10 @@ CHỈ TRẢ VỀ JSON NGẮN GỌN, KHÔNG TRẢ VỀ TOÀN BỘ KẾ HOẠCH.""
             import traceback
             logger.error(f"   Traceback: {traceback.format_exc()}")
             logger.warning("   ⚠️ Falling back to mock itinerary")
+            llm_metrics.record_fallback('generate_itinerary', 'plan', 'mock')
             return self._create_mock_itinerary(requirements)
     
+    @traced('agent.outline')
     def _generate_plan_outline(self, requirements: Dict, search_results: str) -> Optional[Dict]:
         """
         Generate high-level plan outline (Step 1)
@@ -1588,7 +1710,6 @@ YÊU CẦU:
         
         try:
             logger.info(f"      🤖 Calling Gemini for outline (prompt: {len(prompt)} chars)...")
-            logger.info(prompt)
             
             # Retry logic with 15s delay
             max_retries = 3
@@ -1597,18 +1718,24 @@ YÊU CẦU:
             
             for attempt in range(max_retries):
                 try:
-                    response = self.model.generate_content(prompt)
+                    response = self._generate(prompt, 'plan_outline', 'plan', schema=OUTLINE_SCHEMA)
                     response_text = response.text.strip()
                     
                     logger.info(f"      ✅ Outline received ({len(response_text)} chars)")
                     
-                    # Parse JSON
-                    outline = self._parse_json_response(response_text)
+                    # Parse (and repair) JSON
+                    outline = self._parse_payload(response_text, 'plan_outline', 'plan',
+                                                  lambda data: validate_outline(data, requirements))
                     break  # Success
                     
+                except CircuitOpenError as breaker_error:
+                    # Gemini is down: fall back now instead of waiting out the retries
+                    logger.warning(f"      ⚠️ {str(breaker_error)}")
+                    return None
                 except Exception as retry_error:
                     if attempt < max_retries - 1:
                         logger.warning(f"      ⚠️ Attempt {attempt + 1} failed: {str(retry_error)}. Retrying in {retry_delay}s...")
+                        llm_metrics.record_retry('plan_outline', 'plan')
                         time.sleep(retry_delay)
                     else:
                         logger.error(f"      ❌ All {max_retries} attempts failed")
@@ -1625,11 +1752,14 @@ YÊU CẦU:
             logger.error(f"      ❌ Outline generation error: {str(e)}")
             return None
     
-    def _generate_daily_itineraries(self, requirements: Dict, plan_outline: Dict, 
-                                   search_results: str) -> List[Dict]:
+    def _generate_daily_itineraries_stream(self, requirements: Dict, plan_outline: Dict, 
+                                           search_results: str):
         """
         Generate detailed activities for each day (Step 2)
         
+        Yields:
+            Activity events from _stream_single_day
+        
         Returns:
             List of daily itineraries with activities
         """
@@ -1650,18 +1780,20 @@ YÊU CẦU:
                     break
             
             # Generate activities for this specific day
-            day_data = self._generate_single_day(
-                day_num=day_num,
-                destination=destination,
-                theme=theme,
-                search_results=search_results
-            )
+            with span('agent.day', day=day_num):
+                day_data = yield from self._stream_single_day(
+                    day_num=day_num,
+                    destination=destination,
+                    theme=theme,
+                    search_results=search_results
+                )
             
             if day_data:
                 itinerary.append(day_data)
                 logger.info(f"      ✅ Day {day_num} completed: {len(day_data.get('activities', []))} activities")
             else:
                 logger.warning(f"      ⚠️ Day {day_num} generation failed, using template")
+                llm_metrics.record_fallback('single_day', 'plan', 'template')
                 # Fallback: use a simple template
                 itinerary.append({
                     'day': day_num,
@@ -1673,11 +1805,15 @@ YÊU CẦU:
         
         return itinerary
     
-    def _generate_single_day(self, day_num: int, destination: str, 
-                            theme: str, search_results: str) -> Optional[Dict]:
+    def _stream_single_day(self, day_num: int, destination: str, 
+                           theme: str, search_results: str):
         """
         Generate detailed activities for a single day
         
+        The day is requested in streaming mode and each activity is yielded
+        as {'type': 'activity', 'content': {'day', 'index', 'activity'}} as
+        soon as its JSON object is complete.
+        
         Args:
             day_num: Day number (1, 2, 3, ...)
             destination: Destination name
@@ -1685,7 +1821,7 @@ YÊU CẦU:
             search_results: Search results for reference
             
         Returns:
-            Dict with day, title, activities
+            Dict with day, title, activities (generator return value)
         """
         # Limit search for each day to avoid long prompts
         search_snippet = search_results[:200] if len(search_results) > 200 else search_results
@@ -1739,23 +1875,41 @@ YÊU CẦU:
             day_data = None
             
             for attempt in range(max_retries):
+                stream = ArrayItemStream('activities')
+                sent = 0
                 try:
-                    response = self.model.generate_content(prompt)
-                    response_text = response.text.strip()
+                    for chunk in self._generate_stream(prompt, 'single_day', 'plan', schema=DAY_SCHEMA):
+                        for item in stream.feed(self._chunk_text(chunk)):
+                            activity = validate_activity(item)
+                            if activity:
+                                yield {'type': 'activity', 'content': {'day': day_num, 'index': sent, 'activity': activity}}
+                                sent += 1
                     
-                    # Parse JSON
-                    day_data = self._parse_json_response(response_text)
+                    # Parse (and repair) JSON; a partial day keeps its usable activities
+                    day_data = self._parse_payload(stream.text.strip(), 'single_day', 'plan',
+                                                   lambda data: validate_day(data, day_num, theme))
                     break  # Success
                     
+                except CircuitOpenError as breaker_error:
+                    # Raised before any chunk: fall back now instead of waiting out the retries
+                    logger.warning(f"         ⚠️ Day {day_num}: {str(breaker_error)}")
+                    return None
                 except Exception as retry_error:
+                    if sent:
+                        # Activities are already on screen: keep what arrived instead of regenerating
+                        logger.warning(f"         ⚠️ Day {day_num} stream broke after {sent} activities: {str(retry_error)}")
+                        day_data = self._parse_payload(stream.text.strip(), 'single_day', 'plan',
+                                                       lambda data: validate_day(data, day_num, theme))
+                        break
                     if attempt < max_retries - 1:
                         logger.warning(f"         ⚠️ Day {day_num} attempt {attempt + 1} failed: {str(retry_error)}. Retrying in {retry_delay}s...")
+                        llm_metrics.record_retry('single_day', 'plan')
                         time.sleep(retry_delay)
                     else:
                         logger.error(f"         ❌ Day {day_num} all {max_retries} attempts failed")
                         return None
             
-            if day_data and 'activities' in day_data:
+            if day_data:
                 return day_data
             else:
                 logger.warning(f"         ⚠️ Failed to parse day {day_num} JSON")
@@ -1765,44 +1919,129 @@ YÊU CẦU:
             logger.error(f"         ❌ Day {day_num} generation error: {str(e)}")
             return None
     
+    @staticmethod
+    def _chunk_text(chunk) -> str:
+        """Text of a streamed chunk ('' for chunks without text parts)"""
+        try:
+            return chunk.text or ''
+        except (AttributeError, ValueError):
+            return ''
+    
     def _parse_json_response(self, text: str) -> Optional[Dict]:
         """
         Clean and parse JSON response from Gemini
         
         Handles:
-        - Markdown code blocks (```json ... ```)
-        - Extra whitespace
-        - Text before/after JSON
+        - Markdown code blocks (```json ... ```) and text before/after JSON
+        - Trailing/missing commas, raw newlines in strings, Python literals
+        - Responses cut off mid-way (incomplete members are dropped)
         """
+        data, outcome = parse_json(text)
+        if outcome == REPAIRED:
+            logger.debug(f"         Repaired malformed JSON ({len(text)} chars)")
+        return data if isinstance(data, dict) else None
+    
+    def _locate_edit(self, message: str, plan: Dict) -> EditTarget:
+        """
+        Days an edit request is about: by rules, then by asking the model
+        with a one-line-per-activity outline, else the whole plan
+        """
+        day_count = len(plan.get('itinerary') or [])
+        target = plan_edit.locate(message, plan)
+        if target is not None:
+            return target
+        if day_count <= 1:
+            return EditTarget(days=list(range(1, day_count + 1)), source='all')
+        
+        prompt = f"""Kế hoạch du lịch gồm {day_count} ngày (số thứ tự hoạt động bắt đầu từ 0):
+{plan_edit.outline_for_locator(plan)}
+
+YÊU CẦU CHỈNH SỬA: {message}
+
+Yêu cầu này liên quan đến những ngày / hoạt động nào? CHỈ TRẢ VỀ JSON:
+{{"days": [2], "activities": [{{"day": 2, "index": 1}}]}}
+Nếu yêu cầu áp dụng cho cả chuyến đi, liệt kê tất cả các ngày."""
         try:
-            # Clean markdown code blocks
-            cleaned_text = text.strip()
-            if cleaned_text.startswith('```'):
-                parts = cleaned_text.split('```')
-                if len(parts) >= 2:
-                    cleaned_text = parts[1]
-                    if cleaned_text.startswith('json'):
-                        cleaned_text = cleaned_text[4:]
-                cleaned_text = cleaned_text.strip()
-            
-            # Try to find JSON object
-            if '{' in cleaned_text and '}' in cleaned_text:
-                start = cleaned_text.index('{')
-                end = cleaned_text.rindex('}') + 1
-                json_str = cleaned_text[start:end]
-                
-                # Parse
-                data = json.loads(json_str)
-                return data
-            else:
-                return None
-                
-        except json.JSONDecodeError as e:
-            logger.debug(f"         JSON parse error: {str(e)}")
-            return None
+            response = self._generate(prompt, 'edit_plan_locate', 'edit_plan', schema=LOCATE_SCHEMA)
+            target = self._parse_payload(response.text.strip(), 'edit_plan_locate', 'edit_plan',
+                                         lambda data: (plan_edit.parse_locator_answer(data, day_count), False))
         except Exception as e:
-            logger.debug(f"         Parse error: {str(e)}")
-            return None
+            logger.warning(f"   ⚠️ Edit locator failed: {str(e)}")
+            target = None
+        return target or EditTarget(days=list(range(1, day_count + 1)), source='all')
+    
+    @staticmethod
+    def _edit_patch_prompt(message: str, plan: Dict, target: EditTarget) -> str:
+        """Patch prompt carrying only the target days"""
+        hint = ''
+        if target.activities:
+            named = ', '.join(f"ngày {day} index {index}" for day, index in target.activities)
+            hint = f"\nHOẠT ĐỘNG LIÊN QUAN (dự đoán): {named}\n"
+        return f"""Bạn là trợ lý du lịch. Người dùng muốn chỉnh sửa kế hoạch "{plan.get('plan_name', '')}" \
+({plan.get('destination', '')}, {plan.get('duration_days', len(plan.get('itinerary') or []))} ngày, \
+ngân sách {plan.get('budget', 0)} VNĐ).
+
+CÁC NGÀY CẦN XEM (JSON rút gọn, index hoạt động bắt đầu từ 0):
+{plan_edit.compact_days(plan, target.days)}
+{hint}
+YÊU CẦU CHỈNH SỬA: {message}
+
+Trả về các thao tác sửa, mỗi thao tác một hoạt động:
+- "replace": thay hoạt động tại index bằng "activity"
+- "insert": chèn "activity" vào trước index (index = số hoạt động để thêm vào cuối ngày)
+- "remove": xóa hoạt động tại index
+- "update": chỉ đổi các trường trong "fields" (vd. time, cost)
+Index luôn tính theo danh sách đã gửi ở trên.
+
+{{
+  "understanding": "Tóm tắt ngắn gọn yêu cầu",
+  "operations": [
+    {{"op": "replace", "day": {target.days[0]}, "index": 0, "activity": {{"time": "07:00", "type": "breakfast", "title": "Tên quán mới", "description": "Mô tả, địa chỉ", "location": "Địa chỉ cụ thể", "cost": 50000}}}}
+  ],
+  "explanation": "Giải thích ngắn gọn những gì đã thay đổi và lý do"
+}}
+
+LƯU Ý:
+- CHỈ sửa những gì được yêu cầu, không lặp lại các hoạt động giữ nguyên
+- Hoạt động mới phải phù hợp với ngân sách và địa điểm, có địa chỉ và giá thực tế
+- CHỈ TRẢ VỀ JSON, KHÔNG TEXT KHÁC
+"""
+    
+    def _parse_payload(self, text: str, call_site: str, mode: str, validate) -> Optional[Dict]:
+        """
+        Parse, repair and validate a JSON payload, recording the outcome
+        
+        Args:
+            validate: Called with the parsed data, returns (payload or None, salvaged)
+        
+        Returns:
+            The validated payload, or None when nothing usable was found
+        """
+        data, outcome = parse_json(text)
+        payload, salvaged = validate(data)
+        if payload is None:
+            outcome = FAILED
+        elif salvaged:
+            outcome = 'salvaged'
+        llm_metrics.record_json_parse(call_site, mode, outcome)
+        if outcome != OK:
+            logger.info(f"         🩹 {call_site} JSON {outcome} ({len(text)} chars)")
+        return payload
+    
+    @staticmethod
+    def _validate_sections(data) -> Tuple[Optional[Dict], bool]:
+        """Non-streaming edit payload: modified_sections, or a full modified_plan"""
+        if not isinstance(data, dict):
+            return None, False
+        result = dict(data)
+        sections, salvaged = validate_changes(data, 'modified_sections')
+        if sections is not None:
+            result['modified_sections'] = sections
+        elif not isinstance(data.get('modified_plan'), dict):
+            result.pop('modified_plan', None)
+        if not isinstance(result.get('changes'), str):
+            result['changes'] = ''
+        return result, salvaged
     
     def _create_mock_itinerary(self, requirements: Dict) -> Dict:
         """Create detailed mock itinerary with specific addresses and prices"""
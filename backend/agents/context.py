@@ -0,0 +1,48 @@
+"""
+Per-request agent context
+TravelAgent is one shared instance serving every request, so it only holds
+thread-safe resources (model client, search tool, caches). Everything that
+belongs to one chat request — the message, the conversation history and
+summary, the plan being edited, an intent analysed up front — travels in an
+AgentContext passed to the handlers instead of being set on the agent.
+"""
+import dataclasses
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from .conversation_summary import history_context
+
+# Raw turns after the summary that go into history-aware prompts
+HISTORY_TURNS = 3
+
+
+@dataclass(frozen=True)
+class AgentContext:
+    """Immutable state of one chat request"""
+    user_message: str
+    history: Tuple[Mapping[str, str], ...] = ()
+    summary: str = ''
+    current_plan: Optional[Dict] = None
+    # Intent already analysed by the caller (skips a second analysis)
+    intent: Optional[Dict] = None
+
+    @classmethod
+    def create(cls, user_message: str, conversation_history: Optional[List[Dict]] = None,
+               current_plan: Optional[Dict] = None, conversation_summary: str = '',
+               intent: Optional[Dict] = None) -> 'AgentContext':
+        """Context with read-only copies of the history turns"""
+        history = tuple(
+            MappingProxyType({'user': turn.get('user', ''), 'bot': turn.get('bot', '')})
+            for turn in conversation_history or []
+        )
+        return cls(user_message=user_message, history=history, summary=conversation_summary or '',
+                   current_plan=current_plan, intent=intent)
+
+    def with_intent(self, intent: Dict) -> 'AgentContext':
+        return dataclasses.replace(self, intent=intent)
+
+    def history_text(self) -> str:
+        """Conversation context for history-aware prompts"""
+        # Turns after the summary: normally just the latest; each one shortened
+        return history_context(self.summary, list(self.history[-HISTORY_TURNS:]))
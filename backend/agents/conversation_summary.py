@@ -0,0 +1,203 @@
+"""
+Rolling conversation summaries
+History-aware prompts (intent analysis, requirement extraction) used to embed
+the last three raw exchanges, and a bot reply is often a whole generated plan.
+Each conversation session now keeps one summary in conversation_summaries:
+every turn except the latest is folded into it, incrementally and off the
+request path, and it is held under a fixed token budget. Prompts get the
+summary plus the latest turn (shortened), so their size no longer grows with
+the conversation.
+"""
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from . import instrumentation as llm_metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOKEN_BUDGET = 300
+# Rough Gemini tokenizer ratio for Vietnamese text
+CHARS_PER_TOKEN = 4
+# Longest rendering of the latest turn in a prompt
+LATEST_TURN_CHARS = 800
+# One folded turn in the rule-based summary
+FOLDED_TURN_CHARS = 240
+# Turns folded per model call when a long conversation catches up
+FOLD_BATCH = 10
+
+SUMMARY_MARKER = 'TÓM TẮT HIỆN TẠI:'
+
+_MARKDOWN = re.compile(r'[*_#>`]+')
+_SPACES = re.compile(r'\s+')
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def compact_text(text: str, limit: int) -> str:
+    """Single-line text without markdown, cut at a word boundary"""
+    text = _SPACES.sub(' ', _MARKDOWN.sub('', text or '')).strip()
+    if len(text) <= limit:
+        return text
+    cut = text[:limit].rsplit(' ', 1)[0]
+    return cut + '…'
+
+
+def compact_turn(user: str, bot: str, limit: int = LATEST_TURN_CHARS) -> str:
+    """One exchange in at most about `limit` characters (a third for the user)"""
+    user_text = compact_text(user, limit // 3)
+    return f"User: {user_text}\nBot: {compact_text(bot, limit - len(user_text))}"
+
+
+def fit_budget(summary: str, token_budget: int) -> str:
+    """Drop the oldest lines (then cut the last one) until the summary fits"""
+    limit = token_budget * CHARS_PER_TOKEN
+    lines = [line for line in summary.strip().splitlines() if line.strip()]
+    if not lines:
+        return ''
+    while len(lines) > 1 and len('\n'.join(lines)) > limit:
+        lines.pop(0)
+    return compact_text(lines[0], limit) if len(lines) == 1 else '\n'.join(lines)
+
+
+def history_context(summary: str, turns: List[Dict]) -> str:
+    """
+    Conversation context for a prompt
+
+    Args:
+        summary: Rolling summary of the earlier turns ('' when none yet)
+        turns: Raw turns ({'user', 'bot'}) after the summary, oldest first
+    """
+    parts = []
+    if summary:
+        parts.append(f"Tóm tắt các lượt trước:\n{summary}")
+    if turns:
+        parts.append("\n".join(compact_turn(turn['user'], turn['bot']) for turn in turns))
+    return "\n".join(parts)
+
+
+class ConversationSummarizer:
+    """Folds new turns into a summary, with the model or by rules"""
+
+    def __init__(self, model=None, token_budget: int = DEFAULT_TOKEN_BUDGET):
+        self.model = model
+        self.token_budget = token_budget
+
+    def fold(self, summary: str, turns: List[Tuple[str, str]]) -> str:
+        """New summary covering `summary` and the (user, bot) turns"""
+        if self.model is not None:
+            try:
+                return self._fold_with_model(summary, turns)
+            except Exception as e:
+                logger.warning(f"⚠️ Summary model call failed, folding by rules: {str(e)}")
+                llm_metrics.record_fallback('conversation_summary', 'chat', 'error')
+        return self._fold_by_rules(summary, turns)
+
+    def _fold_with_model(self, summary: str, turns: List[Tuple[str, str]]) -> str:
+        new_turns = "\n".join(compact_turn(user, bot, FOLDED_TURN_CHARS * 2) for user, bot in turns)
+        words = self.token_budget * CHARS_PER_TOKEN // 6
+        prompt = f"""Bạn cập nhật bản tóm tắt một cuộc hội thoại giữa người dùng và trợ lý du lịch.
+
+{SUMMARY_MARKER}
+{summary or "(chưa có)"}
+
+CÁC LƯỢT MỚI:
+{new_turns}
+
+Viết lại bản tóm tắt (tối đa {words} từ, gạch đầu dòng ngắn) giữ lại: điểm đến, số ngày, ngân sách,
+ngày đi, sở thích, kế hoạch đã tạo / chỉnh sửa và các câu hỏi còn dang dở. Bỏ chi tiết lịch trình.
+CHỈ TRẢ VỀ BẢN TÓM TẮT."""
+        response = llm_metrics.generate(self.model, prompt, 'conversation_summary', 'chat')
+        text = (response.text or '').strip()
+        if not text:
+            raise ValueError('empty summary')
+        return fit_budget(text, self.token_budget)
+
+    def _fold_by_rules(self, summary: str, turns: List[Tuple[str, str]]) -> str:
+        lines = [summary] if summary else []
+        for user, bot in turns:
+            lines.append('- ' + compact_turn(user, bot, FOLDED_TURN_CHARS).replace('\n', ' → '))
+        return fit_budget('\n'.join(lines), self.token_budget)
+
+
+class ConversationSummaries:
+    """
+    Summaries of conversation sessions, kept up to date in the background
+
+    Updates go through one worker thread, so two turns of the same
+    conversation never fold the same messages twice.
+    """
+
+    def __init__(self, db, summarizer: ConversationSummarizer):
+        self.db = db
+        self.summarizer = summarizer
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='summary')
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def context(self, session_id: str, conversation_session_id: Optional[str]) -> Tuple[str, List[Dict]]:
+        """
+        (summary, turns not folded yet) for the agent's history-aware prompts
+
+        Normally one turn is left unfolded; more only while the background
+        update is catching up, and never more than three.
+        """
+        if not conversation_session_id:
+            return '', []
+        stored = self.db.get_conversation_summary(session_id, conversation_session_id) or {}
+        turns = self.db.get_conversations_after(session_id, conversation_session_id,
+                                                stored.get('last_conversation_id', 0), latest=3)
+        return stored.get('summary', ''), [
+            {'user': turn.user_message, 'bot': turn.bot_response} for turn in turns
+        ]
+
+    def schedule(self, session_id: str, conversation_session_id: Optional[str]):
+        """Fold the session's finished turns in the background"""
+        if not conversation_session_id:
+            return
+        with self._lock:
+            if conversation_session_id in self._pending:
+                return
+            self._pending.add(conversation_session_id)
+        self._executor.submit(self._run, session_id, conversation_session_id)
+
+    def _run(self, session_id: str, conversation_session_id: str):
+        with self._lock:
+            self._pending.discard(conversation_session_id)
+        try:
+            self.update(session_id, conversation_session_id)
+        except Exception as e:
+            logger.error(f"❌ Conversation summary update failed for {conversation_session_id}: {str(e)}")
+
+    def update(self, session_id: str, conversation_session_id: str) -> bool:
+        """Fold every turn but the latest into the stored summary; False if nothing to fold"""
+        stored = self.db.get_conversation_summary(session_id, conversation_session_id)
+        # Claim the row first: a conversation session id reused by another
+        # session must neither read nor overwrite that session's summary
+        if stored is None and not self.db.save_conversation_summary(conversation_session_id, session_id,
+                                                                    '', 0, 0):
+            logger.warning(f"⚠️ Conversation session {conversation_session_id} belongs to another session, "
+                           f"not summarized")
+            return False
+        stored = stored or {}
+        summary = stored.get('summary', '')
+        folded = stored.get('turns', 0)
+        last_id = stored.get('last_conversation_id', 0)
+        turns = self.db.get_conversations_after(session_id, conversation_session_id, last_id)
+        # The latest turn stays raw in the prompts
+        turns = turns[:-1]
+        if not turns:
+            return False
+        for start in range(0, len(turns), FOLD_BATCH):
+            batch = turns[start:start + FOLD_BATCH]
+            summary = self.summarizer.fold(summary, [(t.user_message, t.bot_response) for t in batch])
+        folded += len(turns)
+        self.db.save_conversation_summary(conversation_session_id, session_id, summary,
+                                          folded, turns[-1].id)
+        logger.info(f"🧾 Summary of {conversation_session_id}: {folded} turn(s), "
+                    f"~{estimate_tokens(summary)} tokens")
+        return True
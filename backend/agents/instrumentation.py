@@ -0,0 +1,270 @@
+"""
+Instrumentation for Gemini calls
+Records latency, prompt/response sizes, token usage, retries, parse failures
+and fallbacks per call site and chat mode, into the shared metrics registry
+and into a per-request usage summary. Calls go through a circuit breaker so
+an outage fails fast into the agent's fallbacks instead of piling up retries.
+"""
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from config import Config
+from utils import tracing
+from utils.circuit_breaker import STATE_CODES, CircuitBreaker
+from utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+LABELS = ('call_site', 'mode')
+SIZE_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+
+LLM_CALLS = REGISTRY.counter(
+    'llm_calls_total', 'Gemini calls by call site, mode and outcome', LABELS + ('outcome',))
+LLM_LATENCY = REGISTRY.histogram(
+    'llm_call_duration_seconds', 'Gemini call latency (full response)', LABELS + ('outcome',),
+    buckets=LATENCY_BUCKETS)
+LLM_FIRST_CHUNK = REGISTRY.histogram(
+    'llm_first_chunk_seconds', 'Time to first streamed chunk', LABELS, buckets=LATENCY_BUCKETS)
+LLM_PROMPT_CHARS = REGISTRY.histogram(
+    'llm_prompt_chars', 'Prompt size in characters', LABELS, buckets=SIZE_BUCKETS)
+LLM_RESPONSE_CHARS = REGISTRY.histogram(
+    'llm_response_chars', 'Response size in characters', LABELS, buckets=SIZE_BUCKETS)
+LLM_TOKENS = REGISTRY.counter(
+    'llm_tokens_total', 'Tokens reported by Gemini usage metadata', LABELS + ('kind',))
+LLM_RETRIES = REGISTRY.counter(
+    'llm_retries_total', 'Gemini calls retried after an error', LABELS)
+LLM_PARSE_FAILURES = REGISTRY.counter(
+    'llm_parse_failures_total', 'Gemini responses that could not be parsed', LABELS)
+LLM_JSON_PARSES = REGISTRY.counter(
+    'llm_json_parse_total', 'JSON payloads by parse outcome (ok, repaired, salvaged, failed)',
+    LABELS + ('outcome',))
+LLM_FALLBACKS = REGISTRY.counter(
+    'llm_fallbacks_total', 'Answers served by a fallback (mock data, rules) instead of Gemini',
+    LABELS + ('reason',))
+
+
+
+def _json_parse_success_ratio():
+    totals: Dict[tuple, list] = {}
+    for (call_site, mode, outcome), count in LLM_JSON_PARSES._items():
+        entry = totals.setdefault((call_site, mode), [0, 0])
+        entry[1] += count
+        if outcome != 'failed':
+            entry[0] += count
+    return [({'call_site': call_site, 'mode': mode}, usable / total)
+            for (call_site, mode), (usable, total) in totals.items() if total]
+
+
+REGISTRY.gauge(
+    'llm_json_parse_success_ratio', 'Share of JSON payloads that were usable (parsed, repaired or salvaged)',
+    LABELS, callback=_json_parse_success_ratio)
+
+LLM_BREAKER = CircuitBreaker(
+    'gemini',
+    failure_threshold=Config.LLM_BREAKER_FAILURES,
+    reset_timeout=Config.LLM_BREAKER_RESET_SECONDS
+)
+REGISTRY.gauge(
+    'llm_breaker_state', 'Gemini circuit breaker (0 closed, 1 half-open, 2 open)', ('breaker',),
+    callback=lambda: [({'breaker': LLM_BREAKER.name}, STATE_CODES[LLM_BREAKER.state])])
+REGISTRY.counter(
+    'llm_breaker_rejections_total', 'Gemini calls failed fast by the open breaker', ('breaker',),
+    callback=lambda: [({'breaker': LLM_BREAKER.name}, LLM_BREAKER.stats['rejected'])])
+
+
+# ===== PER-REQUEST USAGE =====
+
+class LLMUsage:
+    """Totals of the Gemini calls made while handling one request"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+        self.retries = 0
+        self.parse_failures = 0
+        self.fallbacks = 0
+        self.by_call_site: Dict[str, Dict[str, float]] = {}
+
+    def add_call(self, call_site: str, seconds: float, ok: bool, prompt_tokens: int, response_tokens: int):
+        self.calls += 1
+        self.errors += 0 if ok else 1
+        self.seconds += seconds
+        self.prompt_tokens += prompt_tokens
+        self.response_tokens += response_tokens
+        site = self.by_call_site.setdefault(call_site, {'calls': 0, 'seconds': 0.0})
+        site['calls'] += 1
+        site['seconds'] += seconds
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'seconds': round(self.seconds, 3),
+            'prompt_tokens': self.prompt_tokens,
+            'response_tokens': self.response_tokens,
+            'retries': self.retries,
+            'parse_failures': self.parse_failures,
+            'fallbacks': self.fallbacks,
+            'by_call_site': {
+                site: {'calls': totals['calls'], 'seconds': round(totals['seconds'], 3)}
+                for site, totals in self.by_call_site.items()
+            }
+        }
+
+
+_current_usage: contextvars.ContextVar[Optional[LLMUsage]] = contextvars.ContextVar('llm_usage', default=None)
+
+
+@contextmanager
+def track_llm_usage() -> Iterator[LLMUsage]:
+    """Collect the Gemini calls made inside the block into an LLMUsage"""
+    usage = LLMUsage()
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+
+
+def current_usage() -> Optional[LLMUsage]:
+    return _current_usage.get()
+
+
+# ===== RECORDING =====
+
+def _token_counts(response) -> tuple:
+    """(prompt, response) token counts from a Gemini response, 0 when unavailable"""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return 0, 0
+    return (getattr(usage, 'prompt_token_count', 0) or 0,
+            getattr(usage, 'candidates_token_count', 0) or 0)
+
+
+def _record_call(call_site: str, mode: str, started: float, prompt: str,
+                 response_chars: Optional[int], response=None):
+    """Record one finished call; response_chars=None marks a failed call"""
+    elapsed = time.perf_counter() - started
+    ok = response_chars is not None
+    outcome = 'ok' if ok else 'error'
+    tracing.record(f'llm.{call_site}', started, mode=mode, outcome=outcome)
+
+    LLM_CALLS.inc(call_site=call_site, mode=mode, outcome=outcome)
+    LLM_LATENCY.observe(elapsed, call_site=call_site, mode=mode, outcome=outcome)
+    LLM_PROMPT_CHARS.observe(len(prompt), call_site=call_site, mode=mode)
+
+    prompt_tokens = response_tokens = 0
+    if ok:
+        LLM_RESPONSE_CHARS.observe(response_chars, call_site=call_site, mode=mode)
+        prompt_tokens, response_tokens = _token_counts(response)
+        if prompt_tokens:
+            LLM_TOKENS.inc(prompt_tokens, call_site=call_site, mode=mode, kind='prompt')
+        if response_tokens:
+            LLM_TOKENS.inc(response_tokens, call_site=call_site, mode=mode, kind='response')
+
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.add_call(call_site, elapsed, ok, prompt_tokens, response_tokens)
+
+    logger.info(f"🤖 LLM {call_site} [{mode}] {outcome} in {elapsed:.2f}s "
+                f"(prompt {len(prompt)} chars, response {response_chars or 0} chars, "
+                f"tokens {prompt_tokens}/{response_tokens})")
+
+
+def generate(model, prompt: str, call_site: str, mode: str, **kwargs):
+    """
+    Instrumented model.generate_content (non-streaming)
+
+    Returns:
+        The Gemini response; exceptions are recorded and re-raised
+
+    Raises:
+        CircuitOpenError: Gemini has been failing, the call was not made
+    """
+    LLM_BREAKER.check()
+    started = time.perf_counter()
+    try:
+        response = model.generate_content(prompt, **kwargs)
+        text = response.text
+    except Exception:
+        LLM_BREAKER.record_failure()
+        _record_call(call_site, mode, started, prompt, None)
+        raise
+    LLM_BREAKER.record_success()
+    _record_call(call_site, mode, started, prompt, len(text), response)
+    return response
+
+
+def generate_stream(model, prompt: str, call_site: str, mode: str, **kwargs) -> Iterator[Any]:
+    """
+    Instrumented model.generate_content(stream=True)
+
+    Yields the response chunks; the call is recorded when the stream ends
+    (or fails, or the consumer stops early).
+
+    Raises:
+        CircuitOpenError: Gemini has been failing, the call was not made
+    """
+    LLM_BREAKER.check()
+    started = time.perf_counter()
+    response_chars = 0
+    response = None
+    first_chunk = True
+    ok = False
+    try:
+        response = model.generate_content(prompt, stream=True, **kwargs)
+        for chunk in response:
+            if first_chunk:
+                LLM_FIRST_CHUNK.observe(time.perf_counter() - started, call_site=call_site, mode=mode)
+                first_chunk = False
+            response_chars += len(getattr(chunk, 'text', '') or '')
+            yield chunk
+        ok = True
+        LLM_BREAKER.record_success()
+    except GeneratorExit:
+        # Consumer stopped after receiving chunks: Gemini itself answered,
+        # so the call is recorded as ok with what was streamed so far
+        ok = True
+        LLM_BREAKER.record_success()
+        raise
+    except Exception:
+        LLM_BREAKER.record_failure()
+        raise
+    finally:
+        _record_call(call_site, mode, started, prompt, response_chars if ok else None, response)
+
+
+def record_retry(call_site: str, mode: str):
+    LLM_RETRIES.inc(call_site=call_site, mode=mode)
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.retries += 1
+
+
+def record_parse_failure(call_site: str, mode: str):
+    LLM_PARSE_FAILURES.inc(call_site=call_site, mode=mode)
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.parse_failures += 1
+
+
+def record_json_parse(call_site: str, mode: str, outcome: str):
+    """Count a JSON payload by outcome; 'failed' also counts as a parse failure"""
+    LLM_JSON_PARSES.inc(call_site=call_site, mode=mode, outcome=outcome)
+    if outcome == 'failed':
+        record_parse_failure(call_site, mode)
+
+
+def record_fallback(call_site: str, mode: str, reason: str):
+    """Count an answer produced without Gemini (reason: mock, rules, template, ...)"""
+    LLM_FALLBACKS.inc(call_site=call_site, mode=mode, reason=reason)
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.fallbacks += 1
@@ -0,0 +1,245 @@
+"""
+Tolerant JSON parsing for model output
+Gemini answers are usually a JSON object wrapped in prose or a ```json fence,
+but sometimes slightly broken: trailing commas, a missing comma between
+members, raw newlines inside strings, Python literals, or a response cut off
+mid-way (max_output_tokens). The repair pass tokenizes from the first `{`,
+fixes what it can, and for truncated output rolls back to the last complete
+member before closing the open brackets, so a cut-off answer still yields
+everything that arrived intact.
+"""
+import json
+import re
+from typing import Any, List, Optional, Tuple
+
+OK = 'ok'
+REPAIRED = 'repaired'
+FAILED = 'failed'
+
+_NUMBER = re.compile(r'-?(0|[1-9]\d*)(\.\d+)?([eE][+-]?\d+)?$')
+# 1.500.000 (Vietnamese thousands separators) read as 1500000
+_GROUPED_NUMBER = re.compile(r'-?\d{1,3}(\.\d{3})+$')
+_LITERALS = {'true': 'true', 'false': 'false', 'null': 'null',
+             'True': 'true', 'False': 'false', 'None': 'null'}
+_PUNCTUATION = '{}[]:,'
+_STRING_ESCAPES = set('"\\/bfnrtu')
+_CONTROL_ESCAPES = {'\n': '\\n', '\r': '\\r', '\t': '\\t'}
+
+
+class _Token:
+    __slots__ = ('kind', 'text', 'partial')
+
+    def __init__(self, kind: str, text: str, partial: bool = False):
+        self.kind = kind  # one of _PUNCTUATION, 'str' or 'lit'
+        self.text = text
+        self.partial = partial  # cut off by the end of the input
+
+    @property
+    def is_value_start(self) -> bool:
+        return self.kind in ('str', 'lit', '{', '[')
+
+
+def _read_string(text: str, i: int) -> Tuple[str, int, bool]:
+    """String starting at the quote at text[i]; (json text, next index, complete)"""
+    out = ['"']
+    i += 1
+    while i < len(text):
+        char = text[i]
+        if char == '"':
+            out.append('"')
+            return ''.join(out), i + 1, True
+        if char == '\\':
+            if i + 1 >= len(text):
+                break
+            escaped = text[i + 1]
+            if escaped == 'u' and not re.match(r'[0-9a-fA-F]{4}', text[i + 2:i + 6]):
+                out.append('\\\\u')
+            elif escaped in _STRING_ESCAPES:
+                out.append('\\' + escaped)
+            else:
+                out.append('\\\\' + _CONTROL_ESCAPES.get(escaped, escaped))
+            i += 2
+            continue
+        out.append(_CONTROL_ESCAPES.get(char, char) if char < ' ' else char)
+        i += 1
+    out.append('"')
+    return ''.join(out), len(text), False
+
+
+def _tokens(text: str, start: int) -> List[_Token]:
+    """Tokens of the JSON value starting at text[start], stopping once it is closed"""
+    tokens: List[_Token] = []
+    depth = 0
+    i = start
+    while i < len(text):
+        char = text[i]
+        if char.isspace():
+            i += 1
+        elif char == '"':
+            value, i, complete = _read_string(text, i)
+            tokens.append(_Token('str', value, partial=not complete))
+        elif char in _PUNCTUATION:
+            tokens.append(_Token(char, char))
+            i += 1
+            if char in '{[':
+                depth += 1
+            elif char in '}]':
+                depth -= 1
+                if depth <= 0:
+                    break
+        else:
+            end = i
+            while end < len(text) and not text[end].isspace() and text[end] not in _PUNCTUATION and text[end] != '"':
+                end += 1
+            tokens.append(_Token('lit', text[i:end], partial=end >= len(text)))
+            i = end
+    return tokens
+
+
+def _literal(text: str) -> Optional[str]:
+    if text in _LITERALS:
+        return _LITERALS[text]
+    if _NUMBER.match(text):
+        return text
+    if _GROUPED_NUMBER.match(text):
+        return text.replace('.', '')
+    return None
+
+
+def repair_json(text: str) -> Optional[str]:
+    """
+    Best-effort valid JSON for the first object in `text`
+
+    Returns:
+        JSON text, or None when no object could be recovered
+    """
+    start = text.find('{')
+    if start < 0:
+        return None
+
+    out: List[str] = []
+    # Containers as [bracket, state]; object states: key, colon, value, comma;
+    # array states: value, comma
+    stack: List[List[str]] = []
+    # Output length and stack at the last point where closing the open
+    # brackets gives complete members only
+    safe: Tuple[int, List[List[str]]] = (0, [])
+
+    def mark_safe():
+        nonlocal safe
+        safe = (len(out), [list(frame) for frame in stack])
+
+    def value_done():
+        if stack:
+            stack[-1][1] = 'comma'
+        mark_safe()
+
+    def closable(frame: List[str]) -> bool:
+        # Not while an object key waits for its value
+        return frame[0] == '[' or frame[1] in ('key', 'comma')
+
+    def close_top():
+        if out and out[-1] == ',':
+            out.pop()  # trailing comma
+        out.append('}' if stack.pop()[0] == '{' else ']')
+        value_done()
+
+    for token in _tokens(text, start):
+        frame = stack[-1] if stack else None
+        state = frame[1] if frame else 'value'
+
+        if token.kind in '}]':
+            opener = '{' if token.kind == '}' else '['
+            if not any(bracket == opener for bracket, _ in stack):
+                continue  # stray closing bracket
+            # Close inner containers the model forgot to close
+            while True:
+                if not closable(stack[-1]):
+                    return None
+                matched = stack[-1][0] == opener
+                close_top()
+                if matched:
+                    break
+            if not stack:
+                return ''.join(out)
+            continue
+
+        if token.kind == ',':
+            if state == 'comma':
+                out.append(',')
+                frame[1] = 'key' if frame[0] == '{' else 'value'
+            # Doubled or leading commas are dropped
+            continue
+
+        if token.kind == ':':
+            if not frame or frame[0] != '{' or state != 'colon':
+                return None
+            out.append(':')
+            frame[1] = 'value'
+            continue
+
+        # A value or a key
+        if state == 'comma' and token.is_value_start:
+            # Missing comma between members
+            out.append(',')
+            state = frame[1] = 'key' if frame[0] == '{' else 'value'
+
+        if frame and frame[0] == '{' and state == 'key':
+            if token.kind != 'str' or token.partial:
+                break
+            out.append(token.text)
+            frame[1] = 'colon'
+            continue
+
+        if state != 'value':
+            return None
+        if token.kind in '{[':
+            out.append(token.kind)
+            stack.append([token.kind, 'key' if token.kind == '{' else 'value'])
+            mark_safe()
+        elif token.kind == 'str':
+            # An unterminated string keeps the text that arrived
+            out.append(token.text)
+            value_done()
+        else:
+            literal = None if token.partial else _literal(token.text)
+            if literal is None:
+                break
+            out.append(literal)
+            value_done()
+
+    # Input ended inside the object: keep complete members, close the rest
+    length, frames = safe
+    if not frames:
+        return None
+    del out[length:]
+    if out and out[-1] == ',':
+        out.pop()
+    for bracket, _ in reversed(frames):
+        out.append('}' if bracket == '{' else ']')
+    return ''.join(out)
+
+
+def parse_json(text: str) -> Tuple[Optional[Any], str]:
+    """
+    Parse the JSON object in a model response
+
+    Returns:
+        (data, outcome) with outcome 'ok' (parsed as is), 'repaired' or
+        'failed' (data is None)
+    """
+    if not text:
+        return None, FAILED
+    start, end = text.find('{'), text.rfind('}')
+    if 0 <= start < end:
+        try:
+            return json.loads(text[start:end + 1]), OK
+        except ValueError:
+            pass
+    repaired = repair_json(text)
+    if repaired is None:
+        return None, FAILED
+    try:
+        return json.loads(repaired), REPAIRED
+    except ValueError:
+        return None, FAILED
@@ -0,0 +1,99 @@
+"""
+Incremental JSON parsing for streamed model output
+Gemini streams a day as text chunks of one JSON object. ArrayItemStream
+scans the chunks as they arrive and hands out each element of a chosen
+top-level array (e.g. "activities") as soon as its closing bracket is seen,
+so the plan view can fill in before the whole day has been generated.
+"""
+import json
+from typing import Any, List, Optional
+
+from .json_repair import parse_json
+
+
+class ArrayItemStream:
+    """
+    Completed elements of `root[key]` from a JSON text fed in chunks
+
+    Only object/array elements are reported (scalars in the array are
+    ignored). The scanner keeps its state between chunks, so each character
+    is looked at once.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.text = ''
+        self.items: List[Any] = []
+        self._pos = 0
+        self._started = False
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        # Per open container: [bracket, key it is the value of]
+        self._stack: List[list] = []
+        self._pending_key: Optional[str] = None
+        self._item_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Add a chunk; returns the elements completed by it"""
+        self.text += chunk
+        completed = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            char = text[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = text[self._string_start:i]
+                continue
+            if not self._started:
+                # Skip prose and the ```json fence before the object
+                if char == '{':
+                    self._started = True
+                    self._stack.append(['{', None])
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i + 1
+            elif char == ':':
+                self._pending_key = self._last_string
+            elif char == ',':
+                self._pending_key = None
+            elif char in '{[':
+                parent = self._stack[-1] if self._stack else None
+                key = self._pending_key if parent and parent[0] == '{' else None
+                self._stack.append([char, key])
+                self._pending_key = None
+                if self._in_target(len(self._stack) - 1):
+                    self._item_start = i
+            elif char in '}]':
+                if not self._stack:
+                    continue
+                depth = len(self._stack) - 1
+                self._stack.pop()
+                if self._item_start is not None and self._in_target(depth):
+                    item = self._load(text[self._item_start:i + 1])
+                    self._item_start = None
+                    if item is not None:
+                        completed.append(item)
+        self._pos = len(text)
+        self.items.extend(completed)
+        return completed
+
+    def _in_target(self, depth: int) -> bool:
+        """The container at `depth` is an element of root[key]"""
+        return (depth == 2 and self._stack[0][0] == '{'
+                and self._stack[1][0] == '[' and self._stack[1][1] == self.key)
+
+    @staticmethod
+    def _load(text: str) -> Optional[Any]:
+        try:
+            return json.loads(text)
+        except ValueError:
+            return parse_json(text)[0]
@@ -0,0 +1,270 @@
+"""
+Two-stage plan editing
+Stage 1 locates the days (and, when it can tell, the activities) an edit
+request is about. Day numbers, ordinals, "ngày đầu/cuối", meal words and
+activity titles are matched locally. Only when nothing matches is the model
+asked, with a one-line-per-activity outline of the plan.
+Stage 2 sends just the located days, in compact JSON, and asks for patch
+operations (replace / insert / remove / update). The operations are
+validated against the days that were sent and applied locally, so the edit
+prompt stays the same size however long the plan is.
+"""
+import copy
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .schemas import to_int, validate_activity
+
+# Activity fields sent to the model and accepted back from `update`
+ACTIVITY_FIELDS = ('time', 'type', 'title', 'description', 'location', 'cost')
+OPERATIONS = ('replace', 'insert', 'remove', 'update')
+# Beyond this many days the edit is treated as plan-wide and the
+# description fields are shortened to keep the prompt bounded
+MAX_FULL_DAYS = 3
+SHORT_DESCRIPTION = 80
+
+_ORDINALS = {
+    'nhất': 1, 'một': 1, 'hai': 2, 'ba': 3, 'tư': 4, 'bốn': 4, 'năm': 5,
+    'sáu': 6, 'bảy': 7, 'tám': 8, 'chín': 9, 'mười': 10
+}
+_NUMBER_LIST = r'\d+(?:\s*(?:,|và|-|–|đến|tới|&)\s*\d+)*'
+# "ngày 2", "ngày thứ 3", "hôm 2", "day 2", "ngày 1 và 3", "ngày 2-4"
+# (not dates such as "ngày 20/12": the number may not shrink to "2" either)
+_DAY_NUMBERS = re.compile(rf'\b(?:ngày|hôm|day)\s*(?:thứ\s*)?({_NUMBER_LIST})(?!\d|[/.]\d)', re.I)
+_DAY_ORDINAL = re.compile(r'\b(?:ngày|hôm)\s+thứ\s+(' + '|'.join(_ORDINALS) + r')\b', re.I)
+_FIRST_DAY = re.compile(r'\bngày\s+đầu(?:\s+tiên)?\b', re.I)
+_LAST_DAY = re.compile(r'\bngày\s+(?:cuối(?:\s+cùng)?|chót)\b', re.I)
+_ALL_DAYS = re.compile(r'\b(?:tất cả(?: các)? ngày|mỗi ngày|mọi ngày|cả chuyến|toàn bộ)\b', re.I)
+# "các ngày" alone means the whole trip, "các ngày 2 và 3" just those days
+_SOME_DAYS = re.compile(r'\bcác ngày\b', re.I)
+_RANGE_WORDS = re.compile(r'\s*(?:-|–|đến|tới)\s*')
+
+# Meal / time-of-day words -> activity types and a time window (hours)
+_SLOTS = [
+    (re.compile(r'\b(?:bữa\s+)?(?:ăn\s+)?sáng\b|\bbreakfast\b', re.I), {'breakfast'}, (5, 10)),
+    (re.compile(r'\b(?:bữa\s+)?(?:ăn\s+)?trưa\b|\blunch\b', re.I), {'lunch'}, (11, 14)),
+    (re.compile(r'\b(?:bữa\s+)?(?:ăn\s+)?tối\b|\bdinner\b', re.I), {'dinner'}, (18, 22)),
+]
+
+
+@dataclass
+class EditTarget:
+    """Days (1-based) and activities (day, index) an edit request is about"""
+    days: List[int] = field(default_factory=list)
+    activities: List[Tuple[int, int]] = field(default_factory=list)
+    source: str = 'rules'  # rules | model | all
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'days': self.days, 'activities': [list(a) for a in self.activities], 'source': self.source}
+
+
+# ===== STAGE 1: LOCATE =====
+
+def _expand_numbers(text: str) -> List[int]:
+    numbers: List[int] = []
+    for part in re.split(r'\s*(?:,|và|&)\s*', text):
+        bounds = [int(n) for n in _RANGE_WORDS.split(part) if n.strip().isdigit()]
+        if len(bounds) == 2 and bounds[0] <= bounds[1]:
+            numbers.extend(range(bounds[0], bounds[1] + 1))
+        else:
+            numbers.extend(bounds)
+    return numbers
+
+
+def _hour(value: Any) -> Optional[int]:
+    match = re.match(r'\s*(\d{1,2})', str(value or ''))
+    return int(match.group(1)) if match else None
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r'\s+', ' ', text.lower()).strip()
+
+
+def locate_days(message: str, day_count: int) -> Tuple[List[int], bool]:
+    """
+    Day numbers mentioned in an edit request
+
+    Returns:
+        (days, all_days): days in range, sorted; all_days when the request
+        is about the whole trip
+    """
+    days: Set[int] = set()
+    for match in _DAY_NUMBERS.finditer(message):
+        days.update(_expand_numbers(match.group(1)))
+    for match in _DAY_ORDINAL.finditer(message):
+        days.add(_ORDINALS[match.group(1).lower()])
+    if _FIRST_DAY.search(message):
+        days.add(1)
+    if _LAST_DAY.search(message):
+        days.add(day_count)
+    all_days = bool(_ALL_DAYS.search(message)) or (not days and bool(_SOME_DAYS.search(message)))
+    return sorted(day for day in days if 1 <= day <= day_count), all_days
+
+
+def locate_activities(message: str, itinerary: List[Dict], days: List[int]) -> List[Tuple[int, int]]:
+    """
+    Activities an edit request names, as (day, index)
+
+    Activity titles quoted in the message are looked up in every day; meal
+    words (bữa sáng / trưa / tối) only in the given days.
+    """
+    text = _normalize(message)
+    found: List[Tuple[int, int]] = []
+    for day_num, day in enumerate(itinerary, 1):
+        for index, activity in enumerate(day.get('activities') or []):
+            title = _normalize(str(activity.get('title') or ''))
+            if len(title) >= 4 and title in text:
+                found.append((day_num, index))
+
+    for pattern, types, (start, end) in _SLOTS:
+        if not pattern.search(message):
+            continue
+        for day_num in days:
+            activities = itinerary[day_num - 1].get('activities') or []
+            matches = [i for i, a in enumerate(activities) if str(a.get('type') or '').lower() in types]
+            if not matches:
+                matches = [i for i, a in enumerate(activities)
+                           if _hour(a.get('time')) is not None and start <= _hour(a.get('time')) <= end]
+            found.extend((day_num, i) for i in matches[:1])
+    return sorted(set(found))
+
+
+def locate(message: str, plan: Dict) -> Optional[EditTarget]:
+    """
+    Stage 1 by rules
+
+    Returns:
+        The target, or None when the request names no day or activity
+    """
+    itinerary = plan.get('itinerary') or []
+    if not itinerary:
+        return None
+    days, all_days = locate_days(message, len(itinerary))
+    if all_days:
+        return EditTarget(days=list(range(1, len(itinerary) + 1)), source='all')
+    activities = locate_activities(message, itinerary, days)
+    days = sorted(set(days) | {day for day, _ in activities})
+    if not days:
+        return None
+    return EditTarget(days=days, activities=activities)
+
+
+def outline_for_locator(plan: Dict) -> str:
+    """One short line per activity, for the model-side locator"""
+    lines = []
+    for day_num, day in enumerate(plan.get('itinerary') or [], 1):
+        lines.append(f"Ngày {day_num}: {day.get('title', '')}")
+        for index, activity in enumerate(day.get('activities') or []):
+            lines.append(f"  {index}. {activity.get('time', '')} {activity.get('title', '')}")
+    return '\n'.join(lines)
+
+
+def parse_locator_answer(data: Any, day_count: int) -> Optional[EditTarget]:
+    """EditTarget from the model locator's JSON ({"days": [...], "activities": [...]})"""
+    if not isinstance(data, dict):
+        return None
+    days = sorted({d for d in data.get('days') or [] if isinstance(d, int) and 1 <= d <= day_count})
+    activities = []
+    for item in data.get('activities') or []:
+        if isinstance(item, dict) and item.get('day') in days and isinstance(item.get('index'), int):
+            activities.append((item['day'], item['index']))
+    if not days:
+        return None
+    return EditTarget(days=days, activities=sorted(set(activities)), source='model')
+
+
+# ===== STAGE 2: PATCH =====
+
+def compact_days(plan: Dict, days: List[int]) -> str:
+    """
+    The target days as compact JSON (no indentation, activity fields only)
+
+    Descriptions are shortened when many days are sent.
+    """
+    shorten = len(days) > MAX_FULL_DAYS
+    result = []
+    for day_num in days:
+        day = plan['itinerary'][day_num - 1]
+        activities = []
+        for activity in day.get('activities') or []:
+            item = {key: activity[key] for key in ACTIVITY_FIELDS if activity.get(key) not in (None, '')}
+            if shorten and len(item.get('description', '')) > SHORT_DESCRIPTION:
+                item['description'] = item['description'][:SHORT_DESCRIPTION] + '…'
+            activities.append(item)
+        result.append({'day': day_num, 'title': day.get('title', ''), 'activities': activities})
+    return json.dumps(result, ensure_ascii=False, separators=(',', ':'))
+
+
+def validate_operations(data: Any, plan: Dict, days: List[int]) -> Tuple[Optional[List[Dict]], bool]:
+    """
+    Patch operations that can be applied to the sent days
+
+    Returns:
+        (operations, dropped): operations is None when the payload has no
+        operations list; dropped is True when some were invalid
+    """
+    items = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        return None, False
+    operations = []
+    for item in items:
+        if not isinstance(item, dict) or item.get('op') not in OPERATIONS or item.get('day') not in days:
+            continue
+        size = len(plan['itinerary'][item['day'] - 1].get('activities') or [])
+        index = item.get('index')
+        if not isinstance(index, int) or index < 0 or index > size or (index == size and item['op'] != 'insert'):
+            continue
+        operation = {'op': item['op'], 'day': item['day'], 'index': index}
+        if item['op'] in ('replace', 'insert'):
+            activity = validate_activity(item.get('activity'))
+            if activity is None:
+                continue
+            operation['activity'] = {key: value for key, value in activity.items() if key in ACTIVITY_FIELDS}
+        elif item['op'] == 'update':
+            fields = item.get('fields') if isinstance(item.get('fields'), dict) else item.get('activity')
+            fields = {key: value for key, value in (fields or {}).items() if key in ACTIVITY_FIELDS}
+            if 'cost' in fields:
+                fields['cost'] = to_int(fields['cost']) or 0
+            if not fields:
+                continue
+            operation['fields'] = fields
+        operations.append(operation)
+    return operations, len(operations) < len(items)
+
+
+def apply_operations(plan: Dict, operations: List[Dict]) -> Tuple[Dict, List[str]]:
+    """
+    Apply validated operations to a copy of the plan
+
+    Indexes refer to the plan as sent, so operations are applied per day
+    from the highest index down; at the same index a removal goes before an
+    insert, so remove + insert replaces.
+
+    Returns:
+        (modified plan, human-readable change log)
+    """
+    modified = copy.deepcopy(plan)
+    log = []
+    order = {'update': 0, 'replace': 1, 'remove': 2, 'insert': 3}
+    # Ties keep the requested order once applied (later inserts go first)
+    ranked = sorted(enumerate(operations),
+                    key=lambda item: (item[1]['day'], -item[1]['index'], order[item[1]['op']], -item[0]))
+    for _, operation in ranked:
+        activities = modified['itinerary'][operation['day'] - 1].setdefault('activities', [])
+        index = operation['index']
+        label = f"Ngày {operation['day']} #{index + 1}"
+        if operation['op'] == 'replace' and index < len(activities):
+            old = activities[index].get('title', '')
+            activities[index] = operation['activity']
+            log.append(f"{label}: '{old}' → '{operation['activity']['title']}'")
+        elif operation['op'] == 'insert':
+            activities.insert(min(index, len(activities)), operation['activity'])
+            log.append(f"{label}: + '{operation['activity']['title']}'")
+        elif operation['op'] == 'remove' and index < len(activities):
+            log.append(f"{label}: - '{activities.pop(index).get('title', '')}'")
+        elif operation['op'] == 'update' and index < len(activities):
+            activities[index].update(operation['fields'])
+            log.append(f"{label}: {', '.join(operation['fields'])}")
+    return modified, log
@@ -0,0 +1,277 @@
+"""
+Response schemas and validators for the agent's JSON payloads
+The schemas are sent with structured-output requests (response_mime_type
+application/json + response_schema) so Gemini emits the payload directly.
+The validators check parsed payloads against the same shapes and salvage
+what is usable: activities without a title are dropped, costs written as
+text are converted, missing day fields are filled in.
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+ACTIVITY_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'time': {'type': 'string'},
+        'type': {'type': 'string'},
+        'title': {'type': 'string'},
+        'description': {'type': 'string'},
+        'location': {'type': 'string'},
+        'cost': {'type': 'integer'}
+    },
+    'required': ['time', 'title', 'description', 'cost']
+}
+
+_COST_ITEM_SCHEMA = {
+    'type': 'object',
+    'properties': {'amount': {'type': 'integer'}, 'description': {'type': 'string'}},
+    'required': ['amount']
+}
+
+OUTLINE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'plan_name': {'type': 'string'},
+        'cost_breakdown': {
+            'type': 'object',
+            'properties': {
+                'accommodation': _COST_ITEM_SCHEMA,
+                'food': _COST_ITEM_SCHEMA,
+                'transportation': _COST_ITEM_SCHEMA,
+                'activities': _COST_ITEM_SCHEMA
+            }
+        },
+        'total_cost': {'type': 'integer'},
+        'general_notes': {'type': 'array', 'items': {'type': 'string'}},
+        'day_themes': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {'day': {'type': 'integer'}, 'theme': {'type': 'string'}},
+                'required': ['day', 'theme']
+            }
+        }
+    },
+    'required': ['plan_name', 'cost_breakdown', 'total_cost', 'day_themes']
+}
+
+DAY_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'day': {'type': 'integer'},
+        'title': {'type': 'string'},
+        'description': {'type': 'string'},
+        'activities': {'type': 'array', 'items': ACTIVITY_SCHEMA},
+        'notes': {'type': 'array', 'items': {'type': 'string'}}
+    },
+    'required': ['day', 'title', 'activities']
+}
+
+# Edit locator: which days/activities a request is about
+LOCATE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'days': {'type': 'array', 'items': {'type': 'integer'}},
+        'activities': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {'day': {'type': 'integer'}, 'index': {'type': 'integer'}},
+                'required': ['day', 'index']
+            }
+        }
+    },
+    'required': ['days']
+}
+
+# Streaming edit: patch operations on the days that were sent
+EDIT_PATCH_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'understanding': {'type': 'string'},
+        'operations': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'op': {'type': 'string', 'enum': ['replace', 'insert', 'remove', 'update']},
+                    'day': {'type': 'integer'},
+                    'index': {'type': 'integer'},
+                    'activity': ACTIVITY_SCHEMA,
+                    'fields': {
+                        'type': 'object',
+                        'properties': {key: value for key, value in ACTIVITY_SCHEMA['properties'].items()}
+                    }
+                },
+                'required': ['op', 'day', 'index']
+            }
+        },
+        'explanation': {'type': 'string'}
+    },
+    'required': ['operations', 'explanation']
+}
+
+# Non-streaming edit: same replacements under modified_sections
+EDIT_SECTIONS_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'success': {'type': 'boolean'},
+        'changes': {'type': 'string'},
+        'modified_sections': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'day': {'type': 'integer'},
+                    'activity_index': {'type': 'integer'},
+                    'new_activity': ACTIVITY_SCHEMA
+                },
+                'required': ['day', 'activity_index', 'new_activity']
+            }
+        }
+    },
+    'required': ['success', 'changes', 'modified_sections']
+}
+
+
+def json_generation_config(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """generation_config overrides for a structured-output request"""
+    return {'response_mime_type': 'application/json', 'response_schema': schema}
+
+
+# ===== VALIDATION =====
+
+def to_int(value: Any) -> Optional[int]:
+    """Integer from a number or text such as '150.000đ' / '1,2 triệu'"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if not isinstance(value, str):
+        return None
+    text = value.lower().strip()
+    millions = 'triệu' in text or text.endswith('tr')
+    thousands = not millions and ('nghìn' in text or 'ngàn' in text or text.endswith('k'))
+    if millions or thousands:
+        match = re.search(r'\d+(?:[.,]\d+)?', text)
+        if not match:
+            return None
+        return int(float(match.group(0).replace(',', '.')) * (1000000 if millions else 1000))
+    digits = re.sub(r'[^\d]', '', text.split('-')[0])
+    return int(digits) if digits else None
+
+
+def _text(value: Any) -> str:
+    return value.strip() if isinstance(value, str) else ''
+
+
+def _strings(value: Any) -> List[str]:
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list):
+        return []
+    return [item.strip() for item in value if isinstance(item, str) and item.strip()]
+
+
+def validate_activity(data: Any) -> Optional[Dict[str, Any]]:
+    """Normalized activity, or None when it has no title"""
+    if not isinstance(data, dict) or not _text(data.get('title')):
+        return None
+    activity = dict(data)
+    activity['title'] = _text(data['title'])
+    activity['time'] = _text(data.get('time'))
+    activity['description'] = _text(data.get('description'))
+    activity['cost'] = to_int(data.get('cost')) or 0
+    for field in ('type', 'location'):
+        if field in activity:
+            activity[field] = _text(activity[field])
+    return activity
+
+
+def validate_day(data: Any, day_num: int, theme: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """
+    Check a single-day payload, salvaging what is usable
+
+    Returns:
+        (day, salvaged): day is None without any usable activity; salvaged
+        is True when activities were dropped or fields filled in
+    """
+    if not isinstance(data, dict):
+        return None, False
+    raw_activities = data.get('activities')
+    if not isinstance(raw_activities, list):
+        return None, False
+    activities = [a for a in (validate_activity(item) for item in raw_activities) if a]
+    if not activities:
+        return None, False
+
+    salvaged = len(activities) < len(raw_activities)
+    day = dict(data)
+    day['day'] = day_num
+    if not _text(data.get('title')):
+        day['title'] = f'Ngày {day_num}: {theme}'
+        salvaged = True
+    day['activities'] = activities
+    day['notes'] = _strings(data.get('notes'))
+    return day, salvaged
+
+
+def validate_outline(data: Any, requirements: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """
+    Check a plan outline, filling gaps from the requirements
+
+    Returns:
+        (outline, salvaged): outline is None without a plan name or day themes
+    """
+    if not isinstance(data, dict):
+        return None, False
+    themes = []
+    for item in data.get('day_themes') or []:
+        if isinstance(item, dict) and to_int(item.get('day')) and _text(item.get('theme')):
+            themes.append({'day': to_int(item['day']), 'theme': _text(item['theme'])})
+    if not _text(data.get('plan_name')) and not themes:
+        return None, False
+
+    salvaged = False
+    outline = dict(data)
+    if not _text(data.get('plan_name')):
+        outline['plan_name'] = f"Khám phá {requirements.get('destination', 'Việt Nam')}"
+        salvaged = True
+    outline['day_themes'] = themes
+    total = to_int(data.get('total_cost'))
+    if total is None:
+        total = requirements.get('budget', 0)
+        salvaged = True
+    outline['total_cost'] = total
+    breakdown = data.get('cost_breakdown') if isinstance(data.get('cost_breakdown'), dict) else {}
+    outline['cost_breakdown'] = {
+        key: {'amount': to_int(item.get('amount')) or 0, 'description': _text(item.get('description'))}
+        for key, item in breakdown.items() if isinstance(item, dict)
+    }
+    outline['general_notes'] = _strings(data.get('general_notes'))
+    # The plan stores them as notes
+    outline.setdefault('notes', outline['general_notes'])
+    return outline, salvaged
+
+
+def validate_changes(data: Any, key: str) -> Tuple[Optional[List[Dict[str, Any]]], bool]:
+    """
+    Activity replacements under `key` ('changes' or 'modified_sections')
+
+    Returns:
+        (changes, salvaged): changes is None when the list is missing;
+        entries without a usable day, index or new activity are dropped
+    """
+    items = data.get(key) if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        return None, False
+    changes = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        day, index = to_int(item.get('day')), to_int(item.get('activity_index'))
+        activity = validate_activity(item.get('new_activity'))
+        if day is None or day < 1 or index is None or index < 0 or activity is None:
+            continue
+        changes.append(dict(item, day=day, activity_index=index, new_activity=activity))
+    return changes, len(changes) < len(items)
@@ -6,18 +6,23 @@ from typing import List, Dict, Optional
 import logging
 from datetime import datetime
 
+from utils.cache import TTLCache
+from utils.tracing import traced
+
 logger = logging.getLogger(__name__)
 
 class SearchTool:
     """Web search using DuckDuckGo"""
     
-    def __init__(self, max_results: int = 5, timeout: int = 10):
+    def __init__(self, max_results: int = 5, timeout: int = 10, result_cache: Optional[TTLCache] = None):
         self.max_results = max_results
         self.timeout = timeout
+        self.result_cache = result_cache
     
+    @traced('search')
     def search(self, query: str, max_results: Optional[int] = None) -> List[Dict[str, str]]:
         """
-        Search the web using DuckDuckGo
+        Search the web using DuckDuckGo, through the result cache when configured
         
         Args:
             query: Search query
@@ -26,6 +31,24 @@ class SearchTool:
         Returns:
             List of search results with title, snippet, url
         """
+        if self.result_cache is None:
+            return self._search_web(query, max_results)
+        
+        def load():
+            results = self._search_web(query, max_results)
+            # Mock fallbacks are not cached so the next call retries DuckDuckGo
+            if any(r.get('source') != 'mock' for r in results):
+                return results
+            return None
+        
+        key = (query.strip().lower(), max_results or self.max_results)
+        results = self.result_cache.get_or_load(key, load)
+        if results is None:
+            return self._mock_search(query, max_results)
+        return list(results)
+    
+    def _search_web(self, query: str, max_results: Optional[int] = None) -> List[Dict[str, str]]:
+        """Query DuckDuckGo, falling back to mock results on any failure"""
         logger.info(f"🔍 Starting search for: '{query}'")
         
         try:
@@ -0,0 +1,111 @@
+"""
+Speculative destination searches
+A plan request used to wait for intent analysis (one model call) before its
+destination searches started. When the local matcher already recognises a
+destination in the message, the searches now start right away, in parallel
+with the intent call. The plan handler takes the result once plan mode is
+confirmed; any other intent discards it. Entries nobody takes (plan request
+blocked, requirements still missing) expire after `ttl` seconds.
+"""
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _key(destination: Optional[str]) -> str:
+    return ' '.join((destination or '').lower().split())
+
+
+class SpeculativeSearches:
+    """
+    In-flight destination searches, shared by concurrent requests
+
+    Two requests for the same destination share one search: every start()
+    is a claim, released by take() or discard(); the entry is dropped with
+    the last claim. Stats use the cache lookup names — a hit is a plan
+    search served by a speculative one, a miss a plan search without one.
+    """
+
+    def __init__(self, search: Callable[[str], Any], ttl: float = 120, max_workers: int = 4):
+        self.search = search
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='speculative-search')
+        # key -> [future, claims, started_at]
+        self._entries: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'started': 0, 'discarded': 0, 'expired': 0}
+
+    def start(self, destination: str):
+        """Start searching a destination (or join the search already running)"""
+        key = _key(destination)
+        if not key:
+            return
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[1] += 1
+                return
+            # Run in the request's context so the searches show up in its trace
+            context = contextvars.copy_context()
+            future = self._executor.submit(context.run, self.search, destination)
+            self._entries[key] = [future, 1, time.monotonic()]
+            self.stats['started'] += 1
+        logger.info(f"🔮 Speculative search started for: {destination}")
+
+    def take(self, destination: Optional[str], timeout: Optional[float] = None) -> Optional[Any]:
+        """
+        Result of the speculative search for a destination
+
+        Returns:
+            The search function's result, or None when there was none (or it
+            failed) and the caller should search itself
+        """
+        future, _ = self._release(destination, 'hits')
+        if future is None:
+            with self._lock:
+                self.stats['misses'] += 1
+            return None
+        try:
+            return future.result(timeout=timeout)
+        except Exception as e:
+            logger.warning(f"⚠️ Speculative search for {destination} failed: {str(e)}")
+            return None
+
+    def discard(self, destination: Optional[str]):
+        """Give up a claim (the request turned out not to need the search)"""
+        future, last = self._release(destination, 'discarded')
+        # Other requests may still be waiting on a shared search
+        if last and future.cancel():
+            logger.info(f"🔮 Speculative search cancelled for: {destination}")
+
+    def _release(self, destination: Optional[str], stat: str) -> Tuple[Optional[Future], bool]:
+        """Drop one claim: (future, whether it was the last one), (None, False) without an entry"""
+        key = _key(destination)
+        with self._lock:
+            # Exactly the destination start() was called with: a claim is
+            # never taken from another destination's search
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, False
+            entry[1] -= 1
+            last = entry[1] <= 0
+            if last:
+                del self._entries[key]
+            self.stats[stat] += 1
+            return entry[0], last
+
+    def _expire(self):
+        now = time.monotonic()
+        for key in [k for k, entry in self._entries.items() if now - entry[2] > self.ttl]:
+            self._entries.pop(key)[0].cancel()
+            self.stats['expired'] += 1
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._entries)
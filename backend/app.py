@@ -4,17 +4,35 @@ Main Flask application for khappha.online
 from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response, stream_with_context, send_file
 from flask_cors import CORS
 from flask_session import Session
-from io import BytesIO
 import os
 import uuid
 import json
+import atexit
 import logging
+import time
 from datetime import datetime
 
 from config import config, Config
 from database.db_manager import DatabaseManager
 from agents.ai_agent import TravelAgent
-from utils.pdf_generator import TravelPlanPDFGenerator
+from agents.conversation_summary import ConversationSummaries, ConversationSummarizer
+from agents.search_tool import SearchTool
+from agents.instrumentation import track_llm_usage, current_usage, LLM_BREAKER
+from utils.pdf_generator import PDFCache
+from utils.http_cache import compute_etag, not_modified, with_etag, init_compression
+from utils.assets import init_assets
+from utils.metrics import REGISTRY, init_http_metrics
+from utils.tracing import init_tracing, current_trace, use_trace
+from utils.logging_setup import init_logging
+from utils.profiling import init_profiling
+from utils.sse import sse_event
+from utils.cache import TTLCache, PersistentDict
+from utils.hotel_search import HotelSearcher
+from utils.flight_search import AgodaFlightSearchAPI
+from utils.airport_index import AirportIndex
+from services.pdf_service import PDFRenderService, PDFQueueFull
+from services.plan_export import PlanExporter
+from services.cassette import open_cassette
 from utils.auth import (
     validate_email, 
     validate_username, 
@@ -23,10 +41,17 @@ from utils.auth import (
     generate_session_token
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG
-)
+# Initialize PDF rendering (worker processes render into the on-disk cache).
+# The server forks the workers here, before the log listener or any other
+# thread starts; an imported app starts them on the first render.
+pdf_cache = PDFCache(Config.PDF_CACHE_DIR, max_files=Config.PDF_CACHE_MAX_FILES)
+pdf_service = PDFRenderService.from_config(pdf_cache)
+if __name__ == '__main__':
+    pdf_service.start()
+atexit.register(pdf_service.close)
+
+# Configure logging (queued JSON records, levels from Config)
+init_logging(Config)
 
 # Create logger
 logger = logging.getLogger(__name__)
@@ -44,23 +69,143 @@ Config.init_app(app)
 # Initialize Flask-Session
 Session(app)
 
-# Set Flask app logger level
-app.logger.setLevel(logging.DEBUG)
-
 # Enable CORS
 CORS(app)
 
+# Enable gzip/brotli compression for JSON and SSE responses
+init_compression(app)
+
+# Per-request span tracing (Server-Timing header, structured trace log)
+init_tracing(app)
+
+# Request counts and latency per route for /metrics
+init_http_metrics(app)
+
+# Admin-only cProfile / stack sampling / tracemalloc (off without PROFILING_TOKEN)
+init_profiling(app)
+
+# Serve fingerprinted JS/CSS bundles (built with `python -m utils.assets`)
+init_assets(app, enabled=Config.ASSETS_BUNDLED)
+
 # Initialize database
 db = DatabaseManager(Config.DATABASE_PATH)
 
-# Initialize AI Agent
+# Offline stand-ins for Gemini, DuckDuckGo, RapidAPI and Gmail (load testing)
+stubs = None
+if Config.PROVIDER_MODE == 'stub':
+    from services.stubs import StubProviders
+    from utils.email_service import set_email_transport
+    stubs = StubProviders(Config.STUB_LATENCY, seed=Config.STUB_SEED)
+    set_email_transport(stubs.send_email)
+    logger.warning(f"🧪 Provider mode: stub ({stubs.describe()})")
+
+# Initialize AI Agent (web search results cached in memory)
+search_options = dict(
+    max_results=5,
+    timeout=Config.SEARCH_TIMEOUT,
+    result_cache=TTLCache(
+        'web_search',
+        ttl=Config.CACHE_TTL_HOURS * 3600,
+        max_size=Config.CACHE_MAX_SIZE
+    ) if Config.SEARCH_CACHE_ENABLED else None
+)
 ai_agent = TravelAgent(
     api_key=Config.GEMINI_API_KEY,
     model_name=Config.GEMINI_MODEL,
     temperature=Config.GEMINI_TEMPERATURE,
-    max_tokens=Config.GEMINI_MAX_TOKENS
+    max_tokens=Config.GEMINI_MAX_TOKENS,
+    search_tool=stubs.search_tool(**search_options) if stubs else SearchTool(**search_options),
+    model=stubs.gemini if stubs else None,
+    structured_output=Config.GEMINI_STRUCTURED_OUTPUT,
+    speculative_search=Config.SPECULATIVE_SEARCH
+)
+if stubs:
+    stubs.bind_agent(ai_agent)
+
+# Initialize shared hotel searcher (city IDs persisted, results cached)
+hotel_searcher = HotelSearcher(
+    api_key=Config.RAPIDAPI_KEY,
+    city_id_store=PersistentDict(Config.HOTEL_CITY_ID_PATH),
+    result_cache=TTLCache(
+        'hotel_search',
+        ttl=Config.HOTEL_CACHE_TTL_SECONDS,
+        stale_ttl=Config.HOTEL_CACHE_STALE_SECONDS,
+        max_size=Config.HOTEL_CACHE_MAX_SIZE
+    ),
+    http_client=stubs.http if stubs else None
 )
 
+# Initialize shared flight searcher (airport codes resolved offline when possible)
+flight_searcher = AgodaFlightSearchAPI(
+    api_key=Config.RAPIDAPI_KEY,
+    airport_index=AirportIndex(PersistentDict(Config.AIRPORT_INDEX_PATH)),
+    http_client=stubs.http if stubs else None
+)
+
+# Record or replay every outbound call (reproducible benchmarks)
+cassette = open_cassette(Config.CASSETTE_MODE, Config.CASSETTE_PATH, time_scale=Config.CASSETTE_TIME_SCALE)
+if cassette:
+    cassette.install(ai_agent, hotel_searcher, flight_searcher)
+    logger.warning(f"📼 Cassette {cassette.mode}: {cassette.path} (time scale {cassette.time_scale})")
+
+plan_exporter = PlanExporter(db, pdf_cache, pdf_service)
+
+# Rolling per-conversation summaries for the history-aware prompts (updated in the background)
+conversation_summaries = ConversationSummaries(db, ConversationSummarizer(
+    model=ai_agent.model if Config.CONVERSATION_SUMMARY_MODEL else None,
+    token_budget=Config.CONVERSATION_SUMMARY_TOKENS
+))
+
+# ===== SATURATION METRICS =====
+# Read from the live objects at scrape time
+
+CACHE_LOOKUP_RESULTS = ('hits', 'stale_hits', 'misses')
+
+def _cache_stats() -> dict:
+    caches = {
+        'hotel_search': hotel_searcher.result_cache.stats,
+        'flight_airports': flight_searcher.airport_index.stats,
+        'pdf': pdf_cache.stats
+    }
+    if ai_agent.search.result_cache is not None:
+        caches['web_search'] = ai_agent.search.result_cache.stats
+    if ai_agent.speculative_searches is not None:
+        caches['speculative_search'] = ai_agent.speculative_searches.stats
+    return caches
+
+def _cache_hit_ratio(stats: dict) -> float:
+    hits = stats.get('hits', 0) + stats.get('stale_hits', 0)
+    lookups = hits + stats.get('misses', 0)
+    return hits / lookups if lookups else 0.0
+
+def _queue_depths() -> dict:
+    return {
+        'pdf_render': pdf_service.queue_depth(),
+        'hotel_cache_refresh': hotel_searcher.result_cache.pending_refreshes()
+    }
+
+REGISTRY.counter(
+    'cache_lookups_total', 'Cache lookups by cache and result', ('cache', 'result'),
+    callback=lambda: [({'cache': name, 'result': result}, count)
+                      for name, stats in _cache_stats().items()
+                      for result, count in stats.items() if result in CACHE_LOOKUP_RESULTS])
+REGISTRY.gauge(
+    'cache_hit_ratio', 'Hits (fresh or stale) / lookups since start', ('cache',),
+    callback=lambda: [({'cache': name}, _cache_hit_ratio(stats)) for name, stats in _cache_stats().items()])
+REGISTRY.gauge(
+    'background_queue_depth', 'Unfinished background jobs', ('queue',),
+    callback=lambda: [({'queue': name}, depth) for name, depth in _queue_depths().items()])
+REGISTRY.gauge(
+    'background_queue_capacity', 'Jobs accepted before new ones are rejected', ('queue',),
+    callback=lambda: [({'queue': 'pdf_render'}, pdf_service.max_queue)])
+REGISTRY.counter(
+    'pdf_jobs_total', 'PDF render jobs by outcome', ('outcome',),
+    callback=lambda: [({'outcome': outcome}, count) for outcome, count in pdf_service.stats.items()])
+SSE_STREAMS_ACTIVE = REGISTRY.gauge('sse_streams_active', 'Chat event streams currently open')
+SSE_STREAM_SECONDS = REGISTRY.histogram(
+    'sse_stream_duration_seconds', 'Chat event stream duration',
+    buckets=(1, 2.5, 5, 10, 20, 30, 60, 90, 120, 180, 300))
+
 # ===== PLAN GENERATION REQUEST TRACKING =====
 # Track active plan generation requests to prevent concurrent creation
 active_plan_requests = {}  # {session_id: timestamp}
@@ -91,6 +236,40 @@ def set_plan_generation_status(session_id: str, active: bool):
             del active_plan_requests[session_id]
             app.logger.info(f"🔓 Plan generation completed for session: {session_id}")
 
+# ===== PDF PRE-RENDERING =====
+
+def refresh_plan_pdf(plan_id: int, prerender: bool = None):
+    """
+    Drop a plan's cached PDF after a mutation and queue a background re-render,
+    so the download button is usually served from a ready file.
+    
+    prerender=None re-renders only plans in Config.PDF_PRERENDER_STATUSES.
+    """
+    pdf_cache.invalidate(plan_id)
+    
+    if not Config.PDF_PRERENDER or prerender is False:
+        return
+    
+    try:
+        version = db.get_plan_version(plan_id)
+        if not version:
+            return
+        if prerender is None and version['status'] not in Config.PDF_PRERENDER_STATUSES:
+            return
+        
+        plan = db.get_plan(plan_id)
+        hotel = db.get_plan_hotel(plan_id)
+        flights = db.get_plan_flights(plan_id)
+        fingerprint = pdf_cache.fingerprint(version, hotel, flights)
+        pdf_service.submit(plan_id, fingerprint, plan.to_dict(), hotel, flights)
+        app.logger.info(f"🖨️ Queued PDF pre-render for plan {plan_id}")
+        
+    except PDFQueueFull:
+        # Rendered on demand at download time instead
+        app.logger.info(f"PDF queue full, skipping pre-render of plan {plan_id}")
+    except Exception as e:
+        app.logger.warning(f"Could not queue PDF pre-render for plan {plan_id}: {str(e)}")
+
 # ===== HELPER FUNCTIONS =====
 
 def get_or_create_session():
@@ -240,7 +419,9 @@ def register_page():
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint (?deep=1 checks dependencies)"""
+    if request.args.get('deep') in ('1', 'true'):
+        return deep_health_check()
     try:
         stats = db.get_stats()
         return jsonify({
@@ -257,6 +438,77 @@ def health_check():
             'error': str(e)
         }), 500
 
+def deep_health_check():
+    """
+    Dependency status for load balancers and dashboards
+
+    Returns 503 when the database is unreachable; saturated or failing
+    optional dependencies make the status 'degraded' but keep 200.
+    """
+    checks = {}
+    
+    try:
+        latency = db.ping()
+        checks['database'] = {'status': 'ok', 'latency_ms': round(latency * 1000, 2)}
+    except Exception as e:
+        app.logger.error(f"Deep health check: database error: {str(e)}")
+        checks['database'] = {'status': 'error', 'error': str(e)}
+    
+    breaker = LLM_BREAKER.to_dict()
+    checks['llm'] = dict(
+        breaker,
+        status='ok' if ai_agent.model is not None and breaker['state'] == 'closed' else 'degraded',
+        configured=ai_agent.model is not None
+    )
+    
+    depth = pdf_service.queue_depth()
+    checks['pdf_workers'] = {
+        'status': 'ok' if depth < Config.PDF_ASYNC_QUEUE_DEPTH else 'degraded',
+        'queue_depth': depth,
+        'queue_capacity': pdf_service.max_queue,
+        'processes': pdf_service.processes
+    }
+    
+    checks['caches'] = {
+        name: {'hit_ratio': round(_cache_hit_ratio(stats), 3)}
+        for name, stats in _cache_stats().items()
+    }
+    checks['streams'] = {'sse_active': SSE_STREAMS_ACTIVE.snapshot().get('_', 0)}
+    if cassette:
+        checks['cassette'] = cassette.to_dict()
+    
+    if checks['database']['status'] != 'ok':
+        status = 'unhealthy'
+    elif any(check.get('status') == 'degraded' for check in checks.values()):
+        status = 'degraded'
+    else:
+        status = 'healthy'
+    
+    return jsonify({
+        'success': status != 'unhealthy',
+        'status': status,
+        'checks': checks,
+        'timestamp': datetime.now().isoformat()
+    }), 503 if status == 'unhealthy' else 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Metrics in the Prometheus text exposition format"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def log_llm_usage(endpoint: str, usage) -> dict:
+    """Log the per-request LLM usage summary and return it"""
+    summary = usage.summary()
+    if summary['calls'] or summary['fallbacks']:
+        app.logger.info(
+            f"📊 LLM usage {endpoint}: {summary['calls']} call(s), {summary['seconds']}s, "
+            f"tokens {summary['prompt_tokens']}/{summary['response_tokens']}, "
+            f"retries {summary['retries']}, parse failures {summary['parse_failures']}, "
+            f"fallbacks {summary['fallbacks']}"
+        )
+    return summary
+
 @app.route('/api/chat-stream', methods=['POST'])
 def chat_stream():
     """Streaming chat endpoint using Server-Sent Events (SSE)"""
@@ -283,36 +535,54 @@ def chat_stream():
     if not conversation_session_id:
         conversation_session_id = str(uuid.uuid4())
     
+    # The stream outlives the request hooks: keep the request's trace
+    trace = current_trace()
+    
     def generate():
         """Generator function for streaming responses"""
-        import json as json_module
-        
+        # LLM calls and spans recorded while streaming are summarized in the done event
+        SSE_STREAMS_ACTIVE.inc()
+        started = time.perf_counter()
+        with use_trace(trace), track_llm_usage():
+            try:
+                yield from stream_events()
+            finally:
+                SSE_STREAMS_ACTIVE.dec()
+                SSE_STREAM_SECONDS.observe(time.perf_counter() - started)
+                if trace is not None:
+                    trace.emit(streamed=True)
+    
+    def stream_events():
         try:
             # Send thinking event
-            yield f"event: thinking\ndata: {{\"status\": \"analyzing\"}}\n\n"
+            yield sse_event('thinking', {'status': 'analyzing'})
             
-            # Get conversation history
-            conversations = db.get_conversations(session_id, limit=10)
-            history = [
-                {'user': conv.user_message, 'bot': conv.bot_response}
-                for conv in conversations
-            ]
+            # Summary of this conversation session + the turns after it
+            conversation_summary, history = conversation_summaries.context(session_id, conversation_session_id)
             
             # Get current plan if needed
             current_plan = data.get('current_plan')
             
             # Quick intent check to determine if this is a plan generation request
             # We need to check BEFORE starting the actual generation
+            # (the result is passed on, so the agent does not analyse it again)
+            intent_analysis = None
             try:
-                intent_analysis = ai_agent._analyze_user_intent(user_message, current_plan)
+                intent_analysis = ai_agent.analyze_intent(
+                    user_message,
+                    conversation_history=history,
+                    current_plan=current_plan,
+                    conversation_summary=conversation_summary
+                )
                 detected_mode = intent_analysis.get('mode', 'ask')
                 
                 # If user is trying to create a plan, check for concurrent requests
                 if detected_mode == 'plan':
                     if is_plan_generation_active(session_id):
                         app.logger.warning(f"🚫 Blocked concurrent plan request for session: {session_id}")
+                        ai_agent.discard_speculative_search(intent_analysis)
                         error_msg = "Bạn đang có một kế hoạch đang được tạo. Vui lòng đợi hoàn thành trước khi tạo kế hoạch mới."
-                        yield f"event: error\ndata: {json_module.dumps({{'error': error_msg, 'type': 'concurrent_request'}}, ensure_ascii=False)}\n\n"
+                        yield sse_event('error', {'error': error_msg, 'type': 'concurrent_request'})
                         return
                     
                     # Mark this session as actively generating a plan
@@ -322,7 +592,7 @@ def chat_stream():
                 # Continue anyway if intent analysis fails
             
             # Send thinking update
-            yield f"event: thinking\ndata: {{\"status\": \"processing\"}}\n\n"
+            yield sse_event('thinking', {'status': 'processing'})
             
             # Use AI agent with streaming
             full_response = ""
@@ -332,22 +602,28 @@ def chat_stream():
             for chunk in ai_agent.chat_stream(
                 user_message, 
                 conversation_history=history,
-                current_plan=current_plan
+                current_plan=current_plan,
+                conversation_summary=conversation_summary,
+                intent_analysis=intent_analysis
             ):
                 # Stream each chunk
                 if chunk.get('type') == 'text':
                     text = chunk.get('content', '')
                     full_response += text
-                    yield f"event: message\ndata: {json_module.dumps({'text': text}, ensure_ascii=False)}\n\n"
+                    yield sse_event('message', {'text': text})
                 
                 elif chunk.get('type') == 'plan':
                     has_plan = True
                     plan_data = chunk.get('content')
-                    yield f"event: plan\ndata: {json_module.dumps(plan_data, ensure_ascii=False)}\n\n"
+                    yield sse_event('plan', plan_data)
+                
+                elif chunk.get('type') == 'activity':
+                    # One itinerary activity, sent while its day is still generating
+                    yield sse_event('activity', chunk.get('content'))
                 
                 elif chunk.get('type') == 'thinking':
                     status = chunk.get('content', 'processing')
-                    yield f"event: thinking\ndata: {{\"status\": \"{status}\"}}\n\n"
+                    yield sse_event('thinking', {'status': status})
             
             # Save plan if generated
             plan_id = None
@@ -383,23 +659,25 @@ def chat_stream():
                 plan_id=plan_id,
                 conversation_session_id=conversation_session_id
             )
+            conversation_summaries.schedule(session_id, conversation_session_id)
             
             # Send completion event with metadata
             completion_data = {
                 'conversation_id': conversation_id,
                 'conversation_session_id': conversation_session_id,
                 'has_plan': has_plan,
-                'plan_id': plan_id
+                'plan_id': plan_id,
+                'llm': log_llm_usage('chat-stream', current_usage()),
+                'timing': trace.breakdown() if trace is not None else None
             }
-            yield f"event: done\ndata: {json_module.dumps(completion_data, ensure_ascii=False)}\n\n"
+            yield sse_event('done', completion_data)
             
             # Clear plan generation status if it was a plan request
             set_plan_generation_status(session_id, False)
             
         except Exception as e:
             app.logger.error(f"Streaming error: {str(e)}")
-            import json as json_module
-            yield f"event: error\ndata: {json_module.dumps({'error': str(e)}, ensure_ascii=False)}\n\n"
+            yield sse_event('error', {'error': str(e)})
             # Clear plan generation status on error
             set_plan_generation_status(session_id, False)
     
@@ -442,12 +720,8 @@ def chat():
             conversation_session_id = str(uuid.uuid4())
             app.logger.info(f"Created new conversation session: {conversation_session_id}")
         
-        # Get conversation history
-        conversations = db.get_conversations(session_id, limit=10)
-        history = [
-            {'user': conv.user_message, 'bot': conv.bot_response}
-            for conv in conversations
-        ]
+        # Summary of this conversation session + the turns after it
+        conversation_summary, history = conversation_summaries.context(session_id, conversation_session_id)
         
         # Get current plan from request (for edit mode)
         current_plan = data.get('current_plan')
@@ -533,11 +807,14 @@ def chat():
                 app.logger.error(traceback.format_exc())
         
         # Use AI agent to process message
-        agent_response = ai_agent.chat(
-            user_message, 
-            conversation_history=history,
-            current_plan=current_plan
-        )
+        with track_llm_usage() as llm_usage:
+            agent_response = ai_agent.chat(
+                user_message, 
+                conversation_history=history,
+                current_plan=current_plan,
+                conversation_summary=conversation_summary
+            )
+        llm_summary = log_llm_usage('chat', llm_usage)
         
         if not agent_response['success']:
             return jsonify({
@@ -584,6 +861,7 @@ def chat():
             plan_id=plan_id,
             conversation_session_id=conversation_session_id
         )
+        conversation_summaries.schedule(session_id, conversation_session_id)
         
         # Update plan with conversation_id (circular reference)
         if plan_id and conversation_id:
@@ -603,6 +881,7 @@ def chat():
             'has_plan': agent_response.get('has_plan', False),
             'mode': agent_response.get('mode', 'plan'),
             'plan_id': plan_id,  # Include plan_id in response
+            'llm': llm_summary,
             'timestamp': datetime.now().isoformat()
         }
         
@@ -707,6 +986,22 @@ def get_plans():
         
         app.logger.info(f"📋 Getting plans - Session: {session_id}, User: {user_id}, Status filter: {status or 'all'}, Limit: {limit}")
         
+        # Conditional GET: compare versions before loading itineraries
+        versions = db.get_plan_versions(
+            session_id=session_id if not user_id else None,
+            user_id=user_id,
+            limit=limit,
+            offset=offset,
+            status=status
+        )
+        etag = compute_etag(
+            'plans', session_id, user_id, limit, offset, status,
+            *[tuple(version.values()) for version in versions]
+        )
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
         plans = db.get_plans(
             session_id=session_id if not user_id else None,
             user_id=user_id,
@@ -717,14 +1012,14 @@ def get_plans():
         
         app.logger.info(f"✅ Found {len(plans)} plans")
         
-        return jsonify({
+        return with_etag(jsonify({
             'success': True,
             'plans': [plan.to_dict() for plan in plans],
             'total': len(plans),
             'limit': limit,
             'offset': offset,
             'authenticated': bool(current_user)
-        })
+        }), etag)
         
     except Exception as e:
         app.logger.error(f"Error getting plans: {str(e)}")
@@ -738,6 +1033,20 @@ def get_plans():
 def get_plan(plan_id):
     """Get specific plan by ID"""
     try:
+        version = db.get_plan_version(plan_id)
+        
+        if not version:
+            return jsonify({
+                'success': False,
+                'error': 'Plan not found'
+            }), 404
+        
+        # Conditional GET: answer 304 without decoding the itinerary
+        etag = compute_etag('plan', *version.values())
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
         plan = db.get_plan(plan_id)
         
         if not plan:
@@ -746,10 +1055,10 @@ def get_plan(plan_id):
                 'error': 'Plan not found'
             }), 404
         
-        return jsonify({
+        return with_etag(jsonify({
             'success': True,
             'plan': plan.to_dict()
-        })
+        }), etag)
         
     except Exception as e:
         app.logger.error(f"Error getting plan: {str(e)}")
@@ -818,6 +1127,8 @@ def update_plan(plan_id):
                 'error': 'Failed to update plan'
             }), 500
         
+        refresh_plan_pdf(plan_id)
+        
         # Get updated plan
         updated_plan = db.get_plan(plan_id)
         
@@ -837,6 +1148,156 @@ def update_plan(plan_id):
         }), 500
 
 
+def plan_access_error(plan_id: int):
+    """404/403 response for a plan the current user cannot edit, else None"""
+    owner = db.get_plan_owner(plan_id)
+    if not owner:
+        return jsonify({'success': False, 'error': 'Plan not found'}), 404
+    current_user = get_current_user()
+    if owner['user_id'] and current_user and owner['user_id'] != current_user.id:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+    return None
+
+
+@app.route('/api/plans/<int:plan_id>/days/<int:day>/activities/<int:index>', methods=['PATCH'])
+def patch_plan_activity(plan_id, day, index):
+    """Update fields of one activity (day is 1-based, index 0-based)"""
+    try:
+        data = request.get_json()
+        
+        if not isinstance(data, dict) or not data:
+            return jsonify({
+                'success': False,
+                'error': 'No data provided'
+            }), 400
+        
+        error = plan_access_error(plan_id)
+        if error:
+            return error
+        
+        activity = db.update_plan_activity(plan_id, day, index, data)
+        if activity is None:
+            return jsonify({
+                'success': False,
+                'error': 'Activity not found'
+            }), 404
+        
+        refresh_plan_pdf(plan_id)
+        
+        return jsonify({
+            'success': True,
+            'day': day,
+            'index': index,
+            'activity': activity
+        })
+        
+    except Exception as e:
+        app.logger.error(f"Error updating activity: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/api/plans/<int:plan_id>/days/<int:day>/activities', methods=['POST'])
+def add_plan_activity(plan_id, day):
+    """Insert an activity; body: {"activity": {...}, "index": optional position}"""
+    try:
+        data = request.get_json()
+        
+        if not isinstance(data, dict) or not isinstance(data.get('activity'), dict):
+            return jsonify({
+                'success': False,
+                'error': 'activity is required'
+            }), 400
+        if data.get('index') is not None and not isinstance(data['index'], int):
+            return jsonify({
+                'success': False,
+                'error': 'index must be an integer'
+            }), 400
+        
+        error = plan_access_error(plan_id)
+        if error:
+            return error
+        
+        index = db.insert_plan_activity(plan_id, day, data['activity'], data.get('index'))
+        if index is None:
+            return jsonify({
+                'success': False,
+                'error': 'Day not found'
+            }), 404
+        
+        refresh_plan_pdf(plan_id)
+        
+        return jsonify({
+            'success': True,
+            'day': day,
+            'index': index,
+            'activity': data['activity']
+        }), 201
+        
+    except Exception as e:
+        app.logger.error(f"Error adding activity: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/api/plans/<int:plan_id>/days/<int:day>/activities/<int:index>', methods=['DELETE'])
+def delete_plan_activity(plan_id, day, index):
+    """Remove one activity"""
+    try:
+        error = plan_access_error(plan_id)
+        if error:
+            return error
+        
+        if not db.delete_plan_activity(plan_id, day, index):
+            return jsonify({
+                'success': False,
+                'error': 'Activity not found'
+            }), 404
+        
+        refresh_plan_pdf(plan_id)
+        
+        return jsonify({
+            'success': True,
+            'message': 'Activity deleted successfully'
+        })
+        
+    except Exception as e:
+        app.logger.error(f"Error deleting activity: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/api/plans/<int:plan_id>/costs', methods=['GET'])
+def get_plan_costs(plan_id):
+    """Activity costs by type and by day"""
+    try:
+        breakdown = db.get_plan_cost_breakdown(plan_id)
+        
+        if breakdown is None:
+            return jsonify({
+                'success': False,
+                'error': 'Plan not found'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'costs': breakdown
+        })
+        
+    except Exception as e:
+        app.logger.error(f"Error getting plan costs: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @app.route('/api/plans/<int:plan_id>', methods=['DELETE'])
 def delete_plan(plan_id):
     """Delete a plan"""
@@ -849,6 +1310,8 @@ def delete_plan(plan_id):
                 'error': 'Plan not found'
             }), 404
         
+        pdf_cache.invalidate(plan_id)
+        
         return jsonify({
             'success': True,
             'message': 'Plan deleted successfully'
@@ -868,6 +1331,8 @@ def toggle_favorite(plan_id):
     try:
         db.toggle_favorite(plan_id)
         
+        refresh_plan_pdf(plan_id)
+        
         return jsonify({
             'success': True,
             'message': 'Favorite status toggled'
@@ -910,6 +1375,8 @@ def update_plan_status(plan_id):
                 'error': 'Plan not found'
             }), 404
         
+        refresh_plan_pdf(plan_id)
+        
         return jsonify({
             'success': True,
             'message': f'Plan status updated to {status}'
@@ -946,15 +1413,8 @@ def search_hotels(plan_id):
                 'error': 'Check-in and check-out dates are required'
             }), 400
         
-        # Import HotelSearcher
-        from utils.hotel_search import HotelSearcher
-        from config import Config
-        
-        # Initialize hotel searcher
-        searcher = HotelSearcher(api_key=Config.RAPIDAPI_KEY)
-        
         # Search hotels - plan is TravelPlan object, use .destination not ['destination']
-        hotels = searcher.search_and_display(
+        hotels = hotel_searcher.search_and_display(
             city_name=plan.destination,
             checkin_date=checkin_date,
             checkout_date=checkout_date,
@@ -1052,6 +1512,8 @@ def save_plan_hotel(plan_id):
                 'error': 'Failed to save hotel'
             }), 500
         
+        refresh_plan_pdf(plan_id, prerender=True)
+        
         return jsonify({
             'success': True,
             'message': 'Hotel saved successfully'
@@ -1096,6 +1558,8 @@ def delete_plan_hotel(plan_id):
                 'error': 'No hotel found for this plan'
             }), 404
         
+        refresh_plan_pdf(plan_id)
+        
         return jsonify({
             'success': True,
             'message': 'Hotel deleted successfully'
@@ -1140,16 +1604,9 @@ def search_flights(plan_id):
                 'error': 'Origin, destination, and departure date are required'
             }), 400
         
-        # Import FlightSearcher
-        from utils.flight_search import AgodaFlightSearchAPI
-        from config import Config
-        
-        # Initialize flight searcher
-        searcher = AgodaFlightSearchAPI(api_key=Config.RAPIDAPI_KEY)
-        
         # Get airport codes
-        origin_code = searcher.get_airport_code(origin)
-        dest_code = searcher.get_airport_code(destination)
+        origin_code = flight_searcher.get_airport_code(origin)
+        dest_code = flight_searcher.get_airport_code(destination)
         
         if not origin_code or not dest_code:
             return jsonify({
@@ -1160,7 +1617,7 @@ def search_flights(plan_id):
         # Search flights
         if return_date:
             # Round trip
-            flights = searcher.search_round_trip_flight(
+            flights = flight_searcher.search_round_trip_flight(
                 origin=origin_code,
                 destination=dest_code,
                 departure_date=departure_date,
@@ -1171,7 +1628,7 @@ def search_flights(plan_id):
             )
         else:
             # One way
-            flights = searcher.search_one_way_flight(
+            flights = flight_searcher.search_one_way_flight(
                 origin=origin_code,
                 destination=dest_code,
                 departure_date=departure_date,
@@ -1188,7 +1645,7 @@ def search_flights(plan_id):
             })
         
         # Extract and format flight information
-        formatted_flights = searcher.extract_flight_info(flights)
+        formatted_flights = flight_searcher.extract_flight_info(flights)
         
         return jsonify({
             'success': True,
@@ -1269,6 +1726,8 @@ def save_plan_flight(plan_id):
                 'error': 'Failed to save flight'
             }), 500
         
+        refresh_plan_pdf(plan_id, prerender=True)
+        
         return jsonify({
             'success': True,
             'message': 'Flight saved successfully'
@@ -1313,6 +1772,8 @@ def delete_plan_flight(plan_id, flight_id):
                 'error': 'Flight not found'
             }), 404
         
+        refresh_plan_pdf(plan_id)
+        
         return jsonify({
             'success': True,
             'message': 'Flight deleted successfully'
@@ -1330,10 +1791,9 @@ def delete_plan_flight(plan_id, flight_id):
 def download_plan_pdf(plan_id):
     """Download travel plan as PDF"""
     try:
-        # Get plan data
-        plan = db.get_plan(plan_id)
+        version = db.get_plan_version(plan_id)
         
-        if not plan:
+        if not version:
             return jsonify({
                 'success': False,
                 'error': 'Plan not found'
@@ -1343,28 +1803,57 @@ def download_plan_pdf(plan_id):
         hotel = db.get_plan_hotel(plan_id)
         flights = db.get_plan_flights(plan_id)
         
-        # Convert plan to dict if necessary
-        if hasattr(plan, 'to_dict'):
-            plan_dict = plan.to_dict()
-        else:
-            plan_dict = plan
-        
-        # Generate PDF
-        pdf_generator = TravelPlanPDFGenerator()
-        pdf_bytes = pdf_generator.generate_pdf(plan_dict, hotel, flights)
-        
         # Create filename
-        plan_name = plan_dict.get('plan_name') or plan_dict.get('destination', 'plan')
+        plan_name = version.get('plan_name') or version.get('destination') or 'plan'
         filename = f"{plan_name.replace(' ', '_')}.pdf"
         
+        # Serve a previous render of the unchanged plan straight from disk
+        fingerprint = pdf_cache.fingerprint(version, hotel, flights)
+        pdf_path = pdf_cache.get(plan_id, fingerprint)
+        
+        if not pdf_path:
+            plan = db.get_plan(plan_id)
+            
+            if not plan:
+                return jsonify({
+                    'success': False,
+                    'error': 'Plan not found'
+                }), 404
+            
+            # Convert plan to dict if necessary
+            if hasattr(plan, 'to_dict'):
+                plan_dict = plan.to_dict()
+            else:
+                plan_dict = plan
+            
+            # Render in the worker pool; when it is backed up or slow, answer 202 with a poll URL
+            queue_is_deep = pdf_service.queue_depth() >= Config.PDF_ASYNC_QUEUE_DEPTH
+            job = pdf_service.submit(plan_id, fingerprint, plan_dict, hotel, flights)
+            
+            if queue_is_deep or not job.wait(Config.PDF_SYNC_WAIT):
+                return _pdf_job_response(job), 202
+            
+            if job.status != 'done':
+                raise RuntimeError(job.error or 'PDF render failed')
+            pdf_path = job.path
+        
         # Return PDF as download
         return send_file(
-            BytesIO(pdf_bytes),
+            pdf_path,
             mimetype='application/pdf',
             as_attachment=True,
             download_name=filename
         )
         
+    except PDFQueueFull as e:
+        app.logger.warning(f"PDF queue full: {str(e)}")
+        response = jsonify({
+            'success': False,
+            'error': 'PDF service is busy, please try again shortly'
+        })
+        response.headers['Retry-After'] = '10'
+        return response, 503
+        
     except Exception as e:
         app.logger.error(f"Error generating PDF: {str(e)}")
         import traceback
@@ -1375,6 +1864,55 @@ def download_plan_pdf(plan_id):
         }), 500
 
 
+def _pdf_job_response(job):
+    """JSON body (plus Location/Retry-After) for a PDF job that is still rendering"""
+    status_url = url_for('get_pdf_job', job_id=job.id)
+    response = jsonify({
+        'success': True,
+        'job': job.to_dict(),
+        'status_url': status_url
+    })
+    response.headers['Location'] = status_url
+    response.headers['Retry-After'] = '2'
+    return response
+
+
+@app.route('/api/pdf-jobs/<job_id>', methods=['GET'])
+def get_pdf_job(job_id):
+    """Poll a queued PDF render"""
+    try:
+        job = pdf_service.get_job(job_id)
+        
+        if not job:
+            return jsonify({
+                'success': False,
+                'error': 'Job not found'
+            }), 404
+        
+        if not job.done:
+            return _pdf_job_response(job), 202
+        
+        if job.status == 'failed':
+            return jsonify({
+                'success': False,
+                'job': job.to_dict(),
+                'error': f'Failed to generate PDF: {job.error}'
+            }), 500
+        
+        return jsonify({
+            'success': True,
+            'job': job.to_dict(),
+            'download_url': url_for('download_plan_pdf', plan_id=job.plan_id)
+        })
+        
+    except Exception as e:
+        app.logger.error(f"Error getting PDF job: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @app.route('/api/flights/search-location', methods=['POST'])
 def search_flight_location():
     """Search for airport codes by city name"""
@@ -1388,11 +1926,7 @@ def search_flight_location():
                 'error': 'City name is required'
             }), 400
         
-        from utils.flight_search import AgodaFlightSearchAPI
-        from config import Config
-        
-        searcher = AgodaFlightSearchAPI(api_key=Config.RAPIDAPI_KEY)
-        airport_code = searcher.get_airport_code(city_name)
+        airport_code = flight_searcher.get_airport_code(city_name)
         
         if not airport_code:
             return jsonify({
@@ -1414,6 +1948,34 @@ def search_flight_location():
         }), 500
 
 
+@app.route('/api/plans/export', methods=['GET'])
+def export_plans():
+    """Export all plans of the current session/user as a streamed ZIP (JSON + PDF per plan)"""
+    try:
+        session_id = get_or_create_session()
+        current_user = get_current_user()
+        user_id = current_user.id if current_user else None
+        
+        app.logger.info(f"📦 Exporting plans - Session: {session_id}, User: {user_id}")
+        
+        filename = f"khappha_plans_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        return Response(
+            stream_with_context(plan_exporter.stream(session_id if not user_id else None, user_id)),
+            mimetype='application/zip',
+            headers={
+                'Content-Disposition': f'attachment; filename="{filename}"',
+                'Cache-Control': 'no-store'
+            }
+        )
+        
+    except Exception as e:
+        app.logger.error(f"Error exporting plans: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @app.route('/api/plans/<int:plan_id>/confirm', methods=['POST'])
 
 def confirm_plan(plan_id):
@@ -1427,6 +1989,8 @@ def confirm_plan(plan_id):
                 'error': 'Plan not found'
             }), 404
         
+        refresh_plan_pdf(plan_id, prerender=True)
+        
         return jsonify({
             'success': True,
             'message': 'Plan confirmed successfully'
@@ -1538,6 +2102,16 @@ def get_chat_session_messages(conversation_session_id):
         current_user = get_current_user()
         user_id = current_user.id if current_user else None
         
+        # Conditional GET: compare message and plan versions first
+        versions = db.get_conversation_session_version(user_session_id, conversation_session_id)
+        etag = compute_etag(
+            'messages', user_session_id, conversation_session_id,
+            *[tuple(version.values()) for version in versions]
+        )
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
         # Get conversations for this conversation session
         conversations = db.get_conversations_by_session(user_session_id, conversation_session_id)
         
@@ -1560,11 +2134,11 @@ def get_chat_session_messages(conversation_session_id):
             
             messages.append(msg_data)
         
-        return jsonify({
+        return with_etag(jsonify({
             'success': True,
             'messages': messages,
             'total': len(messages)
-        })
+        }), etag)
         
     except Exception as e:
         app.logger.error(f"Error getting chat session messages: {str(e)}")
@@ -2308,6 +2882,12 @@ if __name__ == '__main__':
     print(f"📂 Upload folder: {Config.UPLOAD_FOLDER}")
     print(f"\n✨ Server running on http://localhost:5000\n")
     
+    # Warm the hotel city-ID store from live RapidAPI (server start only:
+    # importing the app for tests, benchmarks or stub runs must not call it)
+    if (Config.HOTEL_PRELOAD_CITY_IDS and Config.RAPIDAPI_KEY and not stubs
+            and not (cassette and cassette.mode == 'replay')):
+        hotel_searcher.preload_city_ids()
+    
     app.run(
         host='0.0.0.0',
         port=5002,
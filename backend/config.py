@@ -28,15 +28,27 @@ class Config:
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
     
+    # External providers: 'live' or 'stub' (offline fakes for load testing)
+    PROVIDER_MODE = os.getenv('PROVIDER_MODE', 'live').lower()
+    # Stub latency per provider: median_ms/p95_ms/error_rate
+    STUB_LATENCY = os.getenv('STUB_LATENCY', 'gemini=900/4000/0.02,search=350/1500/0.02,rapidapi=500/2000/0.01,email=250/800/0')
+    STUB_SEED = int(os.getenv('STUB_SEED')) if os.getenv('STUB_SEED') else None
+    # Record/replay of external calls: 'off', 'record' or 'replay'
+    CASSETTE_MODE = os.getenv('CASSETTE_MODE', 'off').lower()
+    CASSETTE_PATH = Path(__file__).parent / os.getenv('CASSETTE_PATH', 'data/cassettes/default.jsonl.gz')
+    CASSETTE_TIME_SCALE = float(os.getenv('CASSETTE_TIME_SCALE', 1.0))  # replay delay multiplier, 0 = no delay
+    
     # API Keys
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-    if not GEMINI_API_KEY:
+    if not GEMINI_API_KEY and PROVIDER_MODE == 'live' and CASSETTE_MODE != 'replay':
         raise ValueError("GEMINI_API_KEY not found in environment variables!")
     
     # Database Configuration
     BASE_DIR = Path(__file__).parent
     DATABASE_PATH = BASE_DIR / os.getenv('DATABASE_PATH', 'data/travelmate.db')
     DATABASE_BACKUP = BASE_DIR / os.getenv('DATABASE_BACKUP', 'data/backups/')
+    HOTEL_CITY_ID_PATH = BASE_DIR / os.getenv('HOTEL_CITY_ID_PATH', 'data/hotel_city_ids.json')
+    AIRPORT_INDEX_PATH = BASE_DIR / os.getenv('AIRPORT_INDEX_PATH', 'data/airport_codes.json')
     
     # File Upload Configuration
     UPLOAD_FOLDER = BASE_DIR / os.getenv('UPLOAD_FOLDER', 'uploads')
@@ -46,23 +58,85 @@ class Config:
     # Cache Configuration
     CACHE_TTL_HOURS = int(os.getenv('CACHE_TTL_HOURS', 24))
     CACHE_MAX_SIZE = int(os.getenv('CACHE_MAX_SIZE', 1000))
+
+    # HTTP Compression Configuration
+    COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 500))  # bytes
+    COMPRESSION_LEVEL = int(os.getenv('COMPRESSION_LEVEL', 6))
+    COMPRESSION_SSE = os.getenv('COMPRESSION_SSE', 'true').lower() == 'true'
+
+    # Outbound HTTP (RapidAPI, PDF resources)
+    HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))  # seconds
+    HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 30))  # seconds
+    HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 2))  # idempotent requests only
+    HTTP_RETRY_BACKOFF = float(os.getenv('HTTP_RETRY_BACKOFF', 0.5))
+    HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', 10))  # keep-alive connections per host
+    HTTP_MAX_CONCURRENCY_PER_HOST = int(os.getenv('HTTP_MAX_CONCURRENCY_PER_HOST', 8))
+    HTTP_ACQUIRE_TIMEOUT = float(os.getenv('HTTP_ACQUIRE_TIMEOUT', 10))  # wait for a free slot
+
+    # Hotel Search Cache
+    HOTEL_CACHE_TTL_SECONDS = int(os.getenv('HOTEL_CACHE_TTL_SECONDS', 1800))
+    HOTEL_CACHE_STALE_SECONDS = int(os.getenv('HOTEL_CACHE_STALE_SECONDS', 7200))  # served while refreshing
+    HOTEL_CACHE_MAX_SIZE = int(os.getenv('HOTEL_CACHE_MAX_SIZE', 500))
+    HOTEL_PRELOAD_CITY_IDS = os.getenv('HOTEL_PRELOAD_CITY_IDS', 'true').lower() == 'true'  # on server start (python app.py), live providers only
+
+    # PDF Export Cache (rendered PDFs keyed by plan/hotel/flight fingerprint)
+    PDF_CACHE_DIR = BASE_DIR / os.getenv('PDF_CACHE_DIR', 'data/pdf_cache')
+    PDF_CACHE_MAX_FILES = int(os.getenv('PDF_CACHE_MAX_FILES', 200))
+
+    # PDF Render Workers (out-of-process WeasyPrint pool)
+    PDF_WORKERS = int(os.getenv('PDF_WORKERS', 0))  # 0 = CPU count - 1
+    PDF_QUEUE_MAX = int(os.getenv('PDF_QUEUE_MAX', 32))  # unfinished jobs before rejecting
+    PDF_ASYNC_QUEUE_DEPTH = int(os.getenv('PDF_ASYNC_QUEUE_DEPTH', 4))  # answer 202 + poll URL from here
+    PDF_JOB_TIMEOUT = int(os.getenv('PDF_JOB_TIMEOUT', 60))  # seconds per render
+    PDF_SYNC_WAIT = float(os.getenv('PDF_SYNC_WAIT', 10))  # download waits this long, then 202 + poll URL
+    PDF_WORKER_MEMORY_MB = int(os.getenv('PDF_WORKER_MEMORY_MB', 1024))  # address space cap, 0 = none
+    PDF_WORKER_MAX_JOBS = int(os.getenv('PDF_WORKER_MAX_JOBS', 50))  # recycle a worker after N renders
+    PDF_PRERENDER = os.getenv('PDF_PRERENDER', 'true').lower() == 'true'  # re-render in background after mutations
+    PDF_PRERENDER_STATUSES = set(os.getenv('PDF_PRERENDER_STATUSES', 'active,confirmed,completed').split(','))
+
+    # Logging (queued writer thread; JSON lines tagged with the trace id)
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # json | text
+    LOG_LEVELS = os.getenv('LOG_LEVELS', 'werkzeug=INFO,urllib3=WARNING,google=WARNING,weasyprint=WARNING,fontTools=WARNING')
+    LOG_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', 0.1))  # fraction of DEBUG records kept
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))  # records buffered before dropping
+    LOG_FILE = os.getenv('LOG_FILE', '')
+    
+    # Request Tracing (Server-Timing header, JSON trace log per request)
+    TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'true').lower() == 'true'
+    
+    # Profiling (admin only; /admin/profiling is not registered without a token)
+    PROFILING_TOKEN = os.getenv('PROFILING_TOKEN', '')  # sent as X-Profiling-Token
+    PROFILING_DIR = BASE_DIR / os.getenv('PROFILING_DIR', 'data/profiles')
+    PROFILING_MAX_SECONDS = int(os.getenv('PROFILING_MAX_SECONDS', 60))  # longest sampling run
+    PROFILING_TRACEMALLOC_FRAMES = int(os.getenv('PROFILING_TRACEMALLOC_FRAMES', 10))
+    
+    # Static Assets (use built bundles from frontend/static/dist when available)
+    ASSETS_BUNDLED = os.getenv('ASSETS_BUNDLED', 'true').lower() == 'true'
     
     # AI Configuration
     GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-flash-2.0')
     GEMINI_TEMPERATURE = float(os.getenv('GEMINI_TEMPERATURE', 0.7))
     GEMINI_MAX_TOKENS = int(os.getenv('GEMINI_MAX_TOKENS', 8192))
     GEMINI_TIMEOUT = int(os.getenv('GEMINI_TIMEOUT', 240))
+    GEMINI_STRUCTURED_OUTPUT = os.getenv('GEMINI_STRUCTURED_OUTPUT', 'true').lower() == 'true'  # response schemas for JSON payloads
+    LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', 5))  # consecutive errors before failing fast, 0 = off
+    LLM_BREAKER_RESET_SECONDS = int(os.getenv('LLM_BREAKER_RESET_SECONDS', 30))  # then one trial call
     
     # Search Configuration
     SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', 10))
     SEARCH_TIMEOUT = int(os.getenv('SEARCH_TIMEOUT', 10))
     SEARCH_CACHE_ENABLED = os.getenv('SEARCH_CACHE_ENABLED', 'true').lower() == 'true'
+    SPECULATIVE_SEARCH = os.getenv('SPECULATIVE_SEARCH', 'true').lower() == 'true'  # search a known destination during intent analysis
     
     # Application Settings
     APP_NAME = os.getenv('APP_NAME', 'khappha.online')
     APP_VERSION = os.getenv('APP_VERSION', '1.0.0')
     SESSION_TIMEOUT_HOURS = int(os.getenv('SESSION_TIMEOUT_HOURS', 24))
     MAX_CONVERSATION_HISTORY = int(os.getenv('MAX_CONVERSATION_HISTORY', 50))
+    CONVERSATION_SUMMARY_TOKENS = int(os.getenv('CONVERSATION_SUMMARY_TOKENS', 300))  # budget of the rolling summary
+    CONVERSATION_SUMMARY_MODEL = os.getenv('CONVERSATION_SUMMARY_MODEL', 'true').lower() == 'true'  # false = fold turns by rules, no LLM call
     
     # Plan Generation Settings
     PLAN_GENERATION_TIMEOUT = int(os.getenv('PLAN_GENERATION_TIMEOUT_SECONDS', 120))  # seconds
@@ -4,6 +4,8 @@ Handles all CRUD operations with SQLite
 """
 import sqlite3
 import json
+import logging
+import time
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
 from pathlib import Path
@@ -19,8 +21,64 @@ if str(backend_path) not in sys.path:
     sys.path.insert(0, str(backend_path))
 
 from utils.auth import hash_password, verify_password
+from utils.tracing import trace_methods
+from utils.metrics import REGISTRY
 
+logger = logging.getLogger(__name__)
 
+DB_OPERATION_SECONDS = REGISTRY.histogram(
+    'db_operation_duration_seconds', 'DatabaseManager method latency', ('operation',))
+DB_CONNECT_SECONDS = REGISTRY.histogram(
+    'db_connection_wait_seconds', 'Time to open a SQLite connection',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1))
+DB_CONNECTIONS_OPEN = REGISTRY.gauge('db_connections_open', 'SQLite connections currently open')
+
+# travel_plans.itinerary of a plan whose days live in plan_days / plan_activities
+NORMALIZED_ITINERARY = '[]'
+ACTIVITY_COLUMNS = ('time', 'type', 'title', 'description', 'location', 'cost')
+DAY_COLUMNS = ('title', 'description')
+
+
+def _is_day_list(itinerary: Any) -> bool:
+    """Itinerary shaped as [{..., 'activities': [{...}]}], i.e. normalizable"""
+    if not isinstance(itinerary, list):
+        return False
+    for day in itinerary:
+        if not isinstance(day, dict):
+            return False
+        activities = day.get('activities')
+        if activities is not None and not (
+                isinstance(activities, list) and all(isinstance(a, dict) for a in activities)):
+            return False
+    return True
+
+
+def _split_activity(activity: Dict[str, Any]) -> tuple:
+    """Column values for plan_activities and the remaining keys as JSON"""
+    extra = {key: value for key, value in activity.items() if key not in ACTIVITY_COLUMNS}
+    values = []
+    for column in ACTIVITY_COLUMNS:
+        value = activity.get(column)
+        if column == 'cost':
+            valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+        else:
+            valid = isinstance(value, str)
+        if value is not None and not valid:
+            # e.g. cost "50.000đ": kept verbatim, left out of the SQL sums
+            extra[column] = value
+            value = None
+        values.append(value)
+    return values, json.dumps(extra, ensure_ascii=False) if extra else None
+
+
+def _join_activity(row) -> Dict[str, Any]:
+    activity = {column: row[column] for column in ACTIVITY_COLUMNS if row[column] is not None}
+    if row['extra']:
+        activity.update(json.loads(row['extra']))
+    return activity
+
+
+@trace_methods('db', exclude=('get_connection',), histogram=DB_OPERATION_SECONDS)
 class DatabaseManager:
     """Database manager class"""
     
@@ -33,7 +91,10 @@ class DatabaseManager:
     @contextmanager
     def get_connection(self):
         """Get database connection with context manager"""
+        started = time.perf_counter()
         conn = sqlite3.connect(str(self.db_path))
+        DB_CONNECT_SECONDS.observe(time.perf_counter() - started)
+        DB_CONNECTIONS_OPEN.inc()
         conn.row_factory = sqlite3.Row
         try:
             yield conn
@@ -43,12 +104,20 @@ class DatabaseManager:
             raise e
         finally:
             conn.close()
+            DB_CONNECTIONS_OPEN.dec()
     
     def _init_database(self):
         """Initialize database with schema"""
         with self.get_connection() as conn:
             conn.executescript(SCHEMA)
     
+    def ping(self) -> float:
+        """Round-trip a trivial query; returns the elapsed seconds"""
+        started = time.perf_counter()
+        with self.get_connection() as conn:
+            conn.execute("SELECT 1").fetchone()
+        return time.perf_counter() - started
+    
     # ===== USER OPERATIONS =====
     
     def create_user(self, session_id: str, metadata: Optional[Dict] = None) -> int:
@@ -237,7 +306,7 @@ class DatabaseManager:
                 conn.execute(query, tuple(values))
                 return True
         except Exception as e:
-            print(f"Error updating profile: {str(e)}")
+            logger.error(f"Error updating profile: {str(e)}")
             return False
     
     def update_user_avatar(self, user_id: int, avatar_url: str) -> bool:
@@ -250,7 +319,7 @@ class DatabaseManager:
                 )
                 return True
         except Exception as e:
-            print(f"Error updating avatar: {str(e)}")
+            logger.error(f"Error updating avatar: {str(e)}")
             return False
     
     def update_user_location(self, session_id: str, latitude: float, longitude: float) -> bool:
@@ -274,7 +343,7 @@ class DatabaseManager:
                 )
                 return True
         except Exception as e:
-            print(f"Error updating user location: {str(e)}")
+            logger.error(f"Error updating user location: {str(e)}")
             return False
     
     def change_user_password(self, user_id: int, current_password: str, new_password: str) -> tuple[bool, Optional[str]]:
@@ -514,7 +583,92 @@ class DatabaseManager:
                 )
                 for row in rows
             ]
-    
+
+    def get_conversations_after(self, session_id: str, conversation_session_id: str, after_id: int = 0,
+                                latest: Optional[int] = None) -> List[Conversation]:
+        """Get the turns of a conversation session after a conversation id, oldest first
+        
+        Args:
+            after_id: Last conversation id already seen (0 = from the start)
+            latest: Only the last N of those turns
+        """
+        with self.get_connection() as conn:
+            rows = conn.execute(
+                f"""SELECT * FROM conversations
+                WHERE conversation_session_id = ? AND session_id = ? AND id > ?
+                ORDER BY id {'DESC LIMIT ?' if latest else 'ASC'}""",
+                (conversation_session_id, session_id, after_id, *([latest] if latest else []))
+            ).fetchall()
+            if latest:
+                rows = list(reversed(rows))
+            
+            return [
+                Conversation(
+                    id=row['id'],
+                    session_id=row['session_id'],
+                    conversation_session_id=row['conversation_session_id'],
+                    user_message=row['user_message'],
+                    bot_response=row['bot_response'],
+                    message_type=row['message_type'],
+                    plan_id=row['plan_id'],
+                    created_at=datetime.fromisoformat(row['created_at'])
+                )
+                for row in rows
+            ]
+
+    def get_conversation_summary(self, session_id: str, conversation_session_id: str) -> Optional[Dict[str, Any]]:
+        """Get the rolling summary of a conversation session owned by a session"""
+        with self.get_connection() as conn:
+            row = conn.execute(
+                "SELECT * FROM conversation_summaries WHERE conversation_session_id = ? AND session_id = ?",
+                (conversation_session_id, session_id)
+            ).fetchone()
+            return dict(row) if row else None
+
+    def save_conversation_summary(self, conversation_session_id: str, session_id: str, summary: str,
+                                  turns: int, last_conversation_id: int) -> bool:
+        """Store the rolling summary of a conversation session (UPSERT)
+        
+        Returns:
+            False when another session already owns the conversation session id
+            (its summary is left untouched)
+        """
+        with self.get_connection() as conn:
+            cursor = conn.execute(
+                """INSERT INTO conversation_summaries
+                (conversation_session_id, session_id, summary, turns, last_conversation_id)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(conversation_session_id) DO UPDATE SET
+                    summary = excluded.summary,
+                    turns = excluded.turns,
+                    last_conversation_id = excluded.last_conversation_id,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE conversation_summaries.session_id = excluded.session_id""",
+                (conversation_session_id, session_id, summary, turns, last_conversation_id)
+            )
+            return cursor.rowcount > 0
+
+    def get_conversation_session_version(self, session_id: str, conversation_session_id: str,
+                                         limit: int = 100) -> List[Dict[str, Any]]:
+        """Get version columns for a conversation session and its linked plans
+
+        Mirrors get_conversations_by_session without loading message bodies
+        or plan itineraries.
+        """
+        with self.get_connection() as conn:
+            rows = conn.execute(
+                """SELECT c.id, c.plan_id, p.updated_at AS plan_updated_at, p.status AS plan_status,
+                    p.is_favorite AS plan_is_favorite, length(p.itinerary) AS plan_itinerary_size
+                FROM conversations c
+                LEFT JOIN travel_plans p ON p.id = c.plan_id
+                WHERE c.session_id = ? AND c.conversation_session_id = ?
+                ORDER BY c.created_at ASC
+                LIMIT ?""",
+                (session_id, conversation_session_id, limit)
+            ).fetchall()
+
+            return [dict(row) for row in rows]
+
     # ===== TRAVEL PLAN OPERATIONS =====
     
     def save_plan(self, session_id: str, destination: str, duration_days: int,
@@ -551,12 +705,14 @@ class DatabaseManager:
                     json.dumps(preferences) if preferences else None,
                     start_date,
                     end_date,
-                    json.dumps(itinerary),
+                    NORMALIZED_ITINERARY if _is_day_list(itinerary) else json.dumps(itinerary),
                     total_cost,
                     json.dumps(search_sources) if search_sources else None,
                     status
                 )
             )
+            if _is_day_list(itinerary):
+                self._write_itinerary(conn, cursor.lastrowid, itinerary)
             return cursor.lastrowid
     
     def get_plan(self, plan_id: int) -> Optional[TravelPlan]:
@@ -568,7 +724,7 @@ class DatabaseManager:
             ).fetchone()
             
             if row:
-                return self._row_to_travel_plan(row)
+                return self._rows_to_travel_plans(conn, [row])[0]
             return None
     
     def get_plans(self, session_id: Optional[str] = None, user_id: Optional[int] = None,
@@ -616,8 +772,73 @@ class DatabaseManager:
                         (session_id, limit, offset)
                     ).fetchall()
             
-            return [self._row_to_travel_plan(row) for row in rows]
-    
+            return self._rows_to_travel_plans(conn, rows)
+
+    def get_plans_after(self, session_id: Optional[str] = None, user_id: Optional[int] = None,
+                        after_id: int = 0, limit: int = 50) -> List[TravelPlan]:
+        """Get the next page of plans by id (keyset pagination, for exports)
+        
+        Args:
+            session_id: Session ID (for non-authenticated users)
+            user_id: User ID (for authenticated users)
+            after_id: Last plan id of the previous page (0 = first page)
+        """
+        if user_id:
+            where, owner = "user_id = ?", user_id
+        else:
+            where, owner = "session_id = ?", session_id
+
+        with self.get_connection() as conn:
+            rows = conn.execute(
+                f"""SELECT * FROM travel_plans
+                WHERE {where} AND id > ?
+                ORDER BY id
+                LIMIT ?""",
+                (owner, after_id, limit)
+            ).fetchall()
+
+            return self._rows_to_travel_plans(conn, rows)
+
+    def get_plan_version(self, plan_id: int) -> Optional[Dict[str, Any]]:
+        """Get version columns of a plan without decoding its itinerary
+
+        Used for conditional GETs (ETag), so only scalar columns and the
+        itinerary length are read.
+        """
+        with self.get_connection() as conn:
+            row = conn.execute(
+                """SELECT id, updated_at, status, is_favorite, length(itinerary) AS itinerary_size,
+                plan_name, destination
+                FROM travel_plans WHERE id = ?""",
+                (plan_id,)
+            ).fetchone()
+
+            return dict(row) if row else None
+
+    def get_plan_versions(self, session_id: Optional[str] = None, user_id: Optional[int] = None,
+                          limit: int = 10, offset: int = 0, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get version columns for the same page of plans that get_plans returns"""
+        if user_id:
+            where, params = "user_id = ?", [user_id]
+        else:
+            where, params = "session_id = ?", [session_id]
+
+        if status:
+            where += " AND status = ?"
+            params.append(status)
+
+        with self.get_connection() as conn:
+            rows = conn.execute(
+                f"""SELECT id, updated_at, status, is_favorite, length(itinerary) AS itinerary_size
+                FROM travel_plans
+                WHERE {where}
+                ORDER BY created_at DESC
+                LIMIT ? OFFSET ?""",
+                (*params, limit, offset)
+            ).fetchall()
+
+            return [dict(row) for row in rows]
+
     def get_plans_by_destination(self, destination: str, limit: int = 3) -> List[TravelPlan]:
         """Get similar plans by destination"""
         with self.get_connection() as conn:
@@ -629,11 +850,14 @@ class DatabaseManager:
                 (f'%{destination}%', limit)
             ).fetchall()
             
-            return [self._row_to_travel_plan(row) for row in rows]
+            return self._rows_to_travel_plans(conn, rows)
     
     def delete_plan(self, plan_id: int) -> bool:
         """Delete a travel plan"""
         with self.get_connection() as conn:
+            # Foreign keys are not enforced (no PRAGMA foreign_keys), so no cascade
+            conn.execute("DELETE FROM plan_activities WHERE plan_id = ?", (plan_id,))
+            conn.execute("DELETE FROM plan_days WHERE plan_id = ?", (plan_id,))
             cursor = conn.execute(
                 "DELETE FROM travel_plans WHERE id = ?",
                 (plan_id,)
@@ -668,11 +892,20 @@ class DatabaseManager:
         # Build SET clause dynamically
         set_clauses = []
         values = []
+        itinerary = None
         
         for field, value in update_fields.items():
             if field == 'itinerary':
-                # Convert itinerary to JSON string if it's a dict/list
-                if isinstance(value, (dict, list)):
+                if isinstance(value, str):
+                    try:
+                        value = json.loads(value)
+                    except ValueError:
+                        pass
+                itinerary = value
+                # Day lists go to plan_days / plan_activities below
+                if _is_day_list(value):
+                    value = NORMALIZED_ITINERARY
+                elif isinstance(value, (dict, list)):
                     value = json.dumps(value)
                 set_clauses.append(f"{field} = ?")
                 values.append(value)
@@ -696,9 +929,21 @@ class DatabaseManager:
         
         with self.get_connection() as conn:
             cursor = conn.execute(sql, values)
+            if cursor.rowcount and 'itinerary' in update_fields:
+                self._write_itinerary(conn, plan_id, itinerary if _is_day_list(itinerary) else [])
             return cursor.rowcount > 0
     
-    def _row_to_travel_plan(self, row) -> TravelPlan:
+    def _rows_to_travel_plans(self, conn, rows) -> List[TravelPlan]:
+        """Convert plan rows, reading normalized itineraries in one batch"""
+        plan_ids = [row['id'] for row in rows if row['itinerary'] == NORMALIZED_ITINERARY]
+        itineraries, costs = self._read_itineraries(conn, plan_ids)
+        return [
+            self._row_to_travel_plan(row, itineraries.get(row['id']), costs.get(row['id']))
+            for row in rows
+        ]
+    
+    def _row_to_travel_plan(self, row, itinerary: Optional[List[Dict]] = None,
+                            activities_cost: Optional[float] = None) -> TravelPlan:
         """Convert database row to TravelPlan object"""
         return TravelPlan(
             id=row['id'],
@@ -713,8 +958,9 @@ class DatabaseManager:
             preferences=row['preferences'],
             start_date=row['start_date'] if 'start_date' in row.keys() else None,
             end_date=row['end_date'] if 'end_date' in row.keys() else None,
-            itinerary=json.loads(row['itinerary']),
+            itinerary=itinerary if itinerary is not None else json.loads(row['itinerary']),
             total_cost=row['total_cost'],
+            activities_cost=activities_cost,
             search_sources=row['search_sources'] if 'search_sources' in row.keys() else None,
             status=row['status'],
             is_favorite=bool(row['is_favorite']),
@@ -722,6 +968,242 @@ class DatabaseManager:
             updated_at=datetime.fromisoformat(row['updated_at'])
         )
     
+    # ===== NORMALIZED ITINERARY =====
+    
+    def _write_itinerary(self, conn, plan_id: int, itinerary: List[Dict]):
+        """Replace a plan's plan_days / plan_activities rows"""
+        conn.execute("DELETE FROM plan_activities WHERE plan_id = ?", (plan_id,))
+        conn.execute("DELETE FROM plan_days WHERE plan_id = ?", (plan_id,))
+        for day_number, day in enumerate(itinerary, 1):
+            extra = {key: value for key, value in day.items()
+                     if key not in DAY_COLUMNS and key not in ('activities', 'notes')}
+            columns = []
+            for column in DAY_COLUMNS:
+                value = day.get(column)
+                if value is not None and not isinstance(value, str):
+                    extra[column], value = value, None
+                columns.append(value)
+            cursor = conn.execute(
+                """INSERT INTO plan_days (plan_id, day_number, title, description, notes, extra)
+                VALUES (?, ?, ?, ?, ?, ?)""",
+                (plan_id, day_number, *columns,
+                 json.dumps(day['notes'], ensure_ascii=False) if 'notes' in day else None,
+                 json.dumps(extra, ensure_ascii=False) if extra else None)
+            )
+            day_id = cursor.lastrowid
+            rows = []
+            for position, activity in enumerate(day.get('activities') or []):
+                values, extra_json = _split_activity(activity)
+                rows.append((plan_id, day_id, position, *values, extra_json))
+            conn.executemany(
+                """INSERT INTO plan_activities
+                (plan_id, day_id, position, time, type, title, description, location, cost, extra)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                rows
+            )
+    
+    def _read_itineraries(self, conn, plan_ids: List[int]) -> tuple:
+        """Itineraries and activity cost totals of normalized plans, by plan id"""
+        if not plan_ids:
+            return {}, {}
+        marks = ','.join('?' * len(plan_ids))
+        itineraries: Dict[int, List[Dict]] = {plan_id: [] for plan_id in plan_ids}
+        days_by_id: Dict[int, Dict] = {}
+        for row in conn.execute(
+                f"SELECT * FROM plan_days WHERE plan_id IN ({marks}) ORDER BY plan_id, day_number",
+                plan_ids):
+            day = json.loads(row['extra']) if row['extra'] else {}
+            for column in DAY_COLUMNS:
+                if row[column] is not None:
+                    day[column] = row[column]
+            day['activities'] = []
+            if row['notes'] is not None:
+                day['notes'] = json.loads(row['notes'])
+            days_by_id[row['id']] = day
+            itineraries[row['plan_id']].append(day)
+        for row in conn.execute(
+                f"SELECT * FROM plan_activities WHERE plan_id IN ({marks}) ORDER BY day_id, position",
+                plan_ids):
+            days_by_id[row['day_id']]['activities'].append(_join_activity(row))
+        costs = {
+            row['plan_id']: row['total'] for row in conn.execute(
+                f"""SELECT plan_id, COALESCE(SUM(cost), 0) AS total FROM plan_activities
+                WHERE plan_id IN ({marks}) GROUP BY plan_id""",
+                plan_ids)
+        }
+        return itineraries, {plan_id: costs.get(plan_id, 0) for plan_id in plan_ids}
+    
+    def _ensure_normalized(self, conn, plan_id: int) -> bool:
+        """Move a legacy itinerary blob into the tables; False if it cannot be"""
+        row = conn.execute("SELECT itinerary FROM travel_plans WHERE id = ?", (plan_id,)).fetchone()
+        if not row:
+            return False
+        if row['itinerary'] == NORMALIZED_ITINERARY:
+            return True
+        try:
+            itinerary = json.loads(row['itinerary'])
+        except ValueError:
+            return False
+        if not _is_day_list(itinerary):
+            return False
+        self._write_itinerary(conn, plan_id, itinerary)
+        conn.execute("UPDATE travel_plans SET itinerary = ? WHERE id = ?", (NORMALIZED_ITINERARY, plan_id))
+        return True
+    
+    def _activity_row(self, conn, plan_id: int, day_number: int, index: int):
+        return conn.execute(
+            """SELECT a.* FROM plan_activities a JOIN plan_days d ON d.id = a.day_id
+            WHERE d.plan_id = ? AND d.day_number = ? AND a.position = ?""",
+            (plan_id, day_number, index)
+        ).fetchone()
+    
+    def _touch_plan(self, conn, plan_id: int):
+        # The update_plan_timestamp trigger refreshes updated_at (ETags, PDF cache)
+        conn.execute("UPDATE travel_plans SET updated_at = CURRENT_TIMESTAMP WHERE id = ?", (plan_id,))
+    
+    def normalize_itineraries(self, batch_size: int = 100) -> Dict[str, int]:
+        """Move every legacy itinerary blob into plan_days / plan_activities
+        
+        Returns:
+            {'normalized': n, 'skipped': m}; skipped plans keep their blob
+            (itinerary is not a list of days)
+        """
+        counts = {'normalized': 0, 'skipped': 0}
+        last_id = 0
+        while True:
+            with self.get_connection() as conn:
+                ids = [row['id'] for row in conn.execute(
+                    "SELECT id FROM travel_plans WHERE id > ? AND itinerary != ? ORDER BY id LIMIT ?",
+                    (last_id, NORMALIZED_ITINERARY, batch_size))]
+                if not ids:
+                    return counts
+                for plan_id in ids:
+                    counts['normalized' if self._ensure_normalized(conn, plan_id) else 'skipped'] += 1
+            last_id = ids[-1]
+    
+    def get_plan_owner(self, plan_id: int) -> Optional[Dict[str, Any]]:
+        """Owner columns of a plan (access checks without loading the itinerary)"""
+        with self.get_connection() as conn:
+            row = conn.execute(
+                "SELECT id, user_id, session_id FROM travel_plans WHERE id = ?",
+                (plan_id,)
+            ).fetchone()
+            return dict(row) if row else None
+    
+    def update_plan_activity(self, plan_id: int, day_number: int, index: int,
+                             fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Change fields of one activity (a single row update)
+        
+        Args:
+            day_number: 1-based day
+            index: 0-based position within the day
+            fields: Activity keys to set; None removes a key
+        
+        Returns:
+            The updated activity, or None if it does not exist
+        """
+        with self.get_connection() as conn:
+            if not self._ensure_normalized(conn, plan_id):
+                return None
+            row = self._activity_row(conn, plan_id, day_number, index)
+            if not row:
+                return None
+            activity = _join_activity(row)
+            activity.update(fields)
+            activity = {key: value for key, value in activity.items() if value is not None}
+            values, extra = _split_activity(activity)
+            conn.execute(
+                """UPDATE plan_activities
+                SET time = ?, type = ?, title = ?, description = ?, location = ?, cost = ?, extra = ?
+                WHERE id = ?""",
+                (*values, extra, row['id'])
+            )
+            self._touch_plan(conn, plan_id)
+            return activity
+    
+    def insert_plan_activity(self, plan_id: int, day_number: int, activity: Dict[str, Any],
+                             index: Optional[int] = None) -> Optional[int]:
+        """Insert an activity before `index` (None = at the end of the day)
+        
+        Returns:
+            The position it was inserted at, or None if the day does not exist
+        """
+        with self.get_connection() as conn:
+            if not self._ensure_normalized(conn, plan_id):
+                return None
+            day = conn.execute(
+                "SELECT id FROM plan_days WHERE plan_id = ? AND day_number = ?",
+                (plan_id, day_number)
+            ).fetchone()
+            if not day:
+                return None
+            count = conn.execute(
+                "SELECT COUNT(*) FROM plan_activities WHERE day_id = ?", (day['id'],)
+            ).fetchone()[0]
+            index = count if index is None else max(0, min(index, count))
+            conn.execute(
+                "UPDATE plan_activities SET position = position + 1 WHERE day_id = ? AND position >= ?",
+                (day['id'], index)
+            )
+            values, extra = _split_activity(activity)
+            conn.execute(
+                """INSERT INTO plan_activities
+                (plan_id, day_id, position, time, type, title, description, location, cost, extra)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (plan_id, day['id'], index, *values, extra)
+            )
+            self._touch_plan(conn, plan_id)
+            return index
+    
+    def delete_plan_activity(self, plan_id: int, day_number: int, index: int) -> bool:
+        """Remove one activity and close the gap in the day's positions"""
+        with self.get_connection() as conn:
+            if not self._ensure_normalized(conn, plan_id):
+                return False
+            row = self._activity_row(conn, plan_id, day_number, index)
+            if not row:
+                return False
+            conn.execute("DELETE FROM plan_activities WHERE id = ?", (row['id'],))
+            conn.execute(
+                "UPDATE plan_activities SET position = position - 1 WHERE day_id = ? AND position > ?",
+                (row['day_id'], index)
+            )
+            self._touch_plan(conn, plan_id)
+            return True
+    
+    def get_plan_cost_breakdown(self, plan_id: int) -> Optional[Dict[str, Any]]:
+        """Activity costs of a plan by type and by day, aggregated in SQL
+        
+        Returns:
+            None if the plan does not exist or its itinerary is not a day list
+        """
+        with self.get_connection() as conn:
+            if not self._ensure_normalized(conn, plan_id):
+                return None
+            by_type = [
+                {'type': row['type'] or 'other', 'activities': row['activities'], 'cost': row['cost']}
+                for row in conn.execute(
+                    """SELECT type, COUNT(*) AS activities, COALESCE(SUM(cost), 0) AS cost
+                    FROM plan_activities WHERE plan_id = ?
+                    GROUP BY type ORDER BY cost DESC""",
+                    (plan_id,))
+            ]
+            by_day = [
+                dict(row) for row in conn.execute(
+                    """SELECT d.day_number AS day, d.title, COUNT(a.id) AS activities,
+                    COALESCE(SUM(a.cost), 0) AS cost
+                    FROM plan_days d LEFT JOIN plan_activities a ON a.day_id = d.id
+                    WHERE d.plan_id = ?
+                    GROUP BY d.id ORDER BY d.day_number""",
+                    (plan_id,))
+            ]
+            return {
+                'plan_id': plan_id,
+                'total': sum(item['cost'] for item in by_day),
+                'by_type': by_type,
+                'by_day': by_day
+            }
+    
     # ===== SEARCH CACHE OPERATIONS =====
     
     def save_search_cache(self, query: str, results: Dict, 
@@ -869,7 +1351,7 @@ class DatabaseManager:
                 ))
                 return True
         except Exception as e:
-            print(f"Error saving hotel: {e}")
+            logger.error(f"Error saving hotel: {e}")
             return False
     
     def get_plan_hotel(self, plan_id: int) -> Optional[Dict[str, Any]]:
@@ -925,7 +1407,7 @@ class DatabaseManager:
                 )
                 return cursor.rowcount > 0
         except Exception as e:
-            print(f"Error deleting hotel: {e}")
+            logger.error(f"Error deleting hotel: {e}")
             return False
     
     def update_plan_dates(self, plan_id: int, new_start_date: str, new_duration_days: int) -> bool:
@@ -1021,7 +1503,7 @@ class DatabaseManager:
                 
                 return True
         except Exception as e:
-            print(f"Error updating plan dates: {e}")
+            logger.error(f"Error updating plan dates: {e}")
             return False
     
     # ===== FLIGHT METHODS =====
@@ -1077,7 +1559,7 @@ class DatabaseManager:
                 ))
                 return True
         except Exception as e:
-            print(f"Error saving flight: {e}")
+            logger.error(f"Error saving flight: {e}")
             return False
     
     def get_plan_flights(self, plan_id: int) -> List[Dict[str, Any]]:
@@ -1128,7 +1610,7 @@ class DatabaseManager:
                 
                 return flights
         except Exception as e:
-            print(f"Error getting flights: {e}")
+            logger.error(f"Error getting flights: {e}")
             return []
     
     def delete_plan_flight(self, plan_id: int, flight_id: int) -> bool:
@@ -1140,7 +1622,7 @@ class DatabaseManager:
                 """, (flight_id, plan_id))
                 return cursor.rowcount > 0
         except Exception as e:
-            print(f"Error deleting flight: {e}")
+            logger.error(f"Error deleting flight: {e}")
             return False
     
     # ===== STATISTICS =====
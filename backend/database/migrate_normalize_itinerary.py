@@ -0,0 +1,41 @@
+"""
+Migration script to move travel_plans.itinerary into plan_days / plan_activities
+The tables themselves are created with the schema; this backfills plans that
+still store their itinerary as a JSON blob. Plans are also converted lazily
+on their first activity patch, so running this is safe at any time.
+"""
+import os
+import sys
+import logging
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from database.db_manager import DatabaseManager
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def migrate():
+    """Normalize every itinerary that is a list of days"""
+    logger.info(f"Connecting to database: {Config.DATABASE_PATH}")
+
+    db = DatabaseManager(Config.DATABASE_PATH)
+    counts = db.normalize_itineraries()
+
+    if not counts['normalized'] and not counts['skipped']:
+        logger.info("✅ All itineraries are already normalized. No migration needed.")
+        return
+
+    logger.info(f"✅ Normalized {counts['normalized']} plan(s)")
+    if counts['skipped']:
+        logger.info(f"⚠️  {counts['skipped']} plan(s) kept as JSON (itinerary is not a list of days)")
+
+
+if __name__ == '__main__':
+    logger.info("="*80)
+    logger.info("MIGRATION: Normalize travel_plans.itinerary into plan_days / plan_activities")
+    logger.info("="*80)
+    migrate()
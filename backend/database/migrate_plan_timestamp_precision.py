@@ -0,0 +1,65 @@
+"""
+Migration script to store travel_plans.updated_at with millisecond precision
+The plan ETags are derived from updated_at, so two edits within the same
+second must still produce different timestamps
+"""
+import sqlite3
+import os
+import sys
+import logging
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def migrate():
+    """Recreate update_plan_timestamp trigger with millisecond timestamps"""
+    db_path = Config.DATABASE_PATH
+    logger.info(f"Connecting to database: {db_path}")
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'update_plan_timestamp'"
+        )
+        row = cursor.fetchone()
+
+        if row and '%f' in row[0]:
+            logger.info("✅ Trigger 'update_plan_timestamp' already uses millisecond precision. No migration needed.")
+            return
+
+        logger.info("📝 Recreating 'update_plan_timestamp' trigger...")
+        cursor.execute("DROP TRIGGER IF EXISTS update_plan_timestamp")
+        cursor.execute("""
+            CREATE TRIGGER update_plan_timestamp
+            AFTER UPDATE ON travel_plans
+            BEGIN
+                UPDATE travel_plans SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE id = NEW.id;
+            END
+        """)
+
+        conn.commit()
+        logger.info("✅ Migration completed successfully!")
+
+    except Exception as e:
+        logger.error(f"❌ Migration failed: {e}")
+        conn.rollback()
+        raise
+
+    finally:
+        conn.close()
+        logger.info("Database connection closed")
+
+
+if __name__ == '__main__':
+    logger.info("="*80)
+    logger.info("MIGRATION: Millisecond precision for travel_plans.updated_at")
+    logger.info("="*80)
+    migrate()
@@ -104,6 +104,7 @@ class TravelPlan:
     end_date: Optional[str] = None  # ISO format: YYYY-MM-DD
     itinerary: Dict[str, Any] = None  # JSON object
     total_cost: Optional[float] = None
+    activities_cost: Optional[float] = None  # SUM(plan_activities.cost), normalized plans only
     search_sources: Optional[str] = None  # JSON array of search sources
     status: str = "draft"  # draft, active, archived, completed
     is_favorite: bool = False
@@ -127,6 +128,7 @@ class TravelPlan:
             'end_date': self.end_date,
             'itinerary': self.itinerary,
             'total_cost': self.total_cost,
+            'activities_cost': self.activities_cost,
             'search_sources': json.loads(self.search_sources) if self.search_sources else [],
             'status': self.status,
             'is_favorite': self.is_favorite,
@@ -371,6 +373,48 @@ CREATE TABLE IF NOT EXISTS search_cache (
     expires_at TIMESTAMP NOT NULL,
     hit_count INTEGER DEFAULT 0
 );
+
+-- Table 5: plan_days - Các ngày của lịch trình (itinerary đã chuẩn hóa)
+-- travel_plans.itinerary = '[]' khi lịch trình nằm ở plan_days / plan_activities
+CREATE TABLE IF NOT EXISTS plan_days (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    plan_id INTEGER NOT NULL,
+    day_number INTEGER NOT NULL,
+    title TEXT,
+    description TEXT,
+    notes TEXT,
+    extra TEXT,
+    UNIQUE (plan_id, day_number),
+    FOREIGN KEY (plan_id) REFERENCES travel_plans(id) ON DELETE CASCADE
+);
+
+-- Table 6: plan_activities - Hoạt động trong từng ngày
+CREATE TABLE IF NOT EXISTS plan_activities (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    plan_id INTEGER NOT NULL,
+    day_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    time TEXT,
+    type TEXT,
+    title TEXT,
+    description TEXT,
+    location TEXT,
+    cost INTEGER,
+    extra TEXT,
+    FOREIGN KEY (plan_id) REFERENCES travel_plans(id) ON DELETE CASCADE,
+    FOREIGN KEY (day_id) REFERENCES plan_days(id) ON DELETE CASCADE
+);
+-- Table 7: conversation_summaries - Tóm tắt cuốn chiếu của từng phiên hội thoại
+-- (mọi lượt có id <= last_conversation_id đã được gộp vào summary)
+CREATE TABLE IF NOT EXISTS conversation_summaries (
+    conversation_session_id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    summary TEXT NOT NULL DEFAULT '',
+    turns INTEGER DEFAULT 0,
+    last_conversation_id INTEGER DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Indexes để tối ưu performance
 CREATE INDEX IF NOT EXISTS idx_session_id ON conversations(session_id);
 CREATE INDEX IF NOT EXISTS idx_conversation_session_id ON conversations(conversation_session_id);
@@ -383,11 +427,13 @@ CREATE INDEX IF NOT EXISTS idx_plan_destination ON travel_plans(destination);
 CREATE INDEX IF NOT EXISTS idx_plan_created ON travel_plans(created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_cache_query ON search_cache(query);
 CREATE INDEX IF NOT EXISTS idx_cache_expires ON search_cache(expires_at);
+CREATE INDEX IF NOT EXISTS idx_activity_day ON plan_activities(day_id, position);
+CREATE INDEX IF NOT EXISTS idx_activity_plan_type ON plan_activities(plan_id, type, cost);
 
 -- Trigger: Auto update timestamp
 CREATE TRIGGER IF NOT EXISTS update_plan_timestamp 
 AFTER UPDATE ON travel_plans
 BEGIN
-    UPDATE travel_plans SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+    UPDATE travel_plans SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE id = NEW.id;
 END;
 """
@@ -0,0 +1,371 @@
+"""
+Record/replay of external calls (cassettes)
+In record mode every Gemini call, web search and RapidAPI request made by
+the agent, hotel and flight searchers is captured with its timing into a
+gzipped JSON-lines cassette. In replay mode the same calls are answered from
+the cassette, sleeping for the recorded (or scaled) duration, so benchmark
+runs see identical upstream behaviour and only our own code varies.
+"""
+import atexit
+import gzip
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+OFF = 'off'
+RECORD = 'record'
+REPLAY = 'replay'
+
+
+class CassetteMiss(RuntimeError):
+    """Replay found no recording for a request"""
+
+
+class RecordedError(RuntimeError):
+    """A call that failed while recording fails the same way on replay"""
+
+
+def _key(provider: str, request: Any) -> str:
+    blob = json.dumps([provider, request], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(blob.encode('utf-8')).hexdigest()[:20]
+
+
+# "Hôm nay là ngày 19/10/2026" in the ask / intent prompts
+_TODAY = re.compile(r'(Hôm nay là ngày )\d{1,2}/\d{1,2}/\d{4}')
+
+
+def _gemini_request(prompt: str, stream: bool, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Cassette key of a Gemini call: prompt without today's date, streaming flag, per-call settings"""
+    request = {'prompt': _TODAY.sub(r'\1<today>', prompt), 'stream': stream}
+    if kwargs:
+        # e.g. generation_config with a response_schema (structured output)
+        request['kwargs'] = kwargs
+    return request
+
+
+def _preview(value: Any, limit: int = 120) -> str:
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+    return text[:limit]
+
+
+class Cassette:
+    """
+    Recorded interactions, keyed by provider and request
+
+    Identical requests recorded several times are replayed in recorded
+    order; once exhausted the last recording is repeated.
+
+    Args:
+        path: Cassette file (.jsonl.gz)
+        mode: 'record' or 'replay'
+        time_scale: Replay delay multiplier (1 = original timing, 0 = none)
+    """
+
+    def __init__(self, path: Path, mode: str, time_scale: float = 1.0):
+        self.path = Path(path)
+        self.mode = mode
+        self.time_scale = time_scale
+        self.entries: Dict[str, List[Dict[str, Any]]] = {}
+        self.stats = {'recorded': 0, 'replayed': 0, 'misses': 0}
+        self._recorded: List[Dict[str, Any]] = []
+        self._cursor: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        if mode == REPLAY:
+            self._load()
+
+    def _load(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.entries.setdefault(entry['k'], []).append(entry)
+        logger.info(f"📼 Loaded {sum(map(len, self.entries.values()))} interaction(s) from {self.path}")
+
+    def save(self):
+        """Write the recorded interactions (record mode)"""
+        if self.mode != RECORD:
+            return
+        with self._lock:
+            recorded = list(self._recorded)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with gzip.open(self.path, 'wt', encoding='utf-8') as f:
+            for entry in recorded:
+                f.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+        logger.info(f"📼 Saved {len(recorded)} interaction(s) to {self.path}")
+
+    def add(self, provider: str, request: Any, elapsed: float, response: Any = None,
+            error: Optional[BaseException] = None, chunks: Optional[List[Tuple[float, str]]] = None,
+            label: Optional[str] = None):
+        """Record one interaction; `label` replaces the request preview stored for humans"""
+        entry = {'p': provider, 'k': _key(provider, request), 'q': label or _preview(request),
+                 't': round(elapsed, 4)}
+        if error is not None:
+            entry['e'] = f"{type(error).__name__}: {error}"
+        else:
+            entry['r'] = response
+        if chunks is not None:
+            entry['c'] = [[round(offset, 4), text] for offset, text in chunks]
+        with self._lock:
+            self._recorded.append(entry)
+            self.stats['recorded'] += 1
+
+    def next(self, provider: str, request: Any) -> Dict[str, Any]:
+        """
+        The recording for a request
+
+        Raises:
+            CassetteMiss: Nothing was recorded for it
+        """
+        key = _key(provider, request)
+        with self._lock:
+            recordings = self.entries.get(key)
+            if not recordings:
+                self.stats['misses'] += 1
+                raise CassetteMiss(f"No {provider} recording for {_preview(request, 80)!r}")
+            index = self._cursor.get(key, 0)
+            self._cursor[key] = index + 1
+            self.stats['replayed'] += 1
+            return recordings[min(index, len(recordings) - 1)]
+
+    def sleep(self, seconds: float):
+        if self.time_scale > 0 and seconds > 0:
+            time.sleep(seconds * self.time_scale)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'mode': self.mode, 'path': str(self.path), 'time_scale': self.time_scale, **self.stats}
+
+    # ===== INSTALLATION =====
+
+    def install(self, agent=None, hotel_searcher=None, flight_searcher=None):
+        """Route the outbound calls of the given objects through the cassette"""
+        if agent is not None:
+            agent.model = CassetteModel(self, agent.model if self.mode == RECORD else None)
+            agent.use_gemini = True
+            self._wrap_search(agent.search)
+        for searcher in (hotel_searcher, flight_searcher):
+            if searcher is not None:
+                searcher.http = CassetteHttpClient(self, searcher.http if self.mode == RECORD else None)
+
+    def _wrap_search(self, search_tool):
+        search_web = search_tool._search_web
+
+        def cassette_search_web(query: str, max_results: Optional[int] = None):
+            request = {'query': query, 'max_results': max_results or search_tool.max_results}
+            if self.mode == RECORD:
+                started = time.perf_counter()
+                results = search_web(query, max_results)
+                self.add('search', request, time.perf_counter() - started, results)
+                return results
+            try:
+                entry = self.next('search', request)
+            except CassetteMiss as e:
+                # Same fallback as a failed DuckDuckGo search
+                logger.warning(f"⚠️ {e}")
+                return search_tool._mock_search(query, max_results)
+            self.sleep(entry['t'])
+            return entry['r']
+
+        search_tool._search_web = cassette_search_web
+
+
+# ===== GEMINI =====
+
+def _response_text(response) -> str:
+    try:
+        return response.text or ''
+    except (AttributeError, ValueError):
+        return ''
+
+
+def _usage(response) -> Optional[List[int]]:
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return None
+    return [getattr(usage, 'prompt_token_count', 0) or 0, getattr(usage, 'candidates_token_count', 0) or 0]
+
+
+def _usage_metadata(usage: Optional[List[int]]):
+    if not usage:
+        return None
+    return SimpleNamespace(prompt_token_count=usage[0], candidates_token_count=usage[1],
+                           total_token_count=usage[0] + usage[1])
+
+
+class _ReplayedStream:
+    """Iterable of recorded chunks; usage_metadata is set once exhausted, like Gemini's"""
+
+    def __init__(self, iterator: Iterator[Any]):
+        self._iterator = iterator
+        self.usage_metadata = None
+
+    def __iter__(self):
+        return self._iterator
+
+
+class CassetteModel:
+    """
+    Gemini model wrapper: records around the real model, or replays
+
+    Requests are keyed by prompt (with today's date masked, so a cassette
+    replays on later days), streaming flag and the per-call settings such as
+    a structured-output generation_config.
+    """
+
+    def __init__(self, cassette: Cassette, model=None):
+        self.cassette = cassette
+        self.model = model
+
+    def generate_content(self, prompt: str, stream: bool = False, **kwargs):
+        request = _gemini_request(prompt, stream, kwargs)
+        if self.cassette.mode == RECORD:
+            if stream:
+                return self._record_stream(request, prompt, kwargs)
+            started = time.perf_counter()
+            try:
+                response = self.model.generate_content(prompt, **kwargs)
+                text = response.text
+            except Exception as e:
+                self.cassette.add('gemini', request, time.perf_counter() - started, error=e)
+                raise
+            self.cassette.add('gemini', request, time.perf_counter() - started,
+                              {'text': text, 'usage': _usage(response)})
+            return response
+
+        entry = self.cassette.next('gemini', request)
+        if stream:
+            return self._replay_stream(entry)
+        self.cassette.sleep(entry['t'])
+        if 'e' in entry:
+            raise RecordedError(entry['e'])
+        return SimpleNamespace(text=entry['r']['text'], usage_metadata=_usage_metadata(entry['r']['usage']))
+
+    def _record_stream(self, request: Dict[str, Any], prompt: str, kwargs: Dict[str, Any]) -> _ReplayedStream:
+        stream = _ReplayedStream(iter(()))
+
+        def chunks():
+            started = time.perf_counter()
+            recorded: List[Tuple[float, str]] = []
+            response = None
+            try:
+                response = self.model.generate_content(prompt, stream=True, **kwargs)
+                for chunk in response:
+                    recorded.append((time.perf_counter() - started, _response_text(chunk)))
+                    yield chunk
+            except GeneratorExit:
+                # Consumer stopped early: keep what it received
+                self.cassette.add('gemini', request, time.perf_counter() - started,
+                                  {'text': ''.join(text for _, text in recorded), 'usage': None},
+                                  chunks=recorded)
+                raise
+            except Exception as e:
+                self.cassette.add('gemini', request, time.perf_counter() - started, error=e, chunks=recorded)
+                raise
+            stream.usage_metadata = getattr(response, 'usage_metadata', None)
+            self.cassette.add('gemini', request, time.perf_counter() - started,
+                              {'text': ''.join(text for _, text in recorded), 'usage': _usage(response)},
+                              chunks=recorded)
+
+        stream._iterator = chunks()
+        return stream
+
+    def _replay_stream(self, entry: Dict[str, Any]) -> _ReplayedStream:
+        stream = _ReplayedStream(iter(()))
+
+        def chunks():
+            elapsed = 0.0
+            for offset, text in entry.get('c', []):
+                self.cassette.sleep(offset - elapsed)
+                elapsed = offset
+                yield SimpleNamespace(text=text, usage_metadata=None)
+            self.cassette.sleep(entry['t'] - elapsed)
+            if 'e' in entry:
+                raise RecordedError(entry['e'])
+            stream.usage_metadata = _usage_metadata(entry['r']['usage'])
+
+        stream._iterator = chunks()
+        return stream
+
+
+# ===== RAPIDAPI =====
+
+class CassetteHttpClient:
+    """
+    HttpClient wrapper: records around the real client, or replays
+
+    Requests are keyed by method, URL and query parameters. Headers (which
+    carry the API key) are neither keyed nor stored.
+    """
+
+    def __init__(self, cassette: Cassette, client=None):
+        self.cassette = cassette
+        self.client = client
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        request = {'method': method.upper(), 'url': url, 'params': kwargs.get('params'), 'json': kwargs.get('json')}
+        label = f"{method.upper()} {url}"
+        if self.cassette.mode == RECORD:
+            started = time.perf_counter()
+            try:
+                response = self.client.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                self.cassette.add('http', request, time.perf_counter() - started, error=e, label=label)
+                raise
+            self.cassette.add('http', request, time.perf_counter() - started, {
+                'status': response.status_code,
+                'content_type': response.headers.get('Content-Type', ''),
+                'body': response.text
+            }, label=label)
+            return response
+
+        try:
+            entry = self.cassette.next('http', request)
+        except CassetteMiss as e:
+            raise requests.exceptions.ConnectionError(str(e))
+        self.cassette.sleep(entry['t'])
+        if 'e' in entry:
+            raise requests.exceptions.ConnectionError(entry['e'])
+        response = requests.Response()
+        response.status_code = entry['r']['status']
+        response.url = url
+        response.headers['Content-Type'] = entry['r']['content_type']
+        response.encoding = 'utf-8'
+        response._content = entry['r']['body'].encode('utf-8')
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+
+
+def open_cassette(mode: str, path: Path, time_scale: float = 1.0) -> Optional[Cassette]:
+    """
+    Cassette for CASSETTE_MODE, or None when off
+
+    A recording cassette is saved at interpreter exit.
+    """
+    mode = (mode or OFF).lower()
+    if mode == OFF:
+        return None
+    if mode not in (RECORD, REPLAY):
+        raise ValueError(f"Unknown cassette mode: {mode}")
+    cassette = Cassette(path, mode, time_scale)
+    if mode == RECORD:
+        atexit.register(cassette.save)
+    return cassette
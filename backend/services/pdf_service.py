@@ -0,0 +1,297 @@
+"""
+Out-of-process PDF rendering service
+WeasyPrint layout is CPU-bound, so renders run in a pool of pre-initialized
+worker processes instead of Flask request threads. The pool has a bounded
+queue, per-job timeouts, a per-worker memory cap and recycles workers after
+a fixed number of jobs.
+"""
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from utils.pdf_generator import PDFCache, TravelPlanPDFGenerator
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs stay pollable for this long
+JOB_RETENTION_SECONDS = 600
+
+
+class PDFQueueFull(Exception):
+    """Raised when the render queue is at capacity"""
+
+
+class PDFRenderTimeout(Exception):
+    """Raised when a render exceeds its time budget"""
+
+
+# ===== WORKER PROCESS =====
+
+_worker_generator: Optional[TravelPlanPDFGenerator] = None
+
+
+def _init_worker(memory_limit_mb: int):
+    """Pool initializer: cap memory and build the long-lived renderer once"""
+    global _worker_generator
+
+    # Ctrl+C is handled by the parent, which closes the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # Recycled workers are forked after the parent's log listener started:
+    # its queue (and lock) only live in the parent, so log to stderr instead
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.StreamHandler())
+
+    if memory_limit_mb and resource is not None:
+        limit = memory_limit_mb * 1024 * 1024
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ValueError, OSError) as e:
+            logger.warning(f"⚠️ Cannot set PDF worker memory limit: {e}")
+
+    _worker_generator = TravelPlanPDFGenerator()
+
+
+def _on_alarm(signum, frame):
+    raise PDFRenderTimeout("PDF render timed out")
+
+
+def _render_job(plan: Dict[str, Any], hotel: Optional[Dict[str, Any]],
+                flights: Optional[List[Dict[str, Any]]], timeout: int) -> bytes:
+    """Render one PDF inside a worker, aborting after `timeout` seconds"""
+    use_alarm = timeout and hasattr(signal, 'SIGALRM')
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.alarm(timeout)
+    try:
+        return _worker_generator.generate_pdf(plan, hotel, flights)
+    except MemoryError:
+        # Re-raised as a plain error: the partially allocated heap is
+        # released when the worker is recycled
+        raise RuntimeError("PDF render exceeded the worker memory limit")
+    finally:
+        if use_alarm:
+            signal.alarm(0)
+
+
+# ===== JOBS =====
+
+class PDFJob:
+    """A queued or finished render of one plan version"""
+
+    def __init__(self, plan_id: int, fingerprint: str):
+        self.id = uuid.uuid4().hex
+        self.plan_id = plan_id
+        self.fingerprint = fingerprint
+        self.status = 'pending'
+        self.path: Optional[Path] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._done = threading.Event()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the job finishes; returns False on timeout"""
+        return self._done.wait(timeout)
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def _finish(self, status: str, path: Optional[Path] = None, error: Optional[str] = None):
+        self.status = status
+        self.path = path
+        self.error = error
+        self.finished_at = time.time()
+        self._done.set()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.id,
+            'plan_id': self.plan_id,
+            'status': self.status,
+            'error': self.error
+        }
+
+
+# ===== SERVICE =====
+
+class PDFRenderService:
+    """
+    Process pool that renders plan PDFs into a PDFCache
+
+    Attributes:
+        processes: Number of worker processes
+        max_queue: Maximum number of unfinished jobs (queued + rendering)
+        job_timeout: Per-render time budget in seconds
+    """
+
+    def __init__(
+        self,
+        cache: PDFCache,
+        processes: Optional[int] = None,
+        max_queue: int = 32,
+        job_timeout: int = 60,
+        memory_limit_mb: int = 1024,
+        max_tasks_per_child: int = 50
+    ):
+        self.cache = cache
+        self.processes = processes or max(1, (multiprocessing.cpu_count() or 2) - 1)
+        self.max_queue = max_queue
+        self.job_timeout = job_timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.max_tasks_per_child = max_tasks_per_child
+        self._pool = None
+        self._start_lock = threading.Lock()
+        self._jobs: Dict[str, PDFJob] = {}
+        self._active: Dict[tuple, PDFJob] = {}
+        self._lock = threading.Lock()
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0}
+
+    @classmethod
+    def from_config(cls, cache: PDFCache) -> 'PDFRenderService':
+        """Create the service from Config"""
+        from config import Config
+
+        return cls(
+            cache,
+            processes=Config.PDF_WORKERS,
+            max_queue=Config.PDF_QUEUE_MAX,
+            job_timeout=Config.PDF_JOB_TIMEOUT,
+            memory_limit_mb=Config.PDF_WORKER_MEMORY_MB,
+            max_tasks_per_child=Config.PDF_WORKER_MAX_JOBS
+        )
+
+    def start(self):
+        """
+        Start the worker processes
+
+        app.py calls this at server start, before any other thread exists:
+        fork copies only the calling thread, so a lock another thread holds
+        at that moment stays locked forever in the worker. Otherwise
+        (tests, benchmarks, an imported app) submit() starts the pool on
+        first use.
+        """
+        with self._start_lock:
+            if self._pool is None:
+                # fork: workers inherit the already imported WeasyPrint/Pango
+                # modules, and app.py (not import-safe) is never re-run in them
+                if 'fork' in multiprocessing.get_all_start_methods():
+                    ctx = multiprocessing.get_context('fork')
+                else:
+                    ctx = multiprocessing.get_context('spawn')
+
+                self._pool = ctx.Pool(
+                    processes=self.processes,
+                    initializer=_init_worker,
+                    initargs=(self.memory_limit_mb,),
+                    maxtasksperchild=self.max_tasks_per_child
+                )
+                logger.info(f"🖨️ Started {self.processes} PDF worker process(es)")
+            return self._pool
+
+    def queue_depth(self) -> int:
+        """Number of unfinished jobs"""
+        with self._lock:
+            return len(self._active)
+
+    def submit(self, plan_id: int, fingerprint: str, plan: Dict[str, Any],
+               hotel: Optional[Dict[str, Any]] = None,
+               flights: Optional[List[Dict[str, Any]]] = None) -> PDFJob:
+        """
+        Queue a render of one plan version
+
+        A render already in flight for the same plan version is reused.
+
+        Raises:
+            PDFQueueFull: Too many unfinished jobs
+        """
+        key = (plan_id, fingerprint)
+        # Never fork while holding the service lock
+        pool = self._pool or self.start()
+        with self._lock:
+            self._prune()
+
+            job = self._active.get(key)
+            if job is not None:
+                return job
+
+            if len(self._active) >= self.max_queue:
+                self.stats['rejected'] += 1
+                raise PDFQueueFull(f"PDF render queue is full ({self.max_queue} jobs)")
+
+            job = PDFJob(plan_id, fingerprint)
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self.stats['submitted'] += 1
+
+            pool.apply_async(
+                _render_job,
+                (plan, hotel, flights, self.job_timeout),
+                callback=lambda pdf_bytes: self._complete(job, key, pdf_bytes),
+                error_callback=lambda error: self._fail(job, key, error)
+            )
+        return job
+
+    def get_job(self, job_id: str) -> Optional[PDFJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    # Pool callbacks run on the pool's result-handler thread
+
+    def _complete(self, job: PDFJob, key: tuple, pdf_bytes: bytes):
+        try:
+            path = self.cache.put(job.plan_id, job.fingerprint, pdf_bytes, requested_at=job.created_at)
+        except OSError as e:
+            self._fail(job, key, e)
+            return
+        with self._lock:
+            self._active.pop(key, None)
+            self.stats['completed'] += 1
+        job._finish('done', path=path)
+
+    def _fail(self, job: PDFJob, key: tuple, error: BaseException):
+        logger.error(f"❌ PDF render failed for plan {job.plan_id}: {error}")
+        with self._lock:
+            self._active.pop(key, None)
+            self.stats['failed'] += 1
+        job._finish('failed', error=str(error))
+
+    def _prune(self):
+        """Expire stuck jobs and forget old finished ones (lock held)"""
+        now = time.time()
+
+        # A worker stuck outside Python never delivers its result; free the
+        # queue slot so one bad render cannot wedge the service
+        stuck_before = now - 2 * self.job_timeout
+        for key, job in list(self._active.items()):
+            if job.created_at < stuck_before:
+                del self._active[key]
+                self.stats['failed'] += 1
+                job._finish('failed', error='PDF render timed out')
+
+        cutoff = now - JOB_RETENTION_SECONDS
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def close(self):
+        """Stop the worker processes"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.terminate()
+            pool.join()
@@ -0,0 +1,185 @@
+"""
+Streaming bulk export of travel plans
+Builds a ZIP archive (one JSON and one PDF per plan plus a manifest) and
+yields it chunk by chunk, so the archive is never held in memory
+"""
+import json
+import logging
+import time
+import zipfile
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from services.pdf_service import PDFJob, PDFQueueFull, PDFRenderService
+
+logger = logging.getLogger(__name__)
+
+# Plans fetched per keyset page
+PAGE_SIZE = 50
+# Bytes copied per write when adding a cached PDF
+COPY_CHUNK_SIZE = 64 * 1024
+
+
+class _ZipStream:
+    """
+    Write-only, non-seekable sink for zipfile
+
+    zipfile falls back to data descriptors when the target cannot seek,
+    so every byte written can be handed to the client immediately.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        """Return and forget everything written since the last drain"""
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _entry_name(plan) -> str:
+    name = plan.plan_name or plan.destination or 'plan'
+    for char in '/\\: ':
+        name = name.replace(char, '_')
+    return f"{plan.id}_{name}"
+
+
+class PlanExporter:
+    """
+    Streams all plans of a session/user as a ZIP
+
+    PDFs come from the on-disk cache when available; missing ones are
+    rendered in parallel on the PDF worker pool (at most `window` in
+    flight per export) and written as they complete.
+    """
+
+    def __init__(self, db, pdf_cache, pdf_service: PDFRenderService, window: Optional[int] = None):
+        self.db = db
+        self.pdf_cache = pdf_cache
+        self.pdf_service = pdf_service
+        self.window = window or pdf_service.processes * 2
+
+    def iter_plans(self, session_id: Optional[str], user_id: Optional[int]) -> Iterator:
+        """Walk the owner's plans with a keyset cursor"""
+        after_id = 0
+        while True:
+            page = self.db.get_plans_after(session_id=session_id, user_id=user_id,
+                                           after_id=after_id, limit=PAGE_SIZE)
+            if not page:
+                return
+            yield from page
+            after_id = page[-1].id
+
+    def stream(self, session_id: Optional[str], user_id: Optional[int]) -> Iterator[bytes]:
+        """
+        Yield the ZIP archive in chunks
+
+        Args:
+            session_id: Session ID (for non-authenticated users)
+            user_id: User ID (for authenticated users)
+        """
+        sink = _ZipStream()
+        manifest: Dict[str, Any] = {
+            'exported_at': datetime.now().isoformat(),
+            'plans': [],
+            'failed_pdfs': []
+        }
+        pending = deque()
+
+        with zipfile.ZipFile(sink, mode='w') as archive:
+            for plan in self.iter_plans(session_id, user_id):
+                name = _entry_name(plan)
+                hotel = self.db.get_plan_hotel(plan.id)
+                flights = self.db.get_plan_flights(plan.id)
+                plan_dict = plan.to_dict()
+
+                document = dict(plan_dict, hotel=hotel, flights=flights)
+                archive.writestr(
+                    zipfile.ZipInfo(f"{name}.json", date_time=time.localtime()[:6]),
+                    json.dumps(document, ensure_ascii=False, indent=2, default=str),
+                    compress_type=zipfile.ZIP_DEFLATED
+                )
+                manifest['plans'].append({'id': plan.id, 'name': name})
+                yield sink.drain()
+
+                version = self.db.get_plan_version(plan.id)
+                fingerprint = self.pdf_cache.fingerprint(version, hotel, flights)
+                path = self.pdf_cache.get(plan.id, fingerprint)
+                if path:
+                    yield from self._write_pdf(archive, sink, name, path)
+                else:
+                    yield from self._submit(archive, sink, pending, manifest, name,
+                                            plan.id, fingerprint, plan_dict, hotel, flights)
+                    yield from self._write_finished(archive, sink, pending, manifest)
+
+            # Remaining renders, oldest first
+            while pending:
+                yield from self._write_job(archive, sink, *pending.popleft(), manifest)
+
+            archive.writestr('manifest.json', json.dumps(manifest, ensure_ascii=False, indent=2))
+
+        yield sink.drain()
+
+    def _submit(self, archive, sink, pending: deque, manifest, name: str, plan_id: int,
+                fingerprint: str, plan_dict, hotel, flights) -> Iterator[bytes]:
+        """Queue a render, first writing finished jobs when the window is full"""
+        while len(pending) >= self.window:
+            yield from self._write_job(archive, sink, *pending.popleft(), manifest)
+
+        while True:
+            try:
+                job = self.pdf_service.submit(plan_id, fingerprint, plan_dict, hotel, flights)
+                break
+            except PDFQueueFull:
+                # Other users are rendering too: free a slot of our own, or back off
+                if pending:
+                    yield from self._write_job(archive, sink, *pending.popleft(), manifest)
+                else:
+                    time.sleep(0.5)
+        pending.append((name, job))
+
+    def _write_finished(self, archive, sink, pending: deque, manifest) -> Iterator[bytes]:
+        """Write every already finished render, in completion order"""
+        for entry in [entry for entry in pending if entry[1].done]:
+            pending.remove(entry)
+            yield from self._write_job(archive, sink, *entry, manifest)
+
+    def _write_job(self, archive, sink, name: str, job: PDFJob, manifest) -> Iterator[bytes]:
+        if not job.wait(self.pdf_service.job_timeout + 5) or job.status != 'done':
+            logger.warning(f"⚠️ Export skipped PDF of plan {job.plan_id}: {job.error or 'timed out'}")
+            manifest['failed_pdfs'].append({'id': job.plan_id, 'error': job.error or 'timed out'})
+            return
+        yield from self._write_pdf(archive, sink, name, job.path)
+
+    def _write_pdf(self, archive, sink, name: str, path: Path) -> Iterator[bytes]:
+        """Copy a PDF into the archive chunk by chunk (stored: PDFs are already compressed)"""
+        info = zipfile.ZipInfo(f"{name}.pdf", date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_STORED
+        try:
+            with open(path, 'rb') as source, archive.open(info, mode='w') as target:
+                while True:
+                    chunk = source.read(COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    yield sink.drain()
+        except FileNotFoundError:
+            # Evicted or invalidated between lookup and copy
+            logger.warning(f"⚠️ Export skipped missing PDF {path}")
+            return
+        yield sink.drain()
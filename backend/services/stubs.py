@@ -0,0 +1,463 @@
+"""
+Offline stand-ins for external providers (PROVIDER_MODE=stub)
+In-process fakes for Gemini, DuckDuckGo, the RapidAPI Agoda endpoints and
+Gmail, with configurable latency distributions and error rates, so the app
+can be load tested end to end on an isolated machine. Responses have the
+same shape as the real providers' so every parsing path is exercised.
+"""
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from agents.conversation_summary import SUMMARY_MARKER
+from agents.search_tool import SearchTool
+
+logger = logging.getLogger(__name__)
+
+# median_ms/p95_ms/error_rate per provider
+DEFAULT_LATENCY_SPEC = 'gemini=900/4000/0.02,search=350/1500/0.02,rapidapi=500/2000/0.01,email=250/800/0'
+
+
+class StubProviderError(RuntimeError):
+    """Injected failure of a stubbed provider"""
+
+
+class LatencyProfile:
+    """
+    Log-normal latency with a fixed error rate
+
+    Attributes:
+        median: Median latency in seconds
+        p95: 95th percentile latency in seconds
+        error_rate: Probability (0..1) that a call fails
+    """
+
+    def __init__(self, median_ms: float, p95_ms: float, error_rate: float = 0.0, rng: Optional[random.Random] = None):
+        self.median = median_ms / 1000
+        self.p95 = max(p95_ms, median_ms) / 1000
+        self.error_rate = error_rate
+        # p95 = median * exp(1.645 * sigma)
+        self.sigma = math.log(self.p95 / self.median) / 1.645 if self.median > 0 and self.p95 > self.median else 0.0
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec: str, rng: Optional[random.Random] = None) -> 'LatencyProfile':
+        """'900/4000/0.02' -> median 900 ms, p95 4 s, 2% errors"""
+        parts = [float(part) for part in spec.split('/')]
+        median = parts[0]
+        p95 = parts[1] if len(parts) > 1 else median
+        error_rate = parts[2] if len(parts) > 2 else 0.0
+        return cls(median, p95, error_rate, rng)
+
+    def sample(self) -> float:
+        """One latency draw in seconds"""
+        if self.median <= 0:
+            return 0.0
+        with self._lock:
+            return self.median * math.exp(self.sigma * self._rng.gauss(0, 1))
+
+    def fails(self) -> bool:
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+    def wait(self, name: str) -> float:
+        """
+        Sleep for one latency draw, then maybe fail
+
+        Raises:
+            StubProviderError: Injected error
+        """
+        delay = self.sample()
+        time.sleep(delay)
+        if self.fails():
+            raise StubProviderError(f"Injected {name} failure")
+        return delay
+
+
+def parse_latency_spec(spec: str, seed: Optional[int] = None) -> Dict[str, LatencyProfile]:
+    """
+    Parse 'gemini=900/4000/0.02,search=...' into profiles
+
+    Providers missing from the spec keep their defaults.
+    """
+    rng = random.Random(seed)
+    specs = dict(item.split('=', 1) for item in DEFAULT_LATENCY_SPEC.split(','))
+    for item in (spec or '').split(','):
+        name, sep, value = item.partition('=')
+        if sep and value.strip():
+            specs[name.strip()] = value.strip()
+    return {
+        name: LatencyProfile.parse(value, random.Random(rng.random()))
+        for name, value in specs.items()
+    }
+
+
+# ===== GEMINI =====
+
+class _UsageMetadata:
+    def __init__(self, prompt: str, text: str):
+        # Roughly 4 characters per token
+        self.prompt_token_count = max(1, len(prompt) // 4)
+        self.candidates_token_count = max(1, len(text) // 4)
+        self.total_token_count = self.prompt_token_count + self.candidates_token_count
+
+
+class StubResponse:
+    """Looks like a google.generativeai response / stream chunk"""
+
+    def __init__(self, text: str, usage_metadata: Optional[_UsageMetadata] = None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+_INTENT_MARKER = '"mode": "plan|ask|edit_plan|chat"'
+_INTENT_MESSAGE = re.compile(r'TIN NHẮN CỦA NGƯỜI DÙNG:\s*"(.*?)"\s*YÊU CẦU:', re.S)
+_DAY_HEADER = re.compile(r'NGÀY (\d+) tại (.+?)\.\s')
+_DAY_THEME = re.compile(r'CHỦ ĐỀ NGÀY \d+: (.+)')
+_TOTAL_COST = re.compile(r'"total_cost": (\d+)')
+_SENT_DAY = re.compile(r'\{"day":(\d+),')
+_ACTIVITY_SLOTS = [
+    ('07:00', 'breakfast', 'Ăn sáng', 60000),
+    ('08:30', 'sightseeing', 'Tham quan', 150000),
+    ('11:30', 'lunch', 'Ăn trưa', 120000),
+    ('14:00', 'activity', 'Trải nghiệm buổi chiều', 200000),
+    ('17:00', 'sightseeing', 'Ngắm hoàng hôn', 50000),
+    ('19:00', 'dinner', 'Ăn tối', 180000),
+]
+
+_EDITED_ACTIVITY = {
+    'time': '07:30', 'type': 'breakfast', 'title': 'Ăn sáng đặc sản',
+    'description': 'Quán địa phương được yêu thích', 'location': 'Chợ trung tâm', 'cost': 70000
+}
+
+
+class StubGeminiModel:
+    """
+    Stand-in for genai.GenerativeModel
+
+    The answer is chosen from the prompt (intent, requirements, outline,
+    single day, plan edit or free-text answer). Intent answers reuse the
+    agent's own rule-based detection, set through `rules` once the agent
+    exists.
+    """
+
+    def __init__(self, profile: LatencyProfile, chunk_chars: int = 60):
+        self.profile = profile
+        self.chunk_chars = chunk_chars
+        self.rules = None
+
+    def generate_content(self, prompt: str, stream: bool = False, **kwargs):
+        text = self._answer(prompt)
+        usage = _UsageMetadata(prompt, text)
+        if stream:
+            return self._stream(text, usage)
+        self.profile.wait('Gemini')
+        return StubResponse(text, usage)
+
+    def _stream(self, text: str, usage: _UsageMetadata) -> Iterator[StubResponse]:
+        total = self.profile.sample()
+        chunks = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)] or ['']
+        # About a third of the time goes to the first chunk, the rest is spread out
+        time.sleep(total * 0.3)
+        if self.profile.fails():
+            raise StubProviderError("Injected Gemini failure")
+        per_chunk = total * 0.7 / len(chunks)
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(per_chunk)
+            yield StubResponse(chunk, usage if i == len(chunks) - 1 else None)
+
+    def _answer(self, prompt: str) -> str:
+        if SUMMARY_MARKER in prompt:
+            return '- Người dùng đang lên kế hoạch du lịch và hỏi thêm thông tin về điểm đến.'
+        if _INTENT_MARKER in prompt:
+            return json.dumps(self._intent(prompt), ensure_ascii=False)
+        if '"operations"' in prompt:
+            return json.dumps(self._edit(prompt), ensure_ascii=False)
+        if '"days"' in prompt:
+            return json.dumps({'days': [1], 'activities': [{'day': 1, 'index': 0}]}, ensure_ascii=False)
+        if '"day_themes"' in prompt:
+            return json.dumps(self._outline(prompt), ensure_ascii=False)
+        if '"activities"' in prompt and _DAY_HEADER.search(prompt):
+            return json.dumps(self._day(prompt), ensure_ascii=False)
+        if '"modified_sections"' in prompt:
+            return json.dumps(self._modify(), ensure_ascii=False)
+        if 'HÃY PHÂN TÍCH:' in prompt:
+            return "1. Điểm đến: chưa rõ\n2. Số ngày: chưa rõ\n3. Ngân sách: chưa rõ\n5. Sở thích: chưa rõ"
+        return self._answer_text()
+
+    def _intent(self, prompt: str) -> Dict[str, Any]:
+        match = _INTENT_MESSAGE.search(prompt)
+        message = match.group(1) if match else ''
+        has_plan = '- Có kế hoạch đang mở: Có' in prompt
+        if self.rules is None:
+            return {'mode': 'ask', 'confidence': 'low', 'clean_message': message, 'direct_response': False}
+        intent = self.rules._fallback_intent_detection(message, {'stub': True} if has_plan else None)
+        if intent['mode'] == 'plan' and not intent.get('direct_response'):
+            requirements = self.rules._simple_extract_requirements(intent.get('clean_message', message))
+            requirements['ready_to_plan'] = all(
+                requirements.get(field) for field in ('destination', 'duration_days', 'budget'))
+            intent['requirements'] = requirements
+        return intent
+
+    @staticmethod
+    def _outline(prompt: str) -> Dict[str, Any]:
+        match = _TOTAL_COST.search(prompt)
+        total = int(match.group(1)) if match else 5000000
+        return {
+            'plan_name': 'Hành trình khám phá',
+            'cost_breakdown': {
+                'accommodation': {'amount': int(total * 0.35), 'description': 'Khách sạn 3 sao'},
+                'food': {'amount': int(total * 0.3), 'description': 'Ẩm thực địa phương'},
+                'transportation': {'amount': int(total * 0.2), 'description': 'Xe máy, taxi'},
+                'activities': {'amount': int(total * 0.15), 'description': 'Vé tham quan'}
+            },
+            'total_cost': total,
+            'general_notes': ['Mang theo áo mưa', 'Đặt phòng trước cuối tuần', 'Thử đặc sản địa phương'],
+            'day_themes': [{'day': day, 'theme': f'Khám phá chặng {day}'} for day in range(1, 15)]
+        }
+
+    @staticmethod
+    def _day(prompt: str) -> Dict[str, Any]:
+        header = _DAY_HEADER.search(prompt)
+        day, destination = int(header.group(1)), header.group(2)
+        theme_match = _DAY_THEME.search(prompt)
+        theme = theme_match.group(1).strip() if theme_match else 'Khám phá'
+        return {
+            'day': day,
+            'title': f'Ngày {day}: {theme}',
+            'description': f'{theme} tại {destination}',
+            'activities': [
+                {
+                    'time': time_of_day,
+                    'type': kind,
+                    'title': f'{title} - {destination}',
+                    'description': f'{title} tại một địa điểm nổi tiếng ở {destination}. ' * 2,
+                    'location': f'Trung tâm {destination}',
+                    'cost': cost
+                }
+                for time_of_day, kind, title, cost in _ACTIVITY_SLOTS
+            ],
+            'notes': ['Đi sớm để tránh đông', 'Mang theo nước uống']
+        }
+
+    @staticmethod
+    def _edit(prompt: str) -> Dict[str, Any]:
+        match = _SENT_DAY.search(prompt)
+        day = int(match.group(1)) if match else 1
+        return {
+            'understanding': f'Đổi hoạt động đầu tiên của ngày {day}',
+            'operations': [{'op': 'replace', 'day': day, 'index': 0, 'activity': _EDITED_ACTIVITY}],
+            'explanation': 'Đã thay bữa sáng bằng một quán đặc sản.'
+        }
+
+    @staticmethod
+    def _modify() -> Dict[str, Any]:
+        return {
+            'success': True,
+            'changes': 'Đã thay bữa sáng ngày 1 bằng một quán đặc sản.',
+            'modified_sections': [{'day': 1, 'activity_index': 0, 'new_activity': _EDITED_ACTIVITY}]
+        }
+
+    @staticmethod
+    def _answer_text() -> str:
+        paragraph = ('Đây là gợi ý dựa trên kinh nghiệm của nhiều du khách: nên đi vào mùa khô, '
+                     'đặt phòng sớm, thử các món đặc sản và thuê xe máy để di chuyển linh hoạt. ')
+        return '**Gợi ý cho bạn**\n\n' + paragraph * 8
+
+
+# ===== DUCKDUCKGO =====
+
+class StubSearchTool(SearchTool):
+    """SearchTool whose web search is the mock result set behind a latency profile"""
+
+    def __init__(self, profile: LatencyProfile, **kwargs):
+        super().__init__(**kwargs)
+        self.profile = profile
+
+    def _search_web(self, query: str, max_results: Optional[int] = None) -> List[Dict[str, str]]:
+        try:
+            self.profile.wait('DuckDuckGo')
+        except StubProviderError as e:
+            # Same fallback as a real DuckDuckGo failure
+            logger.error(f"❌ DuckDuckGo search failed: {e}")
+            return self._mock_search(query, max_results)
+        return [dict(result, source='stub') for result in self._mock_search(query, max_results)]
+
+
+# ===== RAPIDAPI (AGODA) =====
+
+class StubHttpClient:
+    """
+    HttpClient stand-in answering the Agoda hotel and flight endpoints
+
+    Any other URL gets a 404, so unexpected outbound calls show up in logs
+    instead of silently reaching the network.
+    """
+
+    def __init__(self, profile: LatencyProfile, hotels_per_search: int = 20, flights_per_search: int = 15):
+        self.profile = profile
+        self.hotels_per_search = hotels_per_search
+        self.flights_per_search = flights_per_search
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        path = urlsplit(url).path
+        params = kwargs.get('params') or {}
+        try:
+            self.profile.wait('RapidAPI')
+        except StubProviderError as e:
+            raise requests.exceptions.ConnectionError(str(e))
+
+        if path.endswith('/hotels/auto-complete'):
+            body = self._city(params.get('query', ''))
+        elif path.endswith('/hotels/search-overnight'):
+            body = self._hotels(params)
+        elif path.endswith('/flights/auto-complete'):
+            body = self._airports(params.get('query', ''))
+        elif path.startswith('/flights/search-'):
+            body = self._flights(params)
+        else:
+            return _json_response(url, {'message': 'Not stubbed'}, status=404)
+        return _json_response(url, body)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def _city(query: str) -> Dict[str, Any]:
+        city_id = 10000 + sum(map(ord, query)) % 9000
+        return {'places': [{'id': city_id, 'name': query, 'typeName': 'City', 'country': {'name': 'Việt Nam'}}]}
+
+    def _hotels(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        city = params.get('query', 'Việt Nam')
+        properties = []
+        for i in range(self.hotels_per_search):
+            nightly = 600000 + 150000 * (i % 8)
+            properties.append({
+                'propertyId': 500000 + i,
+                'content': {
+                    'informationSummary': {
+                        'localeName': f'Khách sạn {city} {i + 1}',
+                        'address': f'{i + 1} Đường Trung Tâm, {city}',
+                        'propertyRating': 2 + i % 4,
+                        'geoInfo': {'latitude': 16.05 + i / 1000, 'longitude': 108.2 + i / 1000}
+                    },
+                    'reviews': {'score': round(7 + (i % 30) / 10, 1), 'numberOfReviews': 50 + 37 * i},
+                    'images': {'hotelImages': [{'urls': [{'value': f'https://example.com/hotel/{i}.jpg'}]}]}
+                },
+                'pricing': {
+                    'isAvailable': i % 10 != 9,
+                    'offers': [{'roomOffers': [{'room': {'pricing': [{'price': {
+                        'perRoomPerNight': {'inclusive': {'display': nightly}},
+                        'perBook': {'inclusive': {'display': nightly * 2, 'crossedOutPrice': nightly * 2.4}},
+                        'totalDiscount': 15
+                    }}]}}]}]
+                }
+            })
+        return {'data': {'citySearch': {'properties': properties}}}
+
+    @staticmethod
+    def _airports(query: str) -> Dict[str, Any]:
+        code = (re.sub(r'[^A-Za-z]', '', query).upper() + 'XXX')[:3]
+        return {'suggestions': [{'name': query, 'airports': [{'code': code, 'name': f'Sân bay {query}'}]}]}
+
+    def _flights(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        origin = params.get('origin', 'SGN')
+        destination = params.get('destination', 'HAN')
+        departure = params.get('departureDate', '2025-01-01')
+        bundles = []
+        for i in range(self.flights_per_search):
+            hour = 6 + i % 15
+            bundles.append({
+                'key': f'stub-{origin}-{destination}-{i}',
+                'outboundSlice': {
+                    'duration': 125,
+                    'overnightFlight': False,
+                    'segments': [{
+                        'departDateTime': f'{departure}T{hour:02d}:00:00',
+                        'arrivalDateTime': f'{departure}T{hour + 2:02d}:05:00',
+                        'flightNumber': str(200 + i),
+                        'originAirport': origin,
+                        'destinationAirport': destination,
+                        'carrierContent': {'carrierName': ('Vietnam Airlines', 'VietJet Air', 'Bamboo Airways')[i % 3],
+                                           'carrierCode': ('VN', 'VJ', 'QH')[i % 3], 'carrierIcon': ''},
+                        'airportContent': {'departureAirportName': origin, 'arrivalAirportName': destination,
+                                           'departureCityName': origin, 'arrivalCityName': destination},
+                        'cabinClassContent': {'cabinName': 'Economy'}
+                    }]
+                },
+                'bundlePrice': [{'price': {'vnd': {'display': {'averagePerPax': {'allInclusive': 1200000 + 90000 * i}}}}}]
+            })
+        return {'trips': [{'bundles': bundles}]}
+
+
+def _json_response(url: str, body: Dict[str, Any], status: int = 200) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response.url = url
+    response.headers['Content-Type'] = 'application/json'
+    response._content = json.dumps(body, ensure_ascii=False).encode('utf-8')
+    response.encoding = 'utf-8'
+    return response
+
+
+# ===== GMAIL =====
+
+class StubEmailTransport:
+    """Stand-in for send_email_via_gmail_api; keeps the last messages for inspection"""
+
+    def __init__(self, profile: LatencyProfile, keep: int = 100):
+        self.profile = profile
+        self.keep = keep
+        self.outbox: List[Dict[str, str]] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, to_email, subject, text_content, html_content) -> Dict[str, Any]:
+        try:
+            self.profile.wait('Gmail')
+        except StubProviderError as e:
+            return {'success': False, 'error': str(e)}
+        with self._lock:
+            self.outbox.append({'to': to_email, 'subject': subject, 'text': text_content})
+            del self.outbox[:-self.keep]
+        return {'success': True, 'message_id': f'stub-{int(time.time() * 1000)}'}
+
+
+# ===== WIRING =====
+
+class StubProviders:
+    """All stubbed providers, sharing one latency spec"""
+
+    def __init__(self, latency_spec: str = '', seed: Optional[int] = None):
+        self.profiles = parse_latency_spec(latency_spec, seed)
+        self.gemini = StubGeminiModel(self.profiles['gemini'])
+        self.http = StubHttpClient(self.profiles['rapidapi'])
+        self.send_email = StubEmailTransport(self.profiles['email'])
+
+    def search_tool(self, **kwargs) -> StubSearchTool:
+        return StubSearchTool(self.profiles['search'], **kwargs)
+
+    def bind_agent(self, agent):
+        """Let the Gemini stub answer intent prompts with the agent's own rules"""
+        self.gemini.rules = agent
+
+    def describe(self) -> str:
+        return ', '.join(
+            f"{name} {profile.median * 1000:.0f}/{profile.p95 * 1000:.0f}ms {profile.error_rate:.0%} errors"
+            for name, profile in self.profiles.items()
+        )
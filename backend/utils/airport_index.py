@@ -0,0 +1,186 @@
+"""
+Offline airport code index for AgodaFlightSearchAPI
+Resolves city/airport names to IATA codes from a bundled table of Vietnam and
+regional airports plus codes learned from auto-complete responses
+"""
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional
+
+from .cache import PersistentDict
+
+
+# (IATA code, thành phố, tên sân bay, tên gọi khác)
+AIRPORTS = [
+    # Việt Nam
+    ('HAN', 'Hà Nội', 'Nội Bài', ['Hanoi']),
+    ('SGN', 'Hồ Chí Minh', 'Tân Sơn Nhất', ['Thành phố Hồ Chí Minh', 'Ho Chi Minh City', 'TP HCM', 'HCM', 'Sài Gòn', 'Saigon']),
+    ('DAD', 'Đà Nẵng', 'Đà Nẵng', ['Danang', 'Hội An']),
+    ('CXR', 'Nha Trang', 'Cam Ranh', ['Khánh Hòa']),
+    ('DLI', 'Đà Lạt', 'Liên Khương', ['Dalat', 'Lâm Đồng']),
+    ('PQC', 'Phú Quốc', 'Phú Quốc', []),
+    ('HUI', 'Huế', 'Phú Bài', ['Thừa Thiên Huế']),
+    ('VDO', 'Hạ Long', 'Vân Đồn', ['Quảng Ninh', 'Halong']),
+    ('HPH', 'Hải Phòng', 'Cát Bi', []),
+    ('VII', 'Vinh', 'Vinh', ['Nghệ An']),
+    ('UIH', 'Quy Nhơn', 'Phù Cát', ['Bình Định']),
+    ('TBB', 'Tuy Hòa', 'Đông Tác', ['Phú Yên']),
+    ('BMV', 'Buôn Ma Thuột', 'Buôn Ma Thuột', ['Đắk Lắk']),
+    ('PXU', 'Pleiku', 'Pleiku', ['Gia Lai']),
+    ('VCA', 'Cần Thơ', 'Cần Thơ', []),
+    ('VCS', 'Côn Đảo', 'Côn Sơn', []),
+    ('VKG', 'Rạch Giá', 'Rạch Giá', []),
+    ('CAH', 'Cà Mau', 'Cà Mau', []),
+    ('THD', 'Thanh Hóa', 'Thọ Xuân', []),
+    ('VDH', 'Đồng Hới', 'Đồng Hới', ['Quảng Bình', 'Phong Nha']),
+    ('VCL', 'Chu Lai', 'Chu Lai', ['Quảng Nam', 'Tam Kỳ']),
+    ('DIN', 'Điện Biên Phủ', 'Điện Biên Phủ', ['Điện Biên']),
+    # Khu vực
+    ('BKK', 'Bangkok', 'Suvarnabhumi', ['Băng Cốc']),
+    ('DMK', 'Don Mueang', 'Don Mueang', []),
+    ('HKT', 'Phuket', 'Phuket', []),
+    ('CNX', 'Chiang Mai', 'Chiang Mai', []),
+    ('SIN', 'Singapore', 'Changi', []),
+    ('KUL', 'Kuala Lumpur', 'Kuala Lumpur', []),
+    ('PEN', 'Penang', 'Penang', []),
+    ('HKG', 'Hồng Kông', 'Hong Kong', []),
+    ('MFM', 'Macau', 'Macau', ['Ma Cao']),
+    ('TPE', 'Đài Bắc', 'Taoyuan', ['Taipei']),
+    ('ICN', 'Seoul', 'Incheon', []),
+    ('PUS', 'Busan', 'Gimhae', []),
+    ('NRT', 'Tokyo', 'Narita', []),
+    ('HND', 'Haneda', 'Haneda', []),
+    ('KIX', 'Osaka', 'Kansai', []),
+    ('PVG', 'Thượng Hải', 'Pudong', ['Shanghai']),
+    ('PEK', 'Bắc Kinh', 'Beijing Capital', ['Beijing']),
+    ('CAN', 'Quảng Châu', 'Baiyun', ['Guangzhou']),
+    ('MNL', 'Manila', 'Ninoy Aquino', []),
+    ('CGK', 'Jakarta', 'Soekarno-Hatta', []),
+    ('DPS', 'Bali', 'Ngurah Rai', ['Denpasar']),
+    ('SAI', 'Siem Reap', 'Angkor', ['Xiêm Riệp']),
+    ('VTE', 'Viêng Chăn', 'Wattay', ['Vientiane']),
+    ('LPQ', 'Luang Prabang', 'Luang Prabang', []),
+    ('RGN', 'Yangon', 'Yangon', []),
+]
+
+# Prefix matches shorter than this are too ambiguous ("ha", "da", ...)
+MIN_PREFIX_LENGTH = 3
+
+
+def normalize_key(text: str) -> str:
+    """
+    Chuẩn hóa tên địa điểm thành key tra cứu: bỏ dấu, viết thường, chỉ giữ chữ và số
+
+    Args:
+        text: Tên địa điểm (ví dụ: "Hà Nội", "ha noi")
+
+    Returns:
+        Key đã chuẩn hóa (ví dụ: "hanoi")
+    """
+    text = text.lower().replace('đ', 'd').replace('ð', 'd')
+    nfd = unicodedata.normalize('NFD', text)
+    return ''.join(c for c in nfd if unicodedata.category(c) != 'Mn' and c.isalnum())
+
+
+class AirportIndex:
+    """
+    Bảng tra cứu mã sân bay không cần gọi API
+
+    Attributes:
+        learned: Mã sân bay học được từ API auto-complete (lưu bền vững)
+    """
+
+    def __init__(self, learned_store: Optional[PersistentDict] = None):
+        """
+        Args:
+            learned_store: Nơi lưu các mã đã học (mặc định: chỉ trong bộ nhớ)
+        """
+        self.learned = learned_store if learned_store is not None else PersistentDict()
+        self.codes = {code for code, _, _, _ in AIRPORTS}
+        self._bundled: Dict[str, str] = {}
+        for code, city, airport, aliases in AIRPORTS:
+            for name in [city, airport, *aliases]:
+                self._bundled.setdefault(normalize_key(name), code)
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def _all_keys(self) -> Dict[str, str]:
+        keys = dict(self._bundled)
+        keys.update(self.learned.items())
+        return keys
+
+    def lookup(self, location_name: str) -> Optional[str]:
+        """
+        Tra cứu mã sân bay theo tên (không dấu, không phân biệt hoa thường, hỗ trợ tiền tố)
+
+        Args:
+            location_name: Tên thành phố/sân bay hoặc mã IATA
+
+        Returns:
+            Mã sân bay, hoặc None nếu không có trong index
+        """
+        key = normalize_key(location_name or '')
+        if not key:
+            return None
+
+        code = self._match(key, location_name.strip())
+        self.stats['hits' if code else 'misses'] += 1
+        return code
+
+    def _match(self, key: str, raw: str) -> Optional[str]:
+        # Tên / tên gọi khác khớp chính xác được ưu tiên
+        learned = self.learned.get(key)
+        if learned:
+            return learned
+
+        if key in self._bundled:
+            return self._bundled[key]
+
+        # Mã IATA nhập trực tiếp: chỉ khi người dùng gõ đúng 3 chữ cái ASCII
+        # ("Cần" cũng chuẩn hóa thành "can" nhưng không phải mã CAN)
+        if len(raw) == 3 and raw.isascii() and raw.isalpha() and key.upper() in self.codes:
+            return key.upper()
+
+        # Tiền tố: chỉ nhận khi tất cả kết quả cùng một mã
+        if len(key) >= MIN_PREFIX_LENGTH:
+            candidates = {code for name, code in self._all_keys().items() if name.startswith(key)}
+            if len(candidates) == 1:
+                return candidates.pop()
+
+        return None
+
+    def remember(self, location_name: str, code: str):
+        """Lưu mã sân bay đã xác định cho một tên địa điểm"""
+        key = normalize_key(location_name or '')
+        if key and code:
+            self.learned.set(key, code)
+
+    def learn_from_autocomplete(self, query: str, response: Dict[str, Any], code: str):
+        """
+        Học từ phản hồi API auto-complete
+
+        Lưu tên đã tra cứu cùng tên các gợi ý và sân bay trong phản hồi,
+        để các lần tìm sau (kể cả tên khác của cùng thành phố) không gọi API.
+
+        Args:
+            query: Tên người dùng đã nhập
+            response: JSON trả về từ flights/auto-complete
+            code: Mã sân bay đã chọn cho query
+        """
+        self.remember(query, code)
+
+        for suggestion in response.get('suggestions', []) or []:
+            airports: List[Dict[str, Any]] = suggestion.get('airports', []) or []
+            if not airports or not airports[0].get('code'):
+                continue
+            first_code = airports[0]['code']
+            for name in _names(suggestion, ('name', 'cityName', 'displayName')):
+                if normalize_key(name) not in self._bundled:
+                    self.remember(name, first_code)
+            for airport in airports:
+                for name in _names(airport, ('name', 'airportName')):
+                    if airport.get('code') and normalize_key(name) not in self._bundled:
+                        self.remember(name, airport['code'])
+
+
+def _names(item: Dict[str, Any], fields: Iterable[str]) -> List[str]:
+    """Lấy các trường tên dạng chuỗi có trong một phần tử JSON"""
+    return [item[field] for field in fields if isinstance(item.get(field), str) and item[field].strip()]
@@ -0,0 +1,195 @@
+"""
+Static asset pipeline for khappha.online
+Bundles and minifies per-page JS/CSS, writes content-hashed files with
+precompressed .gz/.br variants, and serves them with immutable cache headers
+
+Build:
+    cd backend && python -m utils.assets
+"""
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from flask import Flask, Response, abort, request, send_file, url_for
+from markupsafe import Markup, escape
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = Path(__file__).parent.parent.parent / 'frontend' / 'static'
+DIST_DIRNAME = 'dist'
+MANIFEST_NAME = 'manifest.json'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Per-page bundles: bundle name -> source files (relative to static/), in load order
+BUNDLES: Dict[str, List[str]] = {
+    'main_chat.js': ['js/i18n.js', 'js/settings.js', 'js/main_chat.js'],
+    'main_chat_head.js': ['js/driver-tour.js'],
+    'chi_tiet_ke_hoach.js': [
+        'js/i18n.js',
+        'js/settings.js',
+        'js/chi_tiet_ke_hoach.js',
+        'js/chi_tiet_ke_hoach_mobile.js',
+    ],
+    'style.css': ['css/style.css'],
+}
+
+
+# ===== BUILD =====
+
+def _minify(source: str, kind: str) -> str:
+    """Minify JS/CSS when the minifier is installed, otherwise keep source as is"""
+    if kind == 'js' and rjsmin is not None:
+        return rjsmin.jsmin(source)
+    if kind == 'css' and rcssmin is not None:
+        return rcssmin.cssmin(source)
+    return source
+
+
+def _write_variants(path: Path, data: bytes):
+    """Write a file plus its precompressed .gz and .br siblings"""
+    path.write_bytes(data)
+    # mtime=0 keeps the .gz byte-identical across builds
+    path.with_name(path.name + '.gz').write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        path.with_name(path.name + '.br').write_bytes(brotli.compress(data, quality=11))
+
+
+def build_assets(static_dir: Path = STATIC_DIR, bundles: Dict[str, List[str]] = BUNDLES) -> Dict[str, str]:
+    """
+    Build all bundles into static/dist and write the manifest
+
+    Args:
+        static_dir: Frontend static folder
+        bundles: Bundle name -> list of source files
+
+    Returns:
+        Manifest mapping bundle name -> hashed filename
+    """
+    dist_dir = static_dir / DIST_DIRNAME
+    if dist_dir.exists():
+        shutil.rmtree(dist_dir)
+    dist_dir.mkdir(parents=True)
+
+    manifest = {}
+    for name, sources in bundles.items():
+        stem, kind = name.rsplit('.', 1)
+        parts = []
+        for source in sources:
+            text = (static_dir / source).read_text(encoding='utf-8')
+            parts.append(_minify(text, kind))
+
+        # Separate scripts with ";" so concatenation never changes ASI behaviour
+        joiner = '\n;\n' if kind == 'js' else '\n'
+        data = joiner.join(parts).encode('utf-8')
+
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        filename = f"{stem}.{digest}.{kind}"
+        _write_variants(dist_dir / filename, data)
+        manifest[name] = filename
+
+        original_size = sum((static_dir / source).stat().st_size for source in sources)
+        logger.info(f"📦 {name}: {original_size} → {len(data)} bytes ({filename})")
+
+    (dist_dir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+    return manifest
+
+
+def load_manifest(static_dir: Path = STATIC_DIR) -> Optional[Dict[str, str]]:
+    """Load the build manifest, or None if assets were not built"""
+    manifest_path = static_dir / DIST_DIRNAME / MANIFEST_NAME
+    if not manifest_path.exists():
+        return None
+    try:
+        return json.loads(manifest_path.read_text(encoding='utf-8'))
+    except (OSError, ValueError) as e:
+        logger.error(f"❌ Cannot read asset manifest {manifest_path}: {e}")
+        return None
+
+
+# ===== FLASK INTEGRATION =====
+
+def init_assets(app: Flask, enabled: bool = True):
+    """
+    Register the asset route and the asset_tags()/asset_url() template helpers
+
+    When the manifest is missing (or bundling is disabled) the helpers fall
+    back to the original unbundled files so development works without a build.
+    """
+    static_dir = Path(app.static_folder)
+    dist_dir = static_dir / DIST_DIRNAME
+    manifest = load_manifest(static_dir) if enabled else None
+
+    if manifest:
+        logger.info(f"📦 Serving {len(manifest)} built asset bundle(s) from {dist_dir}")
+
+    def asset_url(bundle: str) -> str:
+        """URL of a single-file bundle (e.g. a stylesheet)"""
+        if manifest and bundle in manifest:
+            return url_for('serve_asset', filename=manifest[bundle])
+        return url_for('static', filename=BUNDLES[bundle][0])
+
+    def asset_tags(bundle: str) -> Markup:
+        """<script>/<link> tags for a bundle"""
+        if manifest and bundle in manifest:
+            urls = [url_for('serve_asset', filename=manifest[bundle])]
+        else:
+            urls = [url_for('static', filename=source) for source in BUNDLES[bundle]]
+
+        if bundle.endswith('.css'):
+            tags = [f'<link href="{escape(url)}" rel="stylesheet"/>' for url in urls]
+        else:
+            tags = [f'<script src="{escape(url)}"></script>' for url in urls]
+        return Markup('\n'.join(tags))
+
+    app.jinja_env.globals.update(asset_url=asset_url, asset_tags=asset_tags)
+
+    @app.route('/assets/<path:filename>')
+    def serve_asset(filename):
+        """Serve a hashed bundle, preferring a precompressed variant"""
+        path = safe_join(str(dist_dir), filename)
+        if path is None or not Path(path).is_file():
+            abort(404)
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        offered = [('br', '.br'), ('gzip', '.gz')] if brotli is not None else [('gzip', '.gz')]
+        encoding = request.accept_encodings.best_match([name for name, _ in offered])
+
+        response: Response
+        for name, suffix in offered:
+            if name == encoding and Path(path + suffix).is_file():
+                response = send_file(path + suffix, mimetype=mimetype, conditional=True)
+                response.headers['Content-Encoding'] = name
+                break
+        else:
+            response = send_file(path, mimetype=mimetype, conditional=True)
+
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    built = build_assets()
+    logger.info(f"✅ Built {len(built)} bundle(s) into {STATIC_DIR / DIST_DIRNAME}")
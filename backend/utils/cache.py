@@ -0,0 +1,195 @@
+"""
+In-process caches for khappha.online
+TTLCache: bounded TTL cache with stale-while-revalidate
+PersistentDict: small JSON-file backed dictionary for values that never change
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with per-entry TTL and a stale-while-revalidate window
+
+    An entry is fresh for `ttl` seconds. For `stale_ttl` more seconds it is
+    still served, while a background refresh replaces it.
+    """
+
+    def __init__(self, name: str, ttl: float, stale_ttl: float = 0, max_size: int = 500):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0}
+
+    def get(self, key: Hashable) -> tuple:
+        """
+        Look up a key
+
+        Returns:
+            (value, state) where state is 'fresh', 'stale' or None (miss)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, None
+
+            value, stored_at = entry
+            age = time.monotonic() - stored_at
+            if age <= self.ttl:
+                self._entries.move_to_end(key)
+                return value, 'fresh'
+            if age <= self.ttl + self.stale_ttl:
+                self._entries.move_to_end(key)
+                return value, 'stale'
+
+            del self._entries[key]
+            return None, None
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entry when full"""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        """Remove a key if present"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def pending_refreshes(self) -> int:
+        """Background refreshes currently running"""
+        with self._lock:
+            return len(self._refreshing)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Return a cached value, loading it on a miss
+
+        Stale values are returned immediately and refreshed in a background
+        thread (one refresh per key at a time). Loader results of None or
+        empty collections are not cached.
+        """
+        value, state = self.get(key)
+
+        if state == 'fresh':
+            self._count('hits')
+            return value
+
+        if state == 'stale':
+            self._count('stale_hits')
+            self._refresh_in_background(key, loader)
+            return value
+
+        self._count('misses')
+        value = loader()
+        if value:
+            self.set(key, value)
+        return value
+
+    def _refresh_in_background(self, key: Hashable, loader: Callable[[], Any]):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                value = loader()
+                if value:
+                    self.set(key, value)
+                    self._count('refreshes')
+            except Exception as e:
+                logger.warning(f"⚠️ Background refresh failed for cache '{self.name}': {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name=f"{self.name}-refresh", daemon=True).start()
+
+    def _count(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
+
+
+class PersistentDict:
+    """
+    Thread-safe string-keyed dictionary persisted to a JSON file
+
+    Meant for small lookup tables (city IDs, airport codes) that are learned
+    from upstream APIs and should survive restarts. With path=None it is
+    kept in memory only.
+    """
+
+    def __init__(self, path: Optional[Path] = None, initial: Optional[Dict[str, Any]] = None):
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self._data: Dict[str, Any] = dict(initial or {})
+        self._load()
+
+    def _load(self):
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._data.update(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Cannot read {self.path}, starting empty: {e}")
+
+    def _save(self):
+        """Write atomically so a crash never leaves a truncated file"""
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._data, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            return self._data.get(key, default)
+
+    def set(self, key: str, value: Any):
+        """Store a value and persist the file if it changed"""
+        with self._lock:
+            if self._data.get(key) == value:
+                return
+            self._data[key] = value
+            try:
+                self._save()
+            except OSError as e:
+                logger.warning(f"⚠️ Cannot persist {self.path}: {e}")
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def items(self):
+        with self._lock:
+            return list(self._data.items())
@@ -1,11 +1,22 @@
+import logging
 import random
 import string
 from datetime import datetime, timedelta
 from .gmail_api import send_email_via_gmail_api
 
+logger = logging.getLogger(__name__)
+
 # Store OTP temporarily (in production, use Redis or database)
 otp_storage = {}
 
+# Function that actually delivers mail; swapped out in PROVIDER_MODE=stub
+_send_email = send_email_via_gmail_api
+
+def set_email_transport(send):
+    """Deliver mail with `send(to_email, subject, text_content, html_content)` instead of the Gmail API"""
+    global _send_email
+    _send_email = send
+
 def generate_otp(length=6):
     """Generate a random OTP code"""
     return ''.join(random.choices(string.digits, k=length))
@@ -57,7 +68,7 @@ Trân trọng,
         """
         
         # Send email using Gmail API
-        result = send_email_via_gmail_api(
+        result = _send_email(
             to_email=email,
             subject="Mã xác thực OTP - khampha.online",
             text_content=text,
@@ -70,7 +81,7 @@ Trân trọng,
             return {'success': False, 'error': result.get('error', 'Không thể gửi email')}
     
     except Exception as e:
-        print(f"Error sending OTP: {e}")
+        logger.error(f"Error sending OTP: {e}")
         return {'success': False, 'error': str(e)}
 
 def verify_otp(email, otp_code, mark_verified=False):
@@ -1,8 +1,14 @@
 import requests
 import json
+import logging
 from datetime import date, timedelta
 from typing import Dict, List, Optional, Any
 
+from .airport_index import AirportIndex
+from .http_client import HttpClient, get_http_client
+
+logger = logging.getLogger(__name__)
+
 # --- CLASS QUẢN LÝ TÌM KIẾM CHUYẾN BAY AGODA ---
 class AgodaFlightSearchAPI:
     """
@@ -12,15 +18,26 @@ class AgodaFlightSearchAPI:
         api_key: RapidAPI key để xác thực
         api_host: Host của Agoda API trên RapidAPI
         headers: Headers cho các request
+        airport_index: Bảng tra cứu mã sân bay offline
+        http: HTTP client dùng chung (connection pool, timeout, retry)
     """
     
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        airport_index: Optional[AirportIndex] = None,
+        http_client: Optional[HttpClient] = None
+    ):
         """
         Khởi tạo API client
         
         Args:
             api_key: RapidAPI key
+            airport_index: Bảng tra cứu mã sân bay (mặc định: bảng có sẵn, chỉ lưu trong bộ nhớ)
+            http_client: HTTP client (mặc định: client dùng chung của ứng dụng)
         """
+        self.http = http_client if http_client is not None else get_http_client()
+        self.airport_index = airport_index if airport_index is not None else AirportIndex()
         self.api_key = api_key
         self.api_host = "agoda-com.p.rapidapi.com"
         self.headers = {
@@ -43,11 +60,11 @@ class AgodaFlightSearchAPI:
         querystring = {"query": query}
         
         try:
-            response = requests.get(url, headers=self.headers, params=querystring)
+            response = self.http.get(url, headers=self.headers, params=querystring)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
-            print(f"Lỗi khi tìm kiếm địa điểm '{query}': {e}")
+            logger.error(f"Lỗi khi tìm kiếm địa điểm '{query}': {e}")
             return None
     
     def search_one_way_flight(
@@ -90,11 +107,11 @@ class AgodaFlightSearchAPI:
             querystring["infants"] = str(infants)
         
         try:
-            response = requests.get(url, headers=self.headers, params=querystring)
+            response = self.http.get(url, headers=self.headers, params=querystring)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
-            print(f"Lỗi khi tìm kiếm chuyến bay: {e}")
+            logger.error(f"Lỗi khi tìm kiếm chuyến bay: {e}")
             return None
     
     def search_round_trip_flight(
@@ -140,11 +157,11 @@ class AgodaFlightSearchAPI:
             querystring["infants"] = str(infants)
         
         try:
-            response = requests.get(url, headers=self.headers, params=querystring)
+            response = self.http.get(url, headers=self.headers, params=querystring)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
-            print(f"Lỗi khi tìm kiếm chuyến bay khứ hồi: {e}")
+            logger.error(f"Lỗi khi tìm kiếm chuyến bay khứ hồi: {e}")
             return None
     
     def extract_flight_info(self, flight_data: Dict[str, Any]) -> List[Dict[str, Any]]:
@@ -158,7 +175,7 @@ class AgodaFlightSearchAPI:
             List các dict chứa thông tin chuyến bay đã được xử lý
         """
         if not flight_data or 'trips' not in flight_data:
-            print("Không có dữ liệu chuyến bay")
+            logger.warning("Không có dữ liệu chuyến bay")
             return []
         
         flights = []
@@ -285,9 +302,15 @@ class AgodaFlightSearchAPI:
         Returns:
             Mã sân bay (ví dụ: "HAN") hoặc None
         """
+        # Tra cứu offline trước, chỉ gọi API khi không có trong index
+        code = self.airport_index.lookup(location_name)
+        if code:
+            logger.debug(f"✅ Found airport code (index): {code}")
+            return code
+        
         # Chuẩn hóa tên địa điểm: loại bỏ dấu, viết liền
         normalized_name = self._normalize_location(location_name)
-        print(f"🔍 Normalizing location: '{location_name}' → '{normalized_name}'")
+        logger.debug(f"🔍 Normalizing location: '{location_name}' → '{normalized_name}'")
         
         result = self.search_location(normalized_name)
         if result and 'suggestions' in result and len(result['suggestions']) > 0:
@@ -295,10 +318,12 @@ class AgodaFlightSearchAPI:
             airports = first_suggestion.get('airports', [])
             if airports:
                 code = airports[0].get('code')
-                print(f"✅ Found airport code: {code}")
+                logger.info(f"✅ Found airport code: {code}")
+                if code:
+                    self.airport_index.learn_from_autocomplete(location_name, result, code)
                 return code
         
-        print(f"❌ No airport code found for '{location_name}'")
+        logger.warning(f"❌ No airport code found for '{location_name}'")
         return None
     
     def _normalize_location(self, location: str) -> str:
@@ -349,7 +374,7 @@ class AgodaFlightSearchAPI:
                 json.dump(data, f, ensure_ascii=False, indent=2)
             return True
         except Exception as e:
-            print(f"Lỗi khi lưu file {filename}: {e}")
+            logger.error(f"Lỗi khi lưu file {filename}: {e}")
             return False
     
     def filter_flights(
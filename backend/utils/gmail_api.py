@@ -1,6 +1,7 @@
 """
 Gmail API service for sending emails
 """
+import logging
 import os
 import base64
 from email.mime.text import MIMEText
@@ -11,6 +12,8 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
 # If modifying these scopes, delete the file token.json
 SCOPES = ['https://www.googleapis.com/auth/gmail.send']
 
@@ -30,7 +33,7 @@ def get_gmail_service():
             try:
                 creds.refresh(Request())
             except Exception as e:
-                print(f"Error refreshing token: {e}")
+                logger.error(f"Error refreshing token: {e}")
                 raise Exception("Gmail API token expired. Please run authorize_gmail.py to re-authenticate.")
         else:
             raise Exception(
@@ -87,7 +90,7 @@ def send_email_via_gmail_api(to_email, subject, text_content, html_content):
         }
     
     except Exception as e:
-        print(f"Error sending email via Gmail API: {e}")
+        logger.error(f"Error sending email via Gmail API: {e}")
         return {
             'success': False,
             'error': str(e)
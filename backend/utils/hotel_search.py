@@ -1,8 +1,48 @@
 import requests
 import json
+import logging
+import threading
+import unicodedata
 from datetime import date, datetime, timedelta
 from typing import Optional, Dict, List, Any, Union
 
+from .cache import TTLCache, PersistentDict
+from .http_client import HttpClient, get_http_client
+
+logger = logging.getLogger(__name__)
+
+# Các điểm đến phổ biến - city ID được nạp sẵn khi khởi động (preload_city_ids)
+COMMON_CITIES = [
+    "Hà Nội", "Hồ Chí Minh", "Đà Nẵng", "Đà Lạt", "Nha Trang", "Phú Quốc",
+    "Hội An", "Huế", "Sapa", "Hạ Long", "Vũng Tàu", "Quy Nhơn", "Phan Thiết",
+]
+
+# Tên gọi khác -> tên dùng để tra cứu city ID
+CITY_ALIASES = {
+    "saigon": "hochiminh",
+    "tphcm": "hochiminh",
+    "tphochiminh": "hochiminh",
+    "thanhphohochiminh": "hochiminh",
+    "hcm": "hochiminh",
+    "muine": "phanthiet",
+}
+
+
+def normalize_city_name(city_name: str) -> str:
+    """
+    Chuẩn hóa tên thành phố để làm key cache (bỏ dấu, khoảng trắng, viết thường).
+    
+    Args:
+        city_name (str): Tên thành phố, ví dụ "Đà Lạt", "da lat"
+        
+    Returns:
+        str: Key đã chuẩn hóa, ví dụ "dalat"
+    """
+    text = city_name.lower().replace('đ', 'd')
+    text = unicodedata.normalize('NFD', text)
+    text = ''.join(c for c in text if unicodedata.category(c) != 'Mn' and c.isalnum())
+    return CITY_ALIASES.get(text, text)
+
 
 class HotelSearcher:
     """
@@ -12,16 +52,34 @@ class HotelSearcher:
         api_key (str): RapidAPI key
         host (str): RapidAPI host
         headers (dict): Headers cho API requests
+        city_ids (PersistentDict): City ID đã biết, lưu bền vững giữa các lần chạy
+        result_cache (TTLCache): Cache kết quả đã định dạng (stale-while-revalidate)
+        http (HttpClient): HTTP client dùng chung (connection pool, timeout, retry)
     """
     
-    def __init__(self, api_key: str, host: str = "agoda-com.p.rapidapi.com"):
+    def __init__(
+        self,
+        api_key: str,
+        host: str = "agoda-com.p.rapidapi.com",
+        city_id_store: Optional[PersistentDict] = None,
+        result_cache: Optional[TTLCache] = None,
+        http_client: Optional[HttpClient] = None
+    ):
         """
         Khởi tạo HotelSearcher.
         
         Args:
             api_key (str): RapidAPI key
             host (str): RapidAPI host (mặc định: "agoda-com.p.rapidapi.com")
+            city_id_store (Optional[PersistentDict]): Nơi lưu city ID (mặc định: chỉ trong bộ nhớ)
+            result_cache (Optional[TTLCache]): Cache kết quả tìm kiếm (mặc định: TTL 30 phút, stale 2 giờ)
+            http_client (Optional[HttpClient]): HTTP client (mặc định: client dùng chung của ứng dụng)
         """
+        self.http = http_client if http_client is not None else get_http_client()
+        self.city_ids = city_id_store if city_id_store is not None else PersistentDict()
+        self.result_cache = result_cache if result_cache is not None else TTLCache(
+            'hotel_search', ttl=1800, stale_ttl=7200
+        )
         self.api_key = api_key
         self.host = host
         self.headers = {
@@ -41,6 +99,12 @@ class HotelSearcher:
         Returns:
             Optional[int]: City ID nếu tìm thấy, None nếu không tìm thấy
         """
+        # City ID không thay đổi - dùng lại nếu đã biết
+        city_key = normalize_city_name(city_name)
+        cached_id = self.city_ids.get(city_key)
+        if cached_id:
+            return cached_id
+        
         url = f"{self.base_url}/hotels/auto-complete"
         querystring = {
             "query": city_name,
@@ -48,7 +112,7 @@ class HotelSearcher:
         }
         
         try:
-            response = requests.get(url, headers=self.headers, params=querystring)
+            response = self.http.get(url, headers=self.headers, params=querystring)
             response.raise_for_status()
             data = response.json()
             
@@ -60,17 +124,19 @@ class HotelSearcher:
                 
                 if city:
                     city_id = city.get('id')
-                    print(f"✅ Tìm thấy ID của {city_name}: {city_id}")
+                    logger.info(f"✅ Tìm thấy ID của {city_name}: {city_id}")
+                    if city_id:
+                        self.city_ids.set(city_key, city_id)
                     return city_id
                 else:
-                    print(f"❌ Không tìm thấy ID cho thành phố '{city_name}'")
+                    logger.warning(f"❌ Không tìm thấy ID cho thành phố '{city_name}'")
                     return None
             else:
-                print("❌ Không nhận được dữ liệu hợp lệ từ API auto-complete")
+                logger.error("❌ Không nhận được dữ liệu hợp lệ từ API auto-complete")
                 return None
                 
         except requests.exceptions.RequestException as e:
-            print(f"❌ Lỗi khi gọi API auto-complete: {e}")
+            logger.error(f"❌ Lỗi khi gọi API auto-complete: {e}")
             return None
     
     def search_hotels(
@@ -115,7 +181,7 @@ class HotelSearcher:
         }
         
         try:
-            response = requests.get(url, headers=self.headers, params=querystring)
+            response = self.http.get(url, headers=self.headers, params=querystring)
             response.raise_for_status()
             data = response.json()
             
@@ -123,12 +189,12 @@ class HotelSearcher:
             if save_to_file:
                 with open(save_to_file, 'w', encoding='utf-8') as f:
                     json.dump(data, f, ensure_ascii=False, indent=2)
-                print(f"💾 Đã lưu kết quả vào file: {save_to_file}")
+                logger.info(f"💾 Đã lưu kết quả vào file: {save_to_file}")
             
             return data
             
         except requests.exceptions.RequestException as e:
-            print(f"❌ Lỗi khi gọi API tìm khách sạn: {e}")
+            logger.error(f"❌ Lỗi khi gọi API tìm khách sạn: {e}")
             return None
     
     def extract_hotels(self, search_data: Dict[str, Any]) -> List[Dict[str, Any]]:
@@ -262,19 +328,6 @@ class HotelSearcher:
         Returns:
             List[Dict[str, Any]]: Danh sách khách sạn đã định dạng
         """
-        print("=" * 60)
-        print(f"🔍 BƯỚC 1: Đang tìm kiếm City ID cho '{city_name}'...")
-        print("=" * 60)
-        
-        # Lấy city ID
-        city_id = self.get_city_id(city_name, language)
-        if not city_id:
-            return []
-        
-        print(f"\n{'=' * 60}")
-        print(f"🏨 BƯỚC 2: Đang tìm kiếm khách sạn tại {city_name}...")
-        print("=" * 60)
-        
         # Xử lý ngày tháng
         # Ưu tiên: checkin_date & checkout_date > days_from_now
         if checkin_date and checkout_date:
@@ -302,9 +355,58 @@ class HotelSearcher:
             checkin = date.today() + timedelta(days=days_from_now)
             checkout = checkin + timedelta(days=nights)
         
-        print(f"📅 Ngày nhận phòng: {checkin.strftime('%d/%m/%Y')}")
-        print(f"📅 Ngày trả phòng: {checkout.strftime('%d/%m/%Y')}")
-        print(f"🛏️  Số phòng: {rooms}, Số người: {adults}")
+        def load() -> List[Dict[str, Any]]:
+            return self._search_and_format(
+                city_name, checkin, checkout, rooms, adults, language, currency, save_to_file
+            )
+        
+        if save_to_file:
+            # Ghi file cần dữ liệu thô mới nhất - bỏ qua cache
+            formatted_hotels = load()
+        else:
+            cache_key = (
+                normalize_city_name(city_name), checkin.isoformat(), checkout.isoformat(),
+                rooms, adults, currency, language
+            )
+            formatted_hotels = self.result_cache.get_or_load(cache_key, load) or []
+        
+        results = formatted_hotels[:max_results]
+        logger.info(f"✅ Tìm thấy {len(formatted_hotels)} khách sạn, trả về {len(results)} kết quả đầu tiên")
+        
+        for i, formatted in enumerate(results):
+            self._log_hotel(i, formatted)
+        
+        return results
+    
+    def _search_and_format(
+        self,
+        city_name: str,
+        checkin: date,
+        checkout: date,
+        rooms: int,
+        adults: int,
+        language: str,
+        currency: str,
+        save_to_file: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Gọi API (city ID + tìm kiếm) và định dạng toàn bộ khách sạn tìm được.
+        
+        Returns:
+            List[Dict[str, Any]]: Danh sách khách sạn đã định dạng ([] nếu lỗi)
+        """
+        logger.info(f"🔍 BƯỚC 1: Đang tìm kiếm City ID cho '{city_name}'...")
+        
+        # Lấy city ID
+        city_id = self.get_city_id(city_name, language)
+        if not city_id:
+            return []
+        
+        logger.info(
+            f"🏨 BƯỚC 2: Đang tìm kiếm khách sạn tại {city_name} "
+            f"({checkin.strftime('%d/%m/%Y')} → {checkout.strftime('%d/%m/%Y')}, "
+            f"{rooms} phòng, {adults} người)"
+        )
         
         # Tìm kiếm khách sạn
         search_data = self.search_hotels(
@@ -324,41 +426,43 @@ class HotelSearcher:
         
         # Trích xuất và định dạng khách sạn
         hotels = self.extract_hotels(search_data)
-        formatted_hotels = []
+        return [self.format_hotel_info(hotel, currency) for hotel in hotels]
+    
+    def _log_hotel(self, index: int, formatted: Dict[str, Any]):
+        """Ghi log (DEBUG) một dòng tóm tắt khách sạn đã định dạng."""
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        price = formatted['price_per_night']
+        logger.debug(
+            f"🏨 #{index + 1} {formatted['name']} (ID: {formatted['hotel_id']}) - "
+            f"{formatted['star_rating'] or '?'} sao, đánh giá {formatted['rating'] or '?'}/10, "
+            f"{f'{price:,.0f}' if price else '?'} {formatted['currency']}/đêm"
+            f"{'' if formatted['is_available'] else ', không khả dụng'}"
+        )
+    
+    def preload_city_ids(self, city_names: List[str] = COMMON_CITIES, background: bool = True):
+        """
+        Nạp sẵn city ID cho các điểm đến phổ biến còn thiếu trong bộ nhớ.
         
-        print(f"\n✅ Tìm thấy {len(hotels)} khách sạn. Hiển thị {min(max_results, len(hotels))} kết quả đầu tiên:\n")
+        Mỗi thành phố chỉ tốn một lần gọi auto-complete trong suốt vòng đời
+        của file lưu trữ, các lần khởi động sau không gọi API nữa.
         
-        for i, hotel in enumerate(hotels[:max_results]):
-            formatted = self.format_hotel_info(hotel, currency)
-            formatted_hotels.append(formatted)
-            
-            print(f"{'─' * 60}")
-            print(f"🏨 KHÁCH SẠN {i+1} (ID: {formatted['hotel_id']})")
-            print(f"{'─' * 60}")
-            print(f"📍 Tên: {formatted['name']}")
-            if formatted['star_rating']:
-                print(f"⭐ Hạng: {formatted['star_rating']} sao")
-            if formatted['rating']:
-                print(f"💯 Đánh giá: {formatted['rating']}/10 ({formatted['review_count']} đánh giá)")
-            
-            # Hiển thị giá chi tiết
-            if formatted['price_per_night']:
-                print(f"💰 Giá mỗi đêm: {formatted['price_per_night']:,.0f} {formatted['currency']}")
-            if formatted['price_total']:
-                print(f"💰 Tổng giá: {formatted['price_total']:,.0f} {formatted['currency']}")
-            if formatted['discount_percent']:
-                print(f"🎁 Giảm giá: {formatted['discount_percent']}%")
-                if formatted['price_crossed_out']:
-                    print(f"   Giá gốc: {formatted['price_crossed_out']:,.0f} {formatted['currency']}")
-            
-            if not formatted['is_available']:
-                print(f"⚠️  Không khả dụng")
-            
-            if formatted['address']:
-                print(f"📍 Địa chỉ: {formatted['address']}")
-            print()
+        Args:
+            city_names (List[str]): Danh sách thành phố cần nạp
+            background (bool): Chạy trong thread nền (mặc định: True)
+        """
+        missing = [name for name in city_names if normalize_city_name(name) not in self.city_ids]
+        if not missing:
+            return
+        
+        def preload():
+            for name in missing:
+                self.get_city_id(name)
         
-        return formatted_hotels
+        if background:
+            threading.Thread(target=preload, name="hotel-city-preload", daemon=True).start()
+        else:
+            preload()
 
 
 # ===============================================
@@ -0,0 +1,176 @@
+"""
+HTTP caching and compression helpers for khappha.online
+Adds gzip/brotli response compression and strong ETags for JSON APIs
+"""
+import hashlib
+import zlib
+from typing import Iterable, Iterator, Optional
+
+from flask import Flask, Response, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/event-stream'}
+STREAMING_MIMETYPES = {'text/event-stream'}
+
+
+# ===== ETAGS =====
+
+def compute_etag(*parts) -> str:
+    """
+    Build a strong ETag value from version parts (ids, updated_at, ...)
+
+    Args:
+        parts: Values identifying one version of a resource
+
+    Returns:
+        Unquoted ETag value
+    """
+    raw = '|'.join('' if part is None else str(part) for part in parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _etag_variants(etag: str) -> list:
+    """ETag as sent by us, including the per-encoding suffixes added on compression"""
+    return [etag, f"{etag}-gzip", f"{etag}-br"]
+
+
+def not_modified(etag: str) -> Optional[Response]:
+    """
+    Return a 304 response if the client already holds this version
+
+    Args:
+        etag: Current ETag of the resource
+
+    Returns:
+        304 Response, or None if the full body must be sent
+    """
+    if_none_match = request.if_none_match
+    if not if_none_match:
+        return None
+
+    if any(if_none_match.contains(tag) for tag in _etag_variants(etag)):
+        response = Response(status=304)
+        return with_etag(response, etag)
+    return None
+
+
+def with_etag(response: Response, etag: str) -> Response:
+    """
+    Attach a strong ETag to a response; clients must revalidate before reuse
+
+    Args:
+        response: Flask response
+        etag: Unquoted ETag value
+    """
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+# ===== COMPRESSION =====
+
+def _choose_encoding() -> Optional[str]:
+    """Pick the best encoding accepted by the client"""
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+
+def _compress_body(data: bytes, encoding: str, level: int) -> bytes:
+    """Compress a complete response body"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=min(level, 11))
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _compress_stream(chunks: Iterable, encoding: str, level: int) -> Iterator[bytes]:
+    """
+    Compress a streamed response chunk by chunk
+
+    Every chunk is flushed so each SSE event reaches the client immediately
+    instead of waiting in the compressor's window.
+    """
+    try:
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=min(level, 11))
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                data = compressor.process(chunk) + compressor.flush()
+                if data:
+                    yield data
+            yield compressor.finish()
+        else:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                if data:
+                    yield data
+            yield compressor.flush()
+    finally:
+        # Propagate client disconnects to the wrapped generator
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def init_compression(app: Flask):
+    """
+    Register response compression for JSON and SSE responses
+
+    Settings (from app.config):
+        COMPRESSION_ENABLED: Master switch
+        COMPRESSION_MIN_SIZE: Smallest JSON body worth compressing (bytes)
+        COMPRESSION_LEVEL: gzip level, also used as brotli quality
+        COMPRESSION_SSE: Compress event streams (flushed per event)
+    """
+    if not app.config.get('COMPRESSION_ENABLED', True):
+        return
+
+    min_size = app.config.get('COMPRESSION_MIN_SIZE', 500)
+    level = app.config.get('COMPRESSION_LEVEL', 6)
+    compress_sse = app.config.get('COMPRESSION_SSE', True)
+
+    @app.after_request
+    def compress_response(response: Response):
+        if (response.status_code < 200 or response.status_code in (204, 304)
+                or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+
+        streaming = response.mimetype in STREAMING_MIMETYPES
+        if streaming and not compress_sse:
+            return response
+
+        encoding = _choose_encoding()
+        if not encoding:
+            return response
+
+        if streaming or response.is_streamed:
+            # Lower effort keeps per-event latency small
+            response.response = _compress_stream(response.response, encoding, min(level, 5))
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < min_size:
+                return response
+            response.set_data(_compress_body(data, encoding, level))
+
+        response.headers['Content-Encoding'] = encoding
+
+        # Strong ETags are per representation
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(f"{etag}-{encoding}")
+
+        return response
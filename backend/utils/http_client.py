@@ -0,0 +1,151 @@
+"""
+Shared HTTP client for outbound integrations (RapidAPI, PDF resources, ...)
+Keep-alive connection pools per host, default timeouts, bounded retries on
+idempotent requests and per-host concurrency limits
+"""
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Only idempotent methods are retried
+RETRY_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+RETRY_STATUSES = (502, 503, 504)
+
+
+class HostBusyError(requests.exceptions.RequestException):
+    """Raised when a host's concurrency limit stays saturated for too long"""
+
+
+class HttpClient:
+    """
+    Thread-safe HTTP client with one pooled requests.Session per host
+
+    Attributes:
+        timeout: (connect, read) timeout applied when a call does not pass one
+        max_concurrency_per_host: Maximum in-flight requests per host
+    """
+
+    def __init__(
+        self,
+        connect_timeout: float = 5,
+        read_timeout: float = 30,
+        max_retries: int = 2,
+        backoff_factor: float = 0.5,
+        pool_maxsize: int = 10,
+        max_concurrency_per_host: int = 8,
+        acquire_timeout: Optional[float] = 10
+    ):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.pool_maxsize = pool_maxsize
+        self.max_concurrency_per_host = max_concurrency_per_host
+        self.acquire_timeout = acquire_timeout
+        self._sessions: Dict[str, requests.Session] = {}
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> 'HttpClient':
+        """Create a client from Config (falls back to defaults outside the app)"""
+        try:
+            from config import Config
+        except ImportError:
+            return cls()
+
+        return cls(
+            connect_timeout=Config.HTTP_CONNECT_TIMEOUT,
+            read_timeout=Config.HTTP_READ_TIMEOUT,
+            max_retries=Config.HTTP_MAX_RETRIES,
+            backoff_factor=Config.HTTP_RETRY_BACKOFF,
+            pool_maxsize=Config.HTTP_POOL_MAXSIZE,
+            max_concurrency_per_host=Config.HTTP_MAX_CONCURRENCY_PER_HOST,
+            acquire_timeout=Config.HTTP_ACQUIRE_TIMEOUT
+        )
+
+    def _new_session(self) -> requests.Session:
+        retry = Retry(
+            total=self.max_retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=RETRY_METHODS,
+            raise_on_status=False,
+            respect_retry_after_header=True
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=retry
+        )
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def session_for(self, host: str) -> requests.Session:
+        """Get (or create) the pooled session for a host"""
+        return self._host_pool(host)[0]
+
+    def _host_pool(self, host: str) -> Tuple[requests.Session, threading.BoundedSemaphore]:
+        """Session and concurrency limit of a host, read together (close() may clear both)"""
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = self._new_session()
+                self._sessions[host] = session
+                self._semaphores[host] = threading.BoundedSemaphore(self.max_concurrency_per_host)
+            return session, self._semaphores[host]
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Send a request through the host's pool
+
+        Raises:
+            HostBusyError: The host's concurrency limit was not freed in time
+            requests.exceptions.RequestException: Any transport error
+        """
+        host = urlsplit(url).netloc
+        session, semaphore = self._host_pool(host)
+        kwargs.setdefault('timeout', self.timeout)
+
+        if not semaphore.acquire(timeout=self.acquire_timeout):
+            logger.warning(f"⚠️ Too many concurrent requests to {host}")
+            raise HostBusyError(f"Too many concurrent requests to {host}")
+        try:
+            return session.request(method, url, **kwargs)
+        finally:
+            semaphore.release()
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        """Close all pooled connections"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+            self._semaphores.clear()
+
+
+_default_client: Optional[HttpClient] = None
+_default_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """Get the process-wide shared HTTP client"""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = HttpClient.from_config()
+        return _default_client
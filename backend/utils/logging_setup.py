@@ -0,0 +1,200 @@
+"""
+Logging setup for khappha.online
+Records are put on an in-memory queue by the request threads and written by
+a single background listener, so log I/O never blocks a request. Output is
+one JSON object per line (or plain text for local development), tagged with
+the current trace id; DEBUG records are sampled.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from .metrics import REGISTRY
+from .tracing import current_trace
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+LOG_RECORDS_DROPPED = REGISTRY.counter('log_records_dropped_total', 'Log records dropped because the queue was full')
+LOG_RECORDS_SAMPLED_OUT = REGISTRY.counter('log_records_sampled_out_total', 'DEBUG records skipped by sampling')
+
+
+class RequestContextFilter(logging.Filter):
+    """Tag records with the trace id of the request that logged them"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, 'trace_id'):
+            trace = current_trace()
+            record.trace_id = trace.trace_id if trace is not None else None
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Let through only a fraction of DEBUG records; other levels always pass"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        if self.rate > 0 and random.random() < self.rate:
+            return True
+        LOG_RECORDS_SAMPLED_OUT.inc()
+        return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking when full"""
+
+    _exception_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Make the record safe to hand to another thread: merge the message
+        arguments and render the traceback, but keep `extra` fields and the
+        exception separate from the message (the base class formats both
+        into `msg`)
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record; `extra` fields are included as keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'trace_id': getattr(record, 'trace_id', None),
+            'thread': record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and key not in payload:
+                payload[key] = value
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload['exc'] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable format for local development"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s [%(name)s] [%(trace_id)s] %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, 'trace_id'):
+            record.trace_id = None
+        return super().format(record)
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """'agents=INFO,werkzeug=WARNING' -> {'agents': 'INFO', 'werkzeug': 'WARNING'}"""
+    levels = {}
+    for item in (spec or '').split(','):
+        name, sep, level = item.partition('=')
+        if sep and name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(
+    level: str = 'INFO',
+    fmt: str = 'json',
+    module_levels: Optional[Dict[str, str]] = None,
+    debug_sample_rate: float = 1.0,
+    queue_size: int = 10000,
+    log_file: Optional[str] = None
+):
+    """
+    Route all logging through a queue to a background writer
+
+    Calling it again replaces the previous setup.
+
+    Args:
+        level: Root level
+        fmt: 'json' or 'text'
+        module_levels: Per-logger levels, e.g. {'agents.ai_agent': 'WARNING'}
+        debug_sample_rate: Fraction of DEBUG records kept (0..1)
+        queue_size: Records buffered before new ones are dropped
+        log_file: Also write to this file
+    """
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+    formatter = JSONFormatter() if fmt == 'json' else TextFormatter()
+    handlers = [logging.StreamHandler(sys.stderr)]
+    if log_file:
+        handlers.append(logging.handlers.WatchedFileHandler(log_file, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(DebugSamplingFilter(debug_sample_rate))
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+
+    for name, module_level in (module_levels or {}).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def init_logging(config):
+    """Configure logging from Config"""
+    setup_logging(
+        level=config.LOG_LEVEL,
+        fmt=config.LOG_FORMAT,
+        module_levels=parse_levels(config.LOG_LEVELS),
+        debug_sample_rate=config.LOG_DEBUG_SAMPLE_RATE,
+        queue_size=config.LOG_QUEUE_SIZE,
+        log_file=config.LOG_FILE or None
+    )
+
+
+atexit.register(shutdown_logging)
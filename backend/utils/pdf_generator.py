@@ -5,20 +5,35 @@ Generates beautiful PDF documents from travel plan data using WeasyPrint
 import os
 import io
 import base64
+import hashlib
+import json
+import threading
+import time
 from datetime import datetime
+from pathlib import Path
 from typing import Optional, Dict, Any, List
-from weasyprint import HTML, CSS
+from jinja2 import Environment
+from weasyprint import HTML, CSS, default_url_fetcher
 from weasyprint.text.fonts import FontConfiguration
-import requests
-from flask import render_template_string
+
+from .http_client import get_http_client
 
 
 class TravelPlanPDFGenerator:
-    """Generate PDF documents for travel plans"""
+    """
+    Generate PDF documents for travel plans
+
+    Meant to be long-lived: the font configuration, the parsed stylesheet
+    and the compiled template are built once and reused for every render.
+    """
     
     def __init__(self):
-        """Initialize PDF generator with font configuration"""
+        """Initialize PDF generator with font configuration, stylesheet and template"""
         self.font_config = FontConfiguration()
+        self.stylesheet = CSS(string=PDF_STYLESHEET, font_config=self.font_config)
+        self.template = Environment(autoescape=True).from_string(PDF_TEMPLATE)
+        # FontConfiguration is shared state, so renders are serialized
+        self._render_lock = threading.Lock()
         
     def generate_pdf(
         self, 
@@ -62,13 +77,15 @@ class TravelPlanPDFGenerator:
             import json
             itinerary = json.loads(itinerary)
         
-        # Calculate total costs
-        activities_cost = 0
-        if isinstance(itinerary, list):
-            for day in itinerary:
-                activities = day.get('activities', [])
-                for activity in activities:
-                    activities_cost += activity.get('cost', 0)
+        # Calculate total costs (summed in SQL for normalized plans)
+        activities_cost = plan.get('activities_cost')
+        if activities_cost is None:
+            activities_cost = 0
+            if isinstance(itinerary, list):
+                for day in itinerary:
+                    activities = day.get('activities', [])
+                    for activity in activities:
+                        activities_cost += activity.get('cost', 0)
         
         hotel_cost = hotel.get('total_price', 0) if hotel else 0
         flights_cost = sum(f.get('price', 0) for f in (flights or []))
@@ -112,23 +129,390 @@ class TravelPlanPDFGenerator:
     
     def _render_html_template(self, data: Dict[str, Any]) -> str:
         """Render HTML template with data"""
-        
-        template = PDF_TEMPLATE
-        
-        # Render with Flask template engine
-        html = render_template_string(template, **data, format_currency=self._format_currency)
-        
-        return html
+        return self.template.render(**data, format_currency=self._format_currency)
     
     def _html_to_pdf(self, html_content: str) -> bytes:
         """Convert HTML to PDF using WeasyPrint"""
         
-        # Create PDF
-        pdf_file = HTML(string=html_content).write_pdf(
-            font_config=self.font_config
-        )
+        with self._render_lock:
+            return HTML(string=html_content, url_fetcher=self._fetch_url).write_pdf(
+                stylesheets=[self.stylesheet],
+                font_config=self.font_config
+            )
+    
+    def _fetch_url(self, url: str, timeout: int = 10, ssl_context=None) -> Dict[str, Any]:
+        """Fetch external resources (images, ...) through the shared HTTP client"""
+        if not url.startswith(('http://', 'https://')):
+            return default_url_fetcher(url, timeout=timeout, ssl_context=ssl_context)
         
-        return pdf_file
+        response = get_http_client().get(url)
+        response.raise_for_status()
+        return {
+            'string': response.content,
+            'mime_type': response.headers.get('Content-Type', '').split(';')[0] or None,
+            'redirected_url': response.url
+        }
+
+
+class PDFCache:
+    """
+    On-disk cache of rendered plan PDFs
+
+    Files are keyed by a fingerprint of everything the PDF is rendered from,
+    so a changed plan, hotel or flight simply misses and older files of the
+    same plan are replaced. The directory is bounded to max_files PDFs.
+    """
+
+    def __init__(self, cache_dir: Path, max_files: int = 200):
+        self.cache_dir = Path(cache_dir)
+        self.max_files = max_files
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    @staticmethod
+    def fingerprint(
+        version: Dict[str, Any],
+        hotel: Optional[Dict[str, Any]] = None,
+        flights: Optional[List[Dict[str, Any]]] = None
+    ) -> str:
+        """
+        Fingerprint of a plan's PDF inputs
+
+        Args:
+            version: Plan version columns (db.get_plan_version)
+            hotel: Hotel row of the plan
+            flights: Flight rows of the plan
+
+        Returns:
+            Hex digest that changes whenever the rendered PDF would change
+        """
+        payload = json.dumps(
+            {'plan': version, 'hotel': hotel, 'flights': flights or []},
+            sort_keys=True, default=str
+        )
+        digest = hashlib.sha256(payload.encode('utf-8'))
+        digest.update(_TEMPLATE_DIGEST)
+        return digest.hexdigest()
+
+    def _path(self, plan_id: int, fingerprint: str) -> Path:
+        return self.cache_dir / f"plan_{plan_id}_{fingerprint[:16]}.pdf"
+
+    def get(self, plan_id: int, fingerprint: str) -> Optional[Path]:
+        """Path of the cached PDF, or None if it must be rendered"""
+        path = self._path(plan_id, fingerprint)
+        hit = path.is_file()
+        with self._lock:
+            self.stats['hits' if hit else 'misses'] += 1
+        return path if hit else None
+
+    def put(self, plan_id: int, fingerprint: str, pdf_bytes: bytes,
+            requested_at: Optional[float] = None) -> Path:
+        """
+        Store a rendered PDF and drop older renders of the same plan
+
+        Args:
+            requested_at: When the render was requested (default: now). It
+                becomes the file's mtime, so a slow render of an older plan
+                version that finishes last never deletes a newer one.
+        """
+        path = self._path(plan_id, fingerprint)
+        requested_at = requested_at or time.time()
+        with self._lock:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f'.{threading.get_ident()}.tmp')
+            tmp_path.write_bytes(pdf_bytes)
+            os.utime(tmp_path, (requested_at, requested_at))
+            os.replace(tmp_path, path)
+
+            for old in self.cache_dir.glob(f"plan_{plan_id}_*.pdf"):
+                try:
+                    if old != path and old.stat().st_mtime < requested_at:
+                        old.unlink()
+                except FileNotFoundError:
+                    pass
+            self._evict()
+        return path
+
+    def invalidate(self, plan_id: int):
+        """Remove every cached PDF of a plan"""
+        with self._lock:
+            for old in self.cache_dir.glob(f"plan_{plan_id}_*.pdf"):
+                old.unlink(missing_ok=True)
+
+    def _evict(self):
+        """Drop the least recently requested renders beyond max_files"""
+        files = sorted(self.cache_dir.glob("plan_*.pdf"), key=lambda f: f.stat().st_mtime)
+        for old in files[:max(0, len(files) - self.max_files)]:
+            old.unlink(missing_ok=True)
+
+
+# PDF stylesheet, parsed once by WeasyPrint and reused for every render
+PDF_STYLESHEET = """
+@page {
+    size: A4;
+    margin: 2cm 1.5cm;
+    @top-right {
+        content: "Trang " counter(page) " / " counter(pages);
+        font-size: 10px;
+        color: #666;
+    }
+}
+
+* {
+    margin: 0;
+    padding: 0;
+    box-sizing: border-box;
+}
+
+body {
+    font-family: 'DejaVu Sans', 'Arial', sans-serif;
+    font-size: 11pt;
+    line-height: 1.6;
+    color: #333;
+}
+
+h1 {
+    color: #13a4ec;
+    font-size: 24pt;
+    margin-bottom: 0.5cm;
+    border-bottom: 3px solid #13a4ec;
+    padding-bottom: 0.3cm;
+}
+
+h2 {
+    color: #13a4ec;
+    font-size: 18pt;
+    margin-top: 0.8cm;
+    margin-bottom: 0.4cm;
+    page-break-after: avoid;
+}
+
+h3 {
+    color: #111618;
+    font-size: 14pt;
+    margin-top: 0.5cm;
+    margin-bottom: 0.3cm;
+    page-break-after: avoid;
+}
+
+.header {
+    text-align: center;
+    margin-bottom: 1cm;
+}
+
+.subtitle {
+    color: #666;
+    font-size: 12pt;
+    margin-top: 0.3cm;
+}
+
+.info-grid {
+    display: table;
+    width: 100%;
+    margin: 0.5cm 0;
+    padding: 0.5cm;
+    background: #f9fafb;
+    border-radius: 8px;
+    page-break-inside: avoid;
+}
+
+.info-row {
+    display: table-row;
+}
+
+.info-item {
+    display: table-cell;
+    width: 50%;
+    padding: 0.3cm;
+    vertical-align: top;
+}
+
+.info-label {
+    font-weight: bold;
+    color: #13a4ec;
+    font-size: 10pt;
+}
+
+.info-value {
+    margin-top: 0.1cm;
+    color: #111618;
+}
+
+.day-section {
+    margin: 0.7cm 0;
+    page-break-inside: avoid;
+    border-left: 4px solid #13a4ec;
+    padding-left: 0.5cm;
+}
+
+.day-header {
+    background: #e8f4fc;
+    padding: 0.4cm;
+    border-radius: 6px;
+    margin-bottom: 0.4cm;
+}
+
+.day-title {
+    font-size: 14pt;
+    font-weight: bold;
+    color: #13a4ec;
+}
+
+.activity {
+    margin: 0.4cm 0 0.4cm 0.5cm;
+    padding: 0.3cm;
+    border-left: 2px solid #ddd;
+    padding-left: 0.4cm;
+    page-break-inside: avoid;
+}
+
+.activity-time {
+    color: #13a4ec;
+    font-weight: bold;
+    font-size: 10pt;
+}
+
+.activity-title {
+    font-weight: bold;
+    margin-top: 0.1cm;
+    font-size: 12pt;
+}
+
+.activity-description {
+    color: #666;
+    margin-top: 0.2cm;
+    font-size: 10pt;
+}
+
+.activity-location {
+    color: #888;
+    font-size: 9pt;
+    margin-top: 0.1cm;
+}
+
+.activity-location:before {
+    content: "📍 ";
+}
+
+.activity-cost {
+    color: #13a4ec;
+    font-weight: bold;
+    margin-top: 0.1cm;
+}
+
+.notes-box {
+    background: #fff9e6;
+    border: 2px solid #ffd966;
+    border-radius: 6px;
+    padding: 0.4cm;
+    margin: 0.5cm 0;
+    page-break-inside: avoid;
+}
+
+.notes-title {
+    color: #d97706;
+    font-weight: bold;
+    margin-bottom: 0.2cm;
+}
+
+.notes-title:before {
+    content: "💡 ";
+}
+
+.hotel-card, .flight-card {
+    background: #f9fafb;
+    border: 1px solid #ddd;
+    border-radius: 8px;
+    padding: 0.5cm;
+    margin: 0.5cm 0;
+    page-break-inside: avoid;
+}
+
+.hotel-name, .flight-carrier {
+    font-size: 14pt;
+    font-weight: bold;
+    color: #111618;
+}
+
+.hotel-rating {
+    color: #fbbf24;
+    margin-top: 0.1cm;
+}
+
+.hotel-details, .flight-details {
+    margin-top: 0.3cm;
+    color: #666;
+    font-size: 10pt;
+}
+
+.price-box {
+    background: #13a4ec;
+    color: white;
+    padding: 0.3cm;
+    border-radius: 6px;
+    text-align: right;
+    margin-top: 0.3cm;
+}
+
+.price-label {
+    font-size: 9pt;
+    opacity: 0.9;
+}
+
+.price-value {
+    font-size: 16pt;
+    font-weight: bold;
+    margin-top: 0.1cm;
+}
+
+.cost-summary {
+    margin: 0.5cm 0;
+    page-break-inside: avoid;
+}
+
+.cost-row {
+    display: flex;
+    justify-content: space-between;
+    padding: 0.3cm;
+    border-bottom: 1px solid #ddd;
+}
+
+.cost-total {
+    background: #e8f4fc;
+    font-weight: bold;
+    font-size: 14pt;
+    color: #13a4ec;
+    padding: 0.4cm;
+    border-radius: 6px;
+    margin-top: 0.3cm;
+}
+
+.footer {
+    margin-top: 1cm;
+    padding-top: 0.5cm;
+    border-top: 1px solid #ddd;
+    text-align: center;
+    color: #888;
+    font-size: 9pt;
+}
+
+ul {
+    margin-left: 0.5cm;
+    margin-top: 0.2cm;
+}
+
+li {
+    margin: 0.1cm 0;
+}
+
+.page-break-before {
+    page-break-before: always;
+}
+
+.avoid-break {
+    page-break-inside: avoid;
+}
+"""
 
 
 # PDF HTML Template with beautiful styling
@@ -138,272 +522,6 @@ PDF_TEMPLATE = """
 <head>
     <meta charset="UTF-8">
     <title>{{ plan.plan_name or plan.destination }}</title>
-    <style>
-        @page {
-            size: A4;
-            margin: 2cm 1.5cm;
-            @top-right {
-                content: "Trang " counter(page) " / " counter(pages);
-                font-size: 10px;
-                color: #666;
-            }
-        }
-        
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-        
-        body {
-            font-family: 'DejaVu Sans', 'Arial', sans-serif;
-            font-size: 11pt;
-            line-height: 1.6;
-            color: #333;
-        }
-        
-        h1 {
-            color: #13a4ec;
-            font-size: 24pt;
-            margin-bottom: 0.5cm;
-            border-bottom: 3px solid #13a4ec;
-            padding-bottom: 0.3cm;
-        }
-        
-        h2 {
-            color: #13a4ec;
-            font-size: 18pt;
-            margin-top: 0.8cm;
-            margin-bottom: 0.4cm;
-            page-break-after: avoid;
-        }
-        
-        h3 {
-            color: #111618;
-            font-size: 14pt;
-            margin-top: 0.5cm;
-            margin-bottom: 0.3cm;
-            page-break-after: avoid;
-        }
-        
-        .header {
-            text-align: center;
-            margin-bottom: 1cm;
-        }
-        
-        .subtitle {
-            color: #666;
-            font-size: 12pt;
-            margin-top: 0.3cm;
-        }
-        
-        .info-grid {
-            display: table;
-            width: 100%;
-            margin: 0.5cm 0;
-            padding: 0.5cm;
-            background: #f9fafb;
-            border-radius: 8px;
-            page-break-inside: avoid;
-        }
-        
-        .info-row {
-            display: table-row;
-        }
-        
-        .info-item {
-            display: table-cell;
-            width: 50%;
-            padding: 0.3cm;
-            vertical-align: top;
-        }
-        
-        .info-label {
-            font-weight: bold;
-            color: #13a4ec;
-            font-size: 10pt;
-        }
-        
-        .info-value {
-            margin-top: 0.1cm;
-            color: #111618;
-        }
-        
-        .day-section {
-            margin: 0.7cm 0;
-            page-break-inside: avoid;
-            border-left: 4px solid #13a4ec;
-            padding-left: 0.5cm;
-        }
-        
-        .day-header {
-            background: #e8f4fc;
-            padding: 0.4cm;
-            border-radius: 6px;
-            margin-bottom: 0.4cm;
-        }
-        
-        .day-title {
-            font-size: 14pt;
-            font-weight: bold;
-            color: #13a4ec;
-        }
-        
-        .activity {
-            margin: 0.4cm 0 0.4cm 0.5cm;
-            padding: 0.3cm;
-            border-left: 2px solid #ddd;
-            padding-left: 0.4cm;
-            page-break-inside: avoid;
-        }
-        
-        .activity-time {
-            color: #13a4ec;
-            font-weight: bold;
-            font-size: 10pt;
-        }
-        
-        .activity-title {
-            font-weight: bold;
-            margin-top: 0.1cm;
-            font-size: 12pt;
-        }
-        
-        .activity-description {
-            color: #666;
-            margin-top: 0.2cm;
-            font-size: 10pt;
-        }
-        
-        .activity-location {
-            color: #888;
-            font-size: 9pt;
-            margin-top: 0.1cm;
-        }
-        
-        .activity-location:before {
-            content: "📍 ";
-        }
-        
-        .activity-cost {
-            color: #13a4ec;
-            font-weight: bold;
-            margin-top: 0.1cm;
-        }
-        
-        .notes-box {
-            background: #fff9e6;
-            border: 2px solid #ffd966;
-            border-radius: 6px;
-            padding: 0.4cm;
-            margin: 0.5cm 0;
-            page-break-inside: avoid;
-        }
-        
-        .notes-title {
-            color: #d97706;
-            font-weight: bold;
-            margin-bottom: 0.2cm;
-        }
-        
-        .notes-title:before {
-            content: "💡 ";
-        }
-        
-        .hotel-card, .flight-card {
-            background: #f9fafb;
-            border: 1px solid #ddd;
-            border-radius: 8px;
-            padding: 0.5cm;
-            margin: 0.5cm 0;
-            page-break-inside: avoid;
-        }
-        
-        .hotel-name, .flight-carrier {
-            font-size: 14pt;
-            font-weight: bold;
-            color: #111618;
-        }
-        
-        .hotel-rating {
-            color: #fbbf24;
-            margin-top: 0.1cm;
-        }
-        
-        .hotel-details, .flight-details {
-            margin-top: 0.3cm;
-            color: #666;
-            font-size: 10pt;
-        }
-        
-        .price-box {
-            background: #13a4ec;
-            color: white;
-            padding: 0.3cm;
-            border-radius: 6px;
-            text-align: right;
-            margin-top: 0.3cm;
-        }
-        
-        .price-label {
-            font-size: 9pt;
-            opacity: 0.9;
-        }
-        
-        .price-value {
-            font-size: 16pt;
-            font-weight: bold;
-            margin-top: 0.1cm;
-        }
-        
-        .cost-summary {
-            margin: 0.5cm 0;
-            page-break-inside: avoid;
-        }
-        
-        .cost-row {
-            display: flex;
-            justify-content: space-between;
-            padding: 0.3cm;
-            border-bottom: 1px solid #ddd;
-        }
-        
-        .cost-total {
-            background: #e8f4fc;
-            font-weight: bold;
-            font-size: 14pt;
-            color: #13a4ec;
-            padding: 0.4cm;
-            border-radius: 6px;
-            margin-top: 0.3cm;
-        }
-        
-        .footer {
-            margin-top: 1cm;
-            padding-top: 0.5cm;
-            border-top: 1px solid #ddd;
-            text-align: center;
-            color: #888;
-            font-size: 9pt;
-        }
-        
-        ul {
-            margin-left: 0.5cm;
-            margin-top: 0.2cm;
-        }
-        
-        li {
-            margin: 0.1cm 0;
-        }
-        
-        .page-break-before {
-            page-break-before: always;
-        }
-        
-        .avoid-break {
-            page-break-inside: avoid;
-        }
-    </style>
 </head>
 <body>
     <!-- Cover Page -->
@@ -596,3 +714,6 @@ PDF_TEMPLATE = """
 </body>
 </html>
 """
+
+# Template changes must invalidate cached PDFs too
+_TEMPLATE_DIGEST = hashlib.sha256((PDF_STYLESHEET + PDF_TEMPLATE).encode('utf-8')).digest()
@@ -0,0 +1,302 @@
+"""
+On-demand profiling for live workers (admin only)
+Three tools, all behind the PROFILING_TOKEN shared secret:
+- per-request cProfile: send `X-Profile: 1` with a non-streaming request;
+  the pstats file name comes back in `X-Profile-File`
+- a time-boxed sampling profiler over all threads, returning collapsed
+  stacks (flamegraph.pl / speedscope input)
+- tracemalloc snapshots, each diffed against the previous one
+
+Without a token nothing is registered: no request hooks, no routes, and
+tracemalloc is only started by the first memory snapshot.
+"""
+import cProfile
+import hmac
+import io
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from flask import Flask, Response, g, jsonify, request, send_from_directory
+
+logger = logging.getLogger(__name__)
+
+TOKEN_HEADER = 'X-Profiling-Token'
+STREAMING_MIMETYPES = {'text/event-stream'}
+
+_FILE_NAME = re.compile(r'^[A-Za-z0-9_.-]+\.(prof|folded)$')
+
+
+# ===== SAMPLING =====
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+
+
+def sample_stacks(seconds: float, interval: float = 0.01) -> Dict[str, int]:
+    """
+    Sample the stacks of every other thread for `seconds`
+
+    Returns:
+        Collapsed stacks ("thread;outer;...;inner") and their sample counts
+    """
+    own = threading.get_ident()
+    counts: Counter = Counter()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, f'thread-{ident}').replace(';', ':').replace(' ', '_'))
+            counts[';'.join(reversed(stack))] += 1
+        time.sleep(interval)
+    return dict(counts)
+
+
+def collapsed(counts: Dict[str, int]) -> str:
+    """Brendan Gregg's folded format, heaviest stacks first"""
+    return ''.join(f"{stack} {count}\n" for stack, count in sorted(counts.items(), key=lambda item: -item[1]))
+
+
+# ===== MEMORY =====
+
+class MemoryTracker:
+    """tracemalloc snapshots, each compared with the one before"""
+
+    def __init__(self, frames: int = 10):
+        self.frames = frames
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._taken: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        ))
+
+    def snapshot(self, group_by: str = 'lineno', limit: int = 25) -> Dict:
+        """
+        Take a snapshot and diff it against the previous one
+
+        The first call starts tracing and only records the baseline.
+        """
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+                logger.warning(f"🧠 tracemalloc started ({self.frames} frame(s) per allocation)")
+            current = self._snapshot()
+            previous, since = self._previous, self._taken
+            self._previous, self._taken = current, datetime.now()
+
+        size, peak = tracemalloc.get_traced_memory()
+        result = {
+            'traced_bytes': size,
+            'peak_bytes': peak,
+            'overhead_bytes': tracemalloc.get_tracemalloc_memory(),
+            'since': since.isoformat() if since else None,
+            'diff': []
+        }
+        if previous is None:
+            result['status'] = 'baseline'
+            return result
+
+        result['status'] = 'diff'
+        for stat in current.compare_to(previous, group_by)[:limit]:
+            result['diff'].append({
+                'size_diff': stat.size_diff,
+                'size': stat.size,
+                'count_diff': stat.count_diff,
+                'count': stat.count,
+                'traceback': [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+            })
+        return result
+
+    def stop(self) -> bool:
+        """Stop tracing and drop the stored snapshot; False if it was not running"""
+        with self._lock:
+            self._previous = self._taken = None
+            if not tracemalloc.is_tracing():
+                return False
+            tracemalloc.stop()
+        logger.warning("🧠 tracemalloc stopped")
+        return True
+
+
+# ===== FLASK =====
+
+def init_profiling(app: Flask):
+    """
+    Register the profiling hooks and /admin/profiling routes
+
+    Settings (from app.config):
+        PROFILING_TOKEN: Shared secret (X-Profiling-Token); empty = disabled
+        PROFILING_DIR: Where .prof and .folded files are written
+        PROFILING_MAX_SECONDS: Upper bound for one sampling run
+        PROFILING_TRACEMALLOC_FRAMES: Frames stored per traced allocation
+    """
+    token = app.config.get('PROFILING_TOKEN') or ''
+    if not token:
+        return
+
+    output_dir = Path(app.config.get('PROFILING_DIR', 'data/profiles'))
+    max_seconds = float(app.config.get('PROFILING_MAX_SECONDS', 60))
+    memory = MemoryTracker(frames=int(app.config.get('PROFILING_TRACEMALLOC_FRAMES', 10)))
+    # One cProfile at a time keeps the overhead bounded (and is required on 3.12+)
+    request_profiler = threading.Lock()
+    sampler = threading.Lock()
+
+    def authorized() -> bool:
+        return hmac.compare_digest(request.headers.get(TOKEN_HEADER, '').encode(), token.encode())
+
+    def forbidden():
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+
+    def save(name: str) -> Path:
+        output_dir.mkdir(parents=True, exist_ok=True)
+        return output_dir / name
+
+    def file_name(kind: str, extension: str) -> str:
+        trace = getattr(g, 'trace', None)
+        suffix = trace.trace_id if trace is not None else uuid.uuid4().hex[:16]
+        return f"{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{suffix}.{extension}"
+
+    # ----- per-request cProfile -----
+
+    @app.before_request
+    def start_request_profile():
+        if not request.headers.get('X-Profile') or not authorized():
+            return
+        if not request_profiler.acquire(blocking=False):
+            g.profile_busy = True
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        g.profiler = profiler
+
+    @app.after_request
+    def finish_request_profile(response: Response):
+        if g.pop('profile_busy', False):
+            response.headers['X-Profile'] = 'busy'
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+        profiler.disable()
+        request_profiler.release()
+
+        if response.mimetype in STREAMING_MIMETYPES:
+            # The body is generated after this hook: the profile would be empty
+            response.headers['X-Profile'] = 'skipped (streaming)'
+            return response
+
+        name = file_name('request', 'prof')
+        stats = pstats.Stats(profiler)
+        stats.dump_stats(str(save(name)))
+        response.headers['X-Profile'] = 'saved'
+        response.headers['X-Profile-File'] = name
+        summary = io.StringIO()
+        stats.stream = summary
+        stats.sort_stats('cumulative').print_stats(15)
+        logger.info(f"🔬 Profiled {request.method} {request.path}: {stats.total_calls} call(s), "
+                    f"{stats.total_tt:.3f}s -> {name}", extra={'profile': summary.getvalue()})
+        return response
+
+    @app.teardown_request
+    def abandon_request_profile(error=None):
+        # after_request is skipped when the response could not be built
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            request_profiler.release()
+
+    # ----- routes -----
+
+    @app.route('/admin/profiling/sample', methods=['POST'])
+    def profiling_sample():
+        """Sample all threads for ?seconds= (default 10) and return collapsed stacks"""
+        if not authorized():
+            return forbidden()
+        try:
+            seconds = min(float(request.args.get('seconds', 10)), max_seconds)
+            interval = max(float(request.args.get('interval_ms', 10)), 1.0) / 1000
+        except ValueError:
+            return jsonify({'success': False, 'error': 'seconds and interval_ms must be numbers'}), 400
+        if seconds <= 0:
+            return jsonify({'success': False, 'error': 'seconds must be positive'}), 400
+        if not sampler.acquire(blocking=False):
+            return jsonify({'success': False, 'error': 'A sampling run is already in progress'}), 409
+        try:
+            logger.warning(f"🔬 Sampling all threads for {seconds:g}s every {interval * 1000:g}ms")
+            counts = sample_stacks(seconds, interval)
+        finally:
+            sampler.release()
+
+        name = file_name('sample', 'folded')
+        text = collapsed(counts)
+        save(name).write_text(text, encoding='utf-8')
+        logger.info(f"🔬 {sum(counts.values())} stack sample(s), {len(counts)} unique -> {name}")
+        return Response(text, mimetype='text/plain', headers={
+            'X-Profile-File': name,
+            'Content-Disposition': f'attachment; filename="{name}"'
+        })
+
+    @app.route('/admin/profiling/memory', methods=['POST'])
+    def profiling_memory_snapshot():
+        """Snapshot allocations and diff against the previous snapshot"""
+        if not authorized():
+            return forbidden()
+        group_by = request.args.get('group_by', 'lineno')
+        if group_by not in ('lineno', 'filename', 'traceback'):
+            return jsonify({'success': False, 'error': 'group_by must be lineno, filename or traceback'}), 400
+        try:
+            limit = int(request.args.get('limit', 25))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'limit must be an integer'}), 400
+        return jsonify({'success': True, **memory.snapshot(group_by, limit)})
+
+    @app.route('/admin/profiling/memory', methods=['DELETE'])
+    def profiling_memory_stop():
+        """Stop tracemalloc (it slows every allocation while running)"""
+        if not authorized():
+            return forbidden()
+        return jsonify({'success': True, 'stopped': memory.stop()})
+
+    @app.route('/admin/profiling/files', methods=['GET'])
+    def profiling_files():
+        if not authorized():
+            return forbidden()
+        files: List[Dict] = []
+        if output_dir.exists():
+            for path in sorted(output_dir.iterdir(), key=lambda p: p.stat().st_mtime, reverse=True):
+                if _FILE_NAME.match(path.name):
+                    files.append({'name': path.name, 'bytes': path.stat().st_size,
+                                  'modified': datetime.fromtimestamp(path.stat().st_mtime).isoformat()})
+        return jsonify({'success': True, 'files': files})
+
+    @app.route('/admin/profiling/files/<name>', methods=['GET'])
+    def profiling_file(name: str):
+        if not authorized():
+            return forbidden()
+        if not _FILE_NAME.match(name):
+            return jsonify({'success': False, 'error': 'Invalid file name'}), 400
+        return send_from_directory(output_dir.resolve(), name, as_attachment=True)
+
+    logger.warning(f"🔬 Profiling endpoints enabled under /admin/profiling (files in {output_dir})")
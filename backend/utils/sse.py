@@ -0,0 +1,18 @@
+"""
+Server-Sent Events framing
+Every event of the chat stream is built here, so the wire format lives in
+one place and can be benchmarked on its own.
+"""
+import json
+from typing import Any
+
+
+def sse_event(event: str, data: Any) -> str:
+    """
+    Frame one event; `data` is sent as a single line of JSON
+
+    Args:
+        event: Event name (thinking, message, plan, done, error)
+        data: JSON-serializable payload
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
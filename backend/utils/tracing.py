@@ -0,0 +1,236 @@
+"""
+Lightweight request tracing for khappha.online
+One trace per request (held in a context variable) collects timed spans from
+the agent, web search, Gemini and database layers. Finished traces are logged
+as one structured JSON line, returned as a Server-Timing header on regular
+responses, and summarized in the SSE `done` event of streamed chats.
+"""
+import contextvars
+import functools
+import inspect
+import logging
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from flask import Flask, Response, g, request
+
+logger = logging.getLogger('tracing')
+
+# Spans kept per trace; later spans are only counted
+MAX_SPANS = 500
+STREAMING_MIMETYPES = {'text/event-stream'}
+
+_TOKEN_UNSAFE = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+class Trace:
+    """Spans recorded while handling one request"""
+
+    def __init__(self, name: str, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.name = name
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.spans: List[Dict[str, Any]] = []
+        self.dropped = 0
+
+    def add(self, name: str, started: float, duration: float, attrs: Dict[str, Any]):
+        if len(self.spans) >= MAX_SPANS:
+            self.dropped += 1
+            return
+        span = {'name': name, 'start_ms': round((started - self.started) * 1000, 1),
+                'ms': round(duration * 1000, 1)}
+        if attrs:
+            span['attrs'] = attrs
+        self.spans.append(span)
+
+    def finish(self) -> float:
+        """Stop the clock (idempotent) and return the total in seconds"""
+        if self.duration is None:
+            self.duration = time.perf_counter() - self.started
+        return self.duration
+
+    def totals(self) -> Dict[str, Dict[str, float]]:
+        """Count and summed milliseconds per span name, in first-seen order"""
+        totals: Dict[str, Dict[str, float]] = {}
+        for span in self.spans:
+            entry = totals.setdefault(span['name'], {'count': 0, 'ms': 0.0})
+            entry['count'] += 1
+            entry['ms'] = round(entry['ms'] + span['ms'], 1)
+        return totals
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: one metric per span name plus the total"""
+        metrics = [
+            f'{_TOKEN_UNSAFE.sub("_", name)};dur={entry["ms"]};desc="{entry["count"]}x"'
+            for name, entry in self.totals().items()
+        ]
+        metrics.append(f'total;dur={round(self.finish() * 1000, 1)}')
+        return ', '.join(metrics)
+
+    def breakdown(self) -> Dict[str, Any]:
+        """Timing summary for API payloads (the SSE done event)"""
+        return {
+            'trace_id': self.trace_id,
+            'total_ms': round(self.finish() * 1000, 1),
+            'totals': self.totals(),
+            'spans': [span for span in self.spans if not span['name'].startswith('db.')]
+        }
+
+    def emit(self, **fields):
+        """Log the finished trace; the spans travel as the structured `trace` field"""
+        record = {
+            'name': self.name,
+            'duration_ms': round(self.finish() * 1000, 1),
+            **fields,
+            'spans': self.spans
+        }
+        if self.dropped:
+            record['dropped_spans'] = self.dropped
+        logger.info(f"🧭 {self.name} {record['duration_ms']}ms, {len(self.spans)} span(s)",
+                    extra={'trace_id': self.trace_id, 'trace': record})
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar('trace', default=None)
+
+
+def start_trace(name: str, trace_id: Optional[str] = None) -> Trace:
+    """Start a trace and make it current in this context"""
+    trace = Trace(name, trace_id)
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def use_trace(trace: Optional[Trace]) -> Iterator[Optional[Trace]]:
+    """Make an existing trace current inside the block (e.g. in an SSE generator)"""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+# ===== SPANS =====
+
+def record(name: str, started: float, **attrs):
+    """Add a span that began at `started` (time.perf_counter()) and ends now"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, started, time.perf_counter() - started, attrs)
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[None]:
+    """Time the block as a span of the current trace (no-op without one)"""
+    if _current_trace.get() is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        attrs['error'] = type(e).__name__
+        raise
+    finally:
+        record(name, started, **attrs)
+
+
+def traced(name: str, observe: Optional[Callable[[float], None]] = None):
+    """
+    Decorator: time every call of the function as a span
+
+    Args:
+        name: Span name
+        observe: Also called with the duration in seconds, traced or not
+            (e.g. a histogram observer)
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if observe is None and _current_trace.get() is None:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                if observe is not None:
+                    observe(time.perf_counter() - started)
+                record(name, started)
+        return wrapper
+    return decorator
+
+
+def trace_methods(prefix: str, exclude: tuple = (), histogram=None):
+    """
+    Class decorator: trace every public method as `<prefix>.<method>`
+
+    Args:
+        prefix: Span name prefix (e.g. 'db')
+        exclude: Method names left untouched (context managers, helpers)
+        histogram: Optional histogram with an `operation` label, observed
+            with every call's duration
+    """
+    def decorator(cls):
+        for attr, value in list(vars(cls).items()):
+            if attr.startswith('_') or attr in exclude or not inspect.isfunction(value):
+                continue
+            observe = None
+            if histogram is not None:
+                observe = functools.partial(_observe_operation, histogram, attr)
+            setattr(cls, attr, traced(f'{prefix}.{attr}', observe)(value))
+        return cls
+    return decorator
+
+
+def _observe_operation(histogram, operation: str, seconds: float):
+    histogram.observe(seconds, operation=operation)
+
+
+# ===== FLASK INTEGRATION =====
+
+def init_tracing(app: Flask):
+    """
+    Start a trace per request and report it when the response is built
+
+    Settings (from app.config):
+        TRACING_ENABLED: Master switch
+
+    Event streams are reported by the streaming view itself once the
+    stream ends (headers are long gone by then); every other response
+    gets a Server-Timing header. All traced responses get X-Trace-Id.
+    """
+    if not app.config.get('TRACING_ENABLED', True):
+        return
+
+    @app.before_request
+    def begin_trace():
+        if request.endpoint == 'static':
+            _current_trace.set(None)
+            return
+        # Honour an upstream request id (proxy/load balancer) when it is sane
+        trace_id = _TOKEN_UNSAFE.sub('', request.headers.get('X-Request-ID', ''))[:64]
+        g.trace = start_trace(f"{request.method} {request.path}", trace_id=trace_id or None)
+
+    @app.after_request
+    def report_trace(response: Response):
+        trace = g.pop('trace', None)
+        if trace is None:
+            return response
+
+        response.headers['X-Trace-Id'] = trace.trace_id
+        if response.mimetype in STREAMING_MIMETYPES:
+            return response
+
+        response.headers['Server-Timing'] = trace.server_timing()
+        trace.emit(status=response.status_code)
+        _current_trace.set(None)
+        return response
+
@@ -0,0 +1,206 @@
+"""
+Synthetic data for the benchmark suite
+Users, conversations and plans with realistic itinerary JSON, bulk-loaded
+straight into a SQLite database, plus model outputs and Agoda payloads of
+production size. Everything is derived from a seed, so two runs with the
+same arguments see the same data.
+"""
+import gzip
+import json
+import random
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from database.db_manager import DatabaseManager  # noqa: E402
+
+DESTINATIONS = ['Đà Lạt', 'Đà Nẵng', 'Hội An', 'Nha Trang', 'Phú Quốc', 'Hà Nội', 'Sapa', 'Hạ Long',
+                'Huế', 'Vũng Tàu', 'Hồ Chí Minh', 'Quy Nhơn', 'Ninh Bình', 'Cần Thơ']
+ACTIVITY_SLOTS = [
+    ('07:00', 'breakfast', 'Ăn sáng'), ('08:30', 'sightseeing', 'Tham quan'),
+    ('11:30', 'lunch', 'Ăn trưa'), ('14:00', 'activity', 'Trải nghiệm'),
+    ('16:30', 'sightseeing', 'Dạo phố'), ('19:00', 'dinner', 'Ăn tối'), ('21:00', 'activity', 'Chợ đêm')
+]
+USER_MESSAGES = [
+    'Tôi muốn đi {dest} {days} ngày ngân sách {budget} triệu',
+    '{dest} có gì hay?',
+    'Thay bữa sáng ngày 1 bằng quán khác',
+    'Giá vé máy bay đi {dest} khoảng bao nhiêu?',
+    'Cảm ơn bạn nhé'
+]
+BOT_PARAGRAPH = ('Dựa trên kinh nghiệm của nhiều du khách, bạn nên đi vào mùa khô, đặt phòng sớm, '
+                 'thử các món đặc sản và thuê xe máy để di chuyển linh hoạt. ')
+
+
+# ===== PLANS =====
+
+def itinerary(rng: random.Random, destination: str, days: int, start: datetime) -> List[Dict[str, Any]]:
+    """Day-by-day itinerary shaped like the agent's output"""
+    result = []
+    for day in range(1, days + 1):
+        result.append({
+            'day': day,
+            'date': (start + timedelta(days=day - 1)).strftime('%Y-%m-%d'),
+            'title': f'Ngày {day}: Khám phá {destination}',
+            'description': f'Một ngày trọn vẹn tại {destination}',
+            'activities': [
+                {
+                    'time': time_of_day,
+                    'type': kind,
+                    'title': f'{title} tại {destination} #{rng.randint(1, 500)}',
+                    'description': f'{title} ở địa điểm nổi tiếng, giá cả hợp lý, nên đến sớm. ' * rng.randint(1, 3),
+                    'location': f'{rng.randint(1, 300)} Đường số {rng.randint(1, 40)}, {destination}',
+                    'cost': rng.randrange(30000, 500000, 10000)
+                }
+                for time_of_day, kind, title in ACTIVITY_SLOTS[:rng.randint(5, 7)]
+            ],
+            'notes': ['Mang theo nước uống', 'Tránh giờ cao điểm buổi chiều']
+        })
+    return result
+
+
+def plan(rng: random.Random, days: Optional[int] = None) -> Dict[str, Any]:
+    """One plan as returned by the agent"""
+    destination = rng.choice(DESTINATIONS)
+    days = days or rng.randint(2, 7)
+    start = datetime(2025, 1, 1) + timedelta(days=rng.randint(0, 700))
+    budget = rng.randrange(2, 30) * 1000000
+    return {
+        'plan_name': f'Khám phá {destination} {days} ngày',
+        'destination': destination,
+        'duration_days': days,
+        'budget': budget,
+        'preferences': rng.sample(['ẩm thực', 'thiên nhiên', 'văn hóa', 'biển', 'mua sắm'], 2),
+        'start_date': start.strftime('%Y-%m-%d'),
+        'end_date': (start + timedelta(days=days - 1)).strftime('%Y-%m-%d'),
+        'itinerary': itinerary(rng, destination, days, start),
+        'total_cost': int(budget * rng.uniform(0.7, 1.0)),
+        'search_sources': [{'title': f'Kinh nghiệm du lịch {destination}', 'url': f'https://example.com/{i}'}
+                           for i in range(3)]
+    }
+
+
+def gemini_plan_output(rng: random.Random, days: int = 14) -> str:
+    """A large model answer: fenced JSON plan with chatter around it"""
+    body = json.dumps(plan(rng, days), ensure_ascii=False, indent=2)
+    return f"Đây là kế hoạch của bạn:\n```json\n{body}\n```\nChúc bạn có chuyến đi vui vẻ!"
+
+
+# ===== DATABASE =====
+
+def prepare_database(path: Path) -> DatabaseManager:
+    """Fresh database with the schema and the columns added by migrations"""
+    db = DatabaseManager(Path(path))
+    with db.get_connection() as conn:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(travel_plans)")}
+        if 'search_sources' not in columns:
+            conn.execute("ALTER TABLE travel_plans ADD COLUMN search_sources TEXT")
+    return db
+
+
+def populate(db: DatabaseManager, users: int, conversations: int, plans: int,
+             seed: int = 42, batch: int = 10000) -> Dict[str, Any]:
+    """
+    Bulk-load synthetic rows (bypassing DatabaseManager for speed)
+
+    Returns:
+        What was generated, for the results file and for picking keys
+    """
+    rng = random.Random(seed)
+    sessions = [f'bench-session-{i:07d}' for i in range(users)]
+    epoch = datetime(2025, 1, 1)
+
+    conn = sqlite3.connect(str(db.db_path))
+    try:
+        conn.executemany(
+            "INSERT INTO users (session_id, email, username, password_hash, is_authenticated) VALUES (?, ?, ?, ?, 1)",
+            ((session, f'user{i}@example.com', f'user{i}', 'x') for i, session in enumerate(sessions))
+        )
+        user_ids = [row[0] for row in conn.execute("SELECT id FROM users ORDER BY id")]
+
+        def plan_rows(count):
+            for i in range(count):
+                owner = rng.randrange(users)
+                data = plan(rng)
+                yield (sessions[owner], user_ids[owner], data['plan_name'], data['destination'],
+                       data['duration_days'], data['budget'], json.dumps(data['preferences']),
+                       data['start_date'], data['end_date'], json.dumps(data['itinerary']),
+                       data['total_cost'], json.dumps(data['search_sources']),
+                       rng.choice(['draft', 'active', 'completed']),
+                       (epoch + timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S'))
+
+        _insert_batches(conn, """INSERT INTO travel_plans
+            (session_id, user_id, plan_name, destination, duration_days, budget, preferences, start_date,
+             end_date, itinerary, total_cost, search_sources, status, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", plan_rows(plans), batch)
+
+        def conversation_rows(count):
+            for i in range(count):
+                owner = rng.randrange(users)
+                message = rng.choice(USER_MESSAGES).format(
+                    dest=rng.choice(DESTINATIONS), days=rng.randint(2, 7), budget=rng.randint(2, 30))
+                yield (sessions[owner], f'{sessions[owner]}-chat-{rng.randrange(5)}', message,
+                       BOT_PARAGRAPH * rng.randint(1, 6), 'text',
+                       rng.randint(1, plans) if plans and rng.random() < 0.1 else None,
+                       (epoch + timedelta(seconds=i * 7)).strftime('%Y-%m-%d %H:%M:%S'))
+
+        _insert_batches(conn, """INSERT INTO conversations
+            (session_id, conversation_session_id, user_message, bot_response, message_type, plan_id, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)""", conversation_rows(conversations), batch)
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+
+    return {'users': users, 'conversations': conversations, 'plans': plans, 'seed': seed,
+            'sessions': sessions, 'user_ids': user_ids}
+
+
+def _insert_batches(conn: sqlite3.Connection, sql: str, rows, batch: int):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= batch:
+            conn.executemany(sql, chunk)
+            chunk.clear()
+    if chunk:
+        conn.executemany(sql, chunk)
+
+
+# ===== AGODA PAYLOADS =====
+
+def agoda_payloads(cassette: Optional[Path] = None) -> Dict[str, Any]:
+    """
+    Hotel and flight search responses
+
+    Taken from a recorded cassette when one is given (the largest recorded
+    response of each kind), otherwise from the offline stand-ins, which use
+    the same response shape.
+    """
+    payloads = {}
+    if cassette:
+        with gzip.open(cassette, 'rt', encoding='utf-8') as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry.get('p') != 'http' or 'r' not in entry:
+                    continue
+                # 'q' is "METHOD url" for HTTP recordings
+                url = entry['q']
+                kind = 'hotels' if 'search-overnight' in url else 'flights' if '/flights/search-' in url else None
+                if kind and len(entry['r']['body']) > len(payloads.get(kind, '')):
+                    payloads[kind] = entry['r']['body']
+        payloads = {kind: json.loads(body) for kind, body in payloads.items()}
+
+    if 'hotels' not in payloads or 'flights' not in payloads:
+        from services.stubs import LatencyProfile, StubHttpClient
+        client = StubHttpClient(LatencyProfile(0, 0), hotels_per_search=50, flights_per_search=60)
+        payloads.setdefault('hotels', client.get(
+            'https://agoda/hotels/search-overnight', params={'query': 'Đà Nẵng'}).json())
+        payloads.setdefault('flights', client.get(
+            'https://agoda/flights/search-one-way',
+            params={'origin': 'SGN', 'destination': 'DAD', 'departureDate': '2025-06-01'}).json())
+    return payloads
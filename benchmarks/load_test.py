@@ -0,0 +1,409 @@
+"""
+Concurrent user load test
+Drives a running app with virtual users at increasing concurrency. Each user
+logs in, then loops over weighted scenarios: ask-mode chats and plan
+generation over /api/chat-stream, plan listing, hotel/flight search and PDF
+download. Per concurrency step it reports request rates, error rates,
+latency and time-to-first-event percentiles, and the server's CPU, memory
+and saturation gauges.
+
+Start the app with stubbed providers first, e.g.:
+    PROVIDER_MODE=stub python backend/app.py
+
+Usage:
+    python benchmarks/load_test.py [--url http://127.0.0.1:5002] [--steps 1,5,10,25]
+                                   [--duration 60] [--db backend/data/travelmate.db]
+                                   [--pid <server pid>] [--output load.json]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import requests
+
+ASK_MESSAGES = [
+    'Đà Lạt có gì hay?', 'Nên ăn gì ở Hội An?', 'Đi Phú Quốc mùa nào đẹp?',
+    'Giá vé cáp treo Bà Nà bao nhiêu?', 'Kinh nghiệm đi Sapa tự túc'
+]
+PLAN_MESSAGES = [
+    'Tôi muốn đi Đà Lạt 3 ngày ngân sách 5 triệu', 'Lên kế hoạch đi Đà Nẵng 4 ngày ngân sách 8 triệu',
+    'Tôi muốn đi Nha Trang 2 ngày ngân sách 4 triệu', 'Tôi muốn đi Hà Nội 3 ngày ngân sách 6 triệu'
+]
+DEFAULT_MIX = 'ask=4,plan=1,browse=3,search=1,pdf=1'
+PASSWORD = 'LoadTest@123'
+GAUGES = ('http_requests_in_flight', 'sse_streams_active', 'background_queue_depth', 'db_connections_open')
+
+
+# ===== RESULTS =====
+
+class Recorder:
+    """Thread-safe collection of request samples for one step"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def add(self, name: str, started: float, ok: bool, status: Optional[int] = None,
+            first_event: Optional[float] = None, error: Optional[str] = None):
+        sample = {'seconds': time.perf_counter() - started, 'ok': ok, 'status': status}
+        if first_event is not None:
+            sample['first_event'] = first_event - started
+        if error:
+            sample['error'] = error
+        with self._lock:
+            self.samples[name].append(sample)
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        with self._lock:
+            samples = {name: list(values) for name, values in self.samples.items()}
+        result = {}
+        for name, values in sorted(samples.items()):
+            errors = [v for v in values if not v['ok']]
+            entry = {
+                'requests': len(values),
+                'per_sec': round(len(values) / elapsed, 2),
+                'error_rate': round(len(errors) / len(values), 4),
+                'latency_ms': _percentiles([v['seconds'] for v in values])
+            }
+            first_events = [v['first_event'] for v in values if 'first_event' in v]
+            if first_events:
+                entry['first_event_ms'] = _percentiles(first_events)
+            if errors:
+                reasons = defaultdict(int)
+                for v in errors:
+                    reasons[v.get('error') or f"HTTP {v['status']}"] += 1
+                entry['errors'] = dict(sorted(reasons.items(), key=lambda item: -item[1])[:5])
+            result[name] = entry
+        return result
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+
+    def pick(q):
+        return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 1)
+    return {'p50': pick(0.5), 'p90': pick(0.9), 'p95': pick(0.95), 'p99': pick(0.99),
+            'max': round(values[-1] * 1000, 1), 'mean': round(statistics.fmean(values) * 1000, 1)}
+
+
+# ===== SERVER MONITOR =====
+
+class ServerMonitor(threading.Thread):
+    """
+    Samples the server while a step runs: CPU and memory of the process
+    tree (from /proc, when --pid is given) and the saturation gauges
+    exposed on /metrics
+    """
+
+    def __init__(self, base_url: str, pid: Optional[int], interval: float = 1.0):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.pid = pid
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.peaks: Dict[str, float] = {}
+        self.rss_peak = 0
+        self.threads_peak = 0
+        self._cpu_start = self._wall_start = None
+
+    def run(self):
+        self._cpu_start, self._wall_start = self._cpu_seconds(), time.monotonic()
+        while not self.stop_event.wait(self.interval):
+            self._sample()
+        self._sample()
+        self._cpu_end, self._wall_end = self._cpu_seconds(), time.monotonic()
+
+    def stop(self) -> Dict[str, Any]:
+        self.stop_event.set()
+        self.join()
+        result: Dict[str, Any] = {'gauge_peaks': self.peaks}
+        if self.pid and self._cpu_start is not None:
+            result['cpu_percent'] = round(
+                100 * (self._cpu_end - self._cpu_start) / max(self._wall_end - self._wall_start, 1e-9), 1)
+            result['rss_peak_mb'] = round(self.rss_peak / 1024 / 1024, 1)
+            result['threads_peak'] = self.threads_peak
+        return result
+
+    def _sample(self):
+        try:
+            text = requests.get(f'{self.base_url}/metrics', timeout=5).text
+        except requests.exceptions.RequestException:
+            text = ''
+        totals: Dict[str, float] = defaultdict(float)
+        for line in text.splitlines():
+            name = line.split('{', 1)[0].split(' ', 1)[0]
+            if name in GAUGES:
+                totals[name] += float(line.rsplit(' ', 1)[1])
+        for name, value in totals.items():
+            self.peaks[name] = max(self.peaks.get(name, 0), value)
+
+        if self.pid:
+            rss = threads = 0
+            for pid in self._process_tree():
+                try:
+                    status = Path(f'/proc/{pid}/status').read_text()
+                except OSError:
+                    continue
+                for line in status.splitlines():
+                    if line.startswith('VmRSS:'):
+                        rss += int(line.split()[1]) * 1024
+                    elif line.startswith('Threads:'):
+                        threads += int(line.split()[1])
+            self.rss_peak = max(self.rss_peak, rss)
+            self.threads_peak = max(self.threads_peak, threads)
+
+    def _process_tree(self) -> List[int]:
+        """The server and its descendants (PDF workers)"""
+        children = defaultdict(list)
+        for entry in Path('/proc').iterdir():
+            if entry.name.isdigit():
+                try:
+                    stat = (entry / 'stat').read_text()
+                except OSError:
+                    continue
+                children[int(stat.rsplit(')', 1)[1].split()[1])].append(int(entry.name))
+        tree, pending = [], [self.pid]
+        while pending:
+            pid = pending.pop()
+            tree.append(pid)
+            pending.extend(children.get(pid, []))
+        return tree
+
+    def _cpu_seconds(self) -> float:
+        if not self.pid:
+            return 0.0
+        ticks = os.sysconf('SC_CLK_TCK')
+        total = 0.0
+        for pid in self._process_tree():
+            try:
+                fields = Path(f'/proc/{pid}/stat').read_text().rsplit(')', 1)[1].split()
+            except OSError:
+                continue
+            total += (int(fields[11]) + int(fields[12])) / ticks
+        return total
+
+
+# ===== VIRTUAL USERS =====
+
+class VirtualUser:
+    """One browser session looping over scenarios until the step ends"""
+
+    def __init__(self, index: int, args: argparse.Namespace, recorder: Recorder, deadline: float,
+                 mix: Dict[str, int]):
+        self.index = index
+        self.args = args
+        self.base_url = args.url.rstrip('/')
+        self.recorder = recorder
+        self.deadline = deadline
+        self.rng = random.Random(args.seed + index)
+        self.http = requests.Session()
+        self.plan_ids: List[int] = []
+        self.scenarios = list(mix)
+        self.weights = [mix[name] for name in self.scenarios]
+
+    def run(self):
+        if self.args.db:
+            self.login()
+        while time.monotonic() < self.deadline:
+            scenario = self.rng.choices(self.scenarios, self.weights)[0]
+            if scenario in ('search', 'pdf', 'browse') and not self.plan_ids:
+                scenario = 'plan'
+            try:
+                getattr(self, scenario)()
+            except requests.exceptions.RequestException as e:
+                self.recorder.add(scenario, time.perf_counter(), False, error=type(e).__name__)
+            if self.args.think_time:
+                time.sleep(self.rng.uniform(0, 2 * self.args.think_time))
+
+    def _request(self, name: str, method: str, path: str, **kwargs) -> Optional[requests.Response]:
+        started = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + path, timeout=self.args.timeout, **kwargs)
+        except requests.exceptions.RequestException as e:
+            self.recorder.add(name, started, False, error=type(e).__name__)
+            return None
+        self.recorder.add(name, started, response.ok, response.status_code)
+        return response
+
+    def _stream(self, name: str, message: str) -> Optional[Dict[str, Any]]:
+        """POST /api/chat-stream, read every event; returns the done event"""
+        started = time.perf_counter()
+        first_event = None
+        done = error = None
+        try:
+            with self.http.post(f'{self.base_url}/api/chat-stream', json={'message': message},
+                                stream=True, timeout=self.args.timeout) as response:
+                if not response.ok:
+                    self.recorder.add(name, started, False, response.status_code)
+                    return None
+                event = None
+                for line in response.iter_lines(decode_unicode=True):
+                    if line.startswith('event:'):
+                        event = line[6:].strip()
+                        first_event = first_event or time.perf_counter()
+                    elif line.startswith('data:') and event in ('done', 'error'):
+                        payload = json.loads(line[5:])
+                        if event == 'done':
+                            done = payload
+                        else:
+                            error = payload.get('type') or 'stream error'
+        except requests.exceptions.RequestException as e:
+            self.recorder.add(name, started, False, first_event=first_event, error=type(e).__name__)
+            return None
+        ok = done is not None and error is None
+        self.recorder.add(name, started, ok, 200, first_event, error if not ok else None)
+        return done
+
+    # ===== SCENARIOS =====
+
+    def login(self):
+        self._request('login', 'POST', '/api/auth/login',
+                      json={'email': f'loadtest{self.index}@example.com', 'password': PASSWORD})
+
+    def ask(self):
+        self._stream('chat_ask', self.rng.choice(ASK_MESSAGES))
+
+    def plan(self):
+        done = self._stream('chat_plan', self.rng.choice(PLAN_MESSAGES))
+        if done and done.get('plan_id'):
+            self.plan_ids.append(done['plan_id'])
+
+    def browse(self):
+        self._request('list_plans', 'GET', '/api/plans?limit=10')
+        self._request('get_plan', 'GET', f'/api/plans/{self.rng.choice(self.plan_ids)}')
+
+    def search(self):
+        plan_id = self.rng.choice(self.plan_ids)
+        self._request('search_hotels', 'POST', f'/api/plans/{plan_id}/search-hotels',
+                      json={'checkin_date': '2026-12-01', 'checkout_date': '2026-12-03'})
+        self._request('search_flights', 'POST', f'/api/plans/{plan_id}/search-flights',
+                      json={'origin': 'SGN', 'departure_date': '2026-12-01'})
+
+    def pdf(self):
+        """Download a PDF, following the 202 + poll flow when the render queue is busy"""
+        started = time.perf_counter()
+        response = self.http.get(f'{self.base_url}/api/plans/{self.rng.choice(self.plan_ids)}/download-pdf',
+                                 timeout=self.args.timeout)
+        status_url = response.headers.get('Location')
+        while response.status_code == 202 and time.perf_counter() - started < self.args.timeout:
+            time.sleep(float(response.headers.get('Retry-After', 2)))
+            response = self.http.get(self.base_url + status_url, timeout=self.args.timeout)
+            if response.status_code == 200:
+                download_url = response.json()['download_url']
+                response = self.http.get(self.base_url + download_url, timeout=self.args.timeout)
+        ok = response.ok and response.headers.get('Content-Type', '').startswith('application/pdf')
+        self.recorder.add('pdf_download', started, ok, response.status_code)
+
+
+# ===== RUNNER =====
+
+def create_accounts(db_path: Path, count: int):
+    """Make sure loadtest<i>@example.com accounts exist (written straight to the app's database)"""
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+    from database.db_manager import DatabaseManager
+
+    db = DatabaseManager(db_path)
+    created = 0
+    for i in range(count):
+        if db.get_user_by_email(f'loadtest{i}@example.com') is None:
+            user_id, error = db.create_user_account(f'loadtest{i}@example.com', f'loadtest{i}', PASSWORD,
+                                                    session_id=f'loadtest-{i}')
+            if error:
+                raise SystemExit(f"Could not create loadtest{i}: {error}")
+            created += 1
+    print(f"👥 {count} load test account(s) ready ({created} created)")
+
+
+def parse_mix(spec: str) -> Dict[str, int]:
+    mix = {}
+    for item in spec.split(','):
+        name, _, weight = item.partition('=')
+        if not hasattr(VirtualUser, name.strip()):
+            raise SystemExit(f"Unknown scenario: {name}")
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+
+def run_step(args: argparse.Namespace, users: int, mix: Dict[str, int]) -> Dict[str, Any]:
+    recorder = Recorder()
+    monitor = ServerMonitor(args.url.rstrip('/'), args.pid)
+    monitor.start()
+    started = time.monotonic()
+    deadline = started + args.duration
+    threads = [
+        threading.Thread(target=VirtualUser(i, args, recorder, deadline, mix).run, daemon=True)
+        for i in range(users)
+    ]
+    for thread in threads:
+        thread.start()
+        # Ramp up over the first tenth of the step
+        time.sleep(args.duration * 0.1 / users)
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    return {'users': users, 'seconds': round(elapsed, 1), 'requests': recorder.summary(elapsed),
+            'server': monitor.stop()}
+
+
+def print_step(step: Dict[str, Any]):
+    server = step['server']
+    resources = ', '.join(f"{name} {value:g}" for name, value in server['gauge_peaks'].items())
+    if 'cpu_percent' in server:
+        resources = (f"cpu {server['cpu_percent']}%, rss {server['rss_peak_mb']} MB, "
+                     f"threads {server['threads_peak']}; " + resources)
+    print(f"\n👥 {step['users']} user(s), {step['seconds']}s — peak {resources}")
+    print(f"{'request':<16} {'count':>7} {'req/s':>7} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'first event p50/p95':>22}")
+    for name, entry in step['requests'].items():
+        latency = entry['latency_ms']
+        first = entry.get('first_event_ms')
+        first_text = f"{first['p50']:.0f}/{first['p95']:.0f}" if first else '-'
+        print(f"{name:<16} {entry['requests']:>7} {entry['per_sec']:>7.2f} {entry['error_rate']:>7.1%} "
+              f"{latency['p50']:>9.0f} {latency['p95']:>9.0f} {latency['p99']:>9.0f} {first_text:>22}")
+        for reason, count in entry.get('errors', {}).items():
+            print(f"{'':<16} ❌ {count}x {reason}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5002')
+    parser.add_argument('--steps', default='1,5,10,25', help='Concurrent users per step')
+    parser.add_argument('--duration', type=float, default=60, help='Seconds per step')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Scenario weights')
+    parser.add_argument('--think-time', type=float, default=1.0, help='Mean pause between scenarios (s)')
+    parser.add_argument('--timeout', type=float, default=120, help='Per-request timeout (s)')
+    parser.add_argument('--db', type=Path, help="The app's database, to create login accounts in "
+                                                "(without it users stay anonymous)")
+    parser.add_argument('--pid', type=int, help='Server process id, for CPU/memory usage')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', type=Path, help='Write the results as JSON')
+    args = parser.parse_args()
+
+    steps = [int(step) for step in args.steps.split(',')]
+    mix = parse_mix(args.mix)
+    requests.get(f'{args.url.rstrip("/")}/api/health', timeout=10).raise_for_status()
+    if args.db:
+        create_accounts(args.db, max(steps))
+
+    results = []
+    for users in steps:
+        step = run_step(args, users, mix)
+        print_step(step)
+        results.append(step)
+
+    if args.output:
+        args.output.write_text(json.dumps({'url': args.url, 'mix': mix, 'duration': args.duration,
+                                           'steps': results}, indent=2), encoding='utf-8')
+        print(f"\n📄 Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+PDF rendering throughput benchmark
+Renders the same sample plan through PDFRenderService with 1..N worker
+processes and reports PDFs/sec for each pool size
+
+Usage:
+    python benchmarks/pdf_throughput.py [--jobs 40] [--max-workers 4]
+"""
+import argparse
+import multiprocessing
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from services.pdf_service import PDFRenderService  # noqa: E402
+from utils.pdf_generator import PDFCache  # noqa: E402
+
+
+def sample_plan(days: int = 5) -> dict:
+    """A plan roughly the size of a typical generated itinerary"""
+    itinerary = []
+    for day in range(1, days + 1):
+        itinerary.append({
+            'day': day,
+            'title': f'Ngày {day}: Khám phá Đà Nẵng',
+            'activities': [
+                {
+                    'time': f'{8 + i * 2:02d}:00',
+                    'title': f'Hoạt động {i + 1}',
+                    'description': 'Tham quan, ăn uống và trải nghiệm văn hóa địa phương. ' * 3,
+                    'location': 'Đà Nẵng',
+                    'cost': 150000 + i * 50000
+                }
+                for i in range(5)
+            ]
+        })
+    return {
+        'id': 1,
+        'plan_name': 'Benchmark Đà Nẵng',
+        'destination': 'Đà Nẵng',
+        'duration_days': days,
+        'start_date': '2025-06-01',
+        'end_date': f'2025-06-{days:02d}',
+        'budget': 10000000,
+        'itinerary': itinerary
+    }
+
+
+def run(workers: int, jobs: int, plan: dict) -> float:
+    """Render `jobs` PDFs with `workers` processes, return PDFs/sec"""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        service = PDFRenderService(PDFCache(cache_dir, max_files=jobs + 1),
+                                   processes=workers, max_queue=jobs)
+        try:
+            # Warm up: start the pool and initialize every worker
+            warmup = [service.submit(0, f'warmup-{i}', plan) for i in range(workers)]
+            for job in warmup:
+                job.wait()
+
+            started = time.perf_counter()
+            submitted = [service.submit(i + 1, f'bench-{i}', plan) for i in range(jobs)]
+            for job in submitted:
+                job.wait()
+            elapsed = time.perf_counter() - started
+
+            failed = [job for job in submitted if job.status != 'done']
+            if failed:
+                print(f"❌ {len(failed)} render(s) failed: {failed[0].error}")
+        finally:
+            service.close()
+
+    return jobs / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--jobs', type=int, default=40, help='PDFs rendered per pool size')
+    parser.add_argument('--max-workers', type=int, default=multiprocessing.cpu_count(),
+                        help='Largest pool size to measure')
+    parser.add_argument('--days', type=int, default=5, help='Days in the sample itinerary')
+    args = parser.parse_args()
+
+    plan = sample_plan(args.days)
+    print(f"🖨️ {args.jobs} PDFs per run, {multiprocessing.cpu_count()} CPU core(s)")
+    print(f"{'workers':>8} {'PDFs/sec':>10} {'speedup':>8}")
+
+    baseline = None
+    for workers in range(1, args.max_workers + 1):
+        rate = run(workers, args.jobs, plan)
+        baseline = baseline or rate
+        print(f"{workers:>8} {rate:>10.2f} {rate / baseline:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
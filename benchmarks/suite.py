@@ -0,0 +1,305 @@
+"""
+Backend benchmark suite
+Micro benchmarks of the hot paths (DatabaseManager CRUD and list queries on
+a large synthetic database, model JSON parsing, SSE framing, Agoda payload
+formatting) and a macro benchmark of PDF rendering. Results are written as
+JSON; `compare` flags benchmarks whose median got slower than a baseline.
+
+Usage:
+    python benchmarks/suite.py run [--output results.json] [--baseline base.json]
+                                   [--conversations 1000000] [--filter db.]
+    python benchmarks/suite.py compare base.json results.json [--threshold 0.15]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# Config refuses to load without a Gemini key unless providers are stubbed
+os.environ.setdefault('PROVIDER_MODE', 'stub')
+
+import datagen  # noqa: E402
+
+from agents.ai_agent import TravelAgent  # noqa: E402
+from services.stubs import StubProviders  # noqa: E402
+from utils.flight_search import AgodaFlightSearchAPI  # noqa: E402
+from utils.hotel_search import HotelSearcher  # noqa: E402
+from utils.sse import sse_event  # noqa: E402
+
+BENCHMARKS: List[Dict[str, Any]] = []
+
+
+def benchmark(name: str, min_time: float = 1.0, max_iterations: int = 100000):
+    """
+    Register a benchmark
+
+    The decorated function receives the shared Context and returns the
+    zero-argument callable that is timed.
+    """
+    def decorator(factory: Callable[['Context'], Callable[[], Any]]):
+        BENCHMARKS.append({'name': name, 'factory': factory, 'min_time': min_time,
+                           'max_iterations': max_iterations})
+        return factory
+    return decorator
+
+
+class Context:
+    """Data shared by the benchmarks, built once per run"""
+
+    def __init__(self, args: argparse.Namespace, workdir: Path):
+        self.rng = random.Random(args.seed)
+        self.db = datagen.prepare_database(workdir / 'bench.db')
+        started = time.perf_counter()
+        self.data = datagen.populate(self.db, args.users, args.conversations, args.plans, seed=args.seed)
+        self.populate_seconds = time.perf_counter() - started
+        self.payloads = datagen.agoda_payloads(args.cassette)
+        self.stubs = StubProviders('gemini=0/0/0,search=0/0/0,rapidapi=0/0/0,email=0/0/0')
+
+    def session(self) -> str:
+        return self.rng.choice(self.data['sessions'])
+
+    def user_id(self) -> int:
+        return self.rng.choice(self.data['user_ids'])
+
+    def plan_id(self) -> int:
+        return self.rng.randint(1, max(1, self.data['plans']))
+
+
+# ===== DATABASE =====
+
+@benchmark('db.save_conversation')
+def bench_save_conversation(ctx: Context):
+    return lambda: ctx.db.save_conversation(ctx.session(), 'Đà Lạt có gì hay?', datagen.BOT_PARAGRAPH * 3,
+                                            conversation_session_id='bench-chat')
+
+
+@benchmark('db.get_conversations')
+def bench_get_conversations(ctx: Context):
+    return lambda: ctx.db.get_conversations(ctx.session(), limit=10)
+
+
+@benchmark('db.get_chat_sessions')
+def bench_get_chat_sessions(ctx: Context):
+    return lambda: ctx.db.get_chat_sessions(session_id=ctx.session())
+
+
+@benchmark('db.save_plan')
+def bench_save_plan(ctx: Context):
+    plan = datagen.plan(ctx.rng, days=5)
+
+    def save():
+        return ctx.db.save_plan(session_id=ctx.session(), user_id=ctx.user_id(), **plan)
+    return save
+
+
+@benchmark('db.get_plan')
+def bench_get_plan(ctx: Context):
+    return lambda: ctx.db.get_plan(ctx.plan_id())
+
+
+@benchmark('db.get_plans')
+def bench_get_plans(ctx: Context):
+    return lambda: ctx.db.get_plans(user_id=ctx.user_id(), limit=10)
+
+
+@benchmark('db.update_plan')
+def bench_update_plan(ctx: Context):
+    return lambda: ctx.db.update_plan(ctx.plan_id(), {'plan_name': f'Kế hoạch {ctx.rng.random():.6f}'})
+
+
+@benchmark('db.get_stats', min_time=2.0)
+def bench_get_stats(ctx: Context):
+    return ctx.db.get_stats
+
+
+# ===== AGENT =====
+
+@benchmark('agent.parse_json_response')
+def bench_parse_json_response(ctx: Context):
+    agent = TravelAgent(api_key='', model=ctx.stubs.gemini, search_tool=ctx.stubs.search_tool())
+    text = datagen.gemini_plan_output(ctx.rng, days=14)
+    return lambda: agent._parse_json_response(text)
+
+
+# ===== STREAMING =====
+
+@benchmark('sse.chat_stream_framing')
+def bench_sse_framing(ctx: Context):
+    """One streamed plan answer: status events, ~400 text chunks, the plan and done"""
+    plan = datagen.plan(ctx.rng, days=5)
+    words = (datagen.BOT_PARAGRAPH * 20).split(' ')
+    done = {'conversation_id': 1, 'has_plan': True, 'plan_id': 1, 'llm': {'calls': 6}, 'timing': None}
+
+    def frame():
+        size = len(sse_event('thinking', {'status': 'analyzing'}))
+        for word in words:
+            size += len(sse_event('message', {'text': word + ' '}))
+        size += len(sse_event('plan', plan))
+        size += len(sse_event('done', done))
+        return size
+    return frame
+
+
+# ===== AGODA =====
+
+@benchmark('hotels.format_hotel_info')
+def bench_format_hotels(ctx: Context):
+    searcher = HotelSearcher(api_key='bench', http_client=ctx.stubs.http)
+    payload = ctx.payloads['hotels']
+    return lambda: [searcher.format_hotel_info(hotel) for hotel in searcher.extract_hotels(payload)]
+
+
+@benchmark('flights.extract_flight_info')
+def bench_extract_flights(ctx: Context):
+    api = AgodaFlightSearchAPI(api_key='bench', http_client=ctx.stubs.http)
+    payload = ctx.payloads['flights']
+    return lambda: api.extract_flight_info(payload)
+
+
+# ===== PDF =====
+
+@benchmark('pdf.render', min_time=5.0, max_iterations=50)
+def bench_pdf_render(ctx: Context):
+    from utils.pdf_generator import TravelPlanPDFGenerator
+    generator = TravelPlanPDFGenerator()
+    plan = dict(datagen.plan(ctx.rng, days=5), id=1)
+    return lambda: generator.generate_pdf(plan)
+
+
+# ===== RUNNER =====
+
+def measure(func: Callable[[], Any], min_time: float, max_iterations: int, warmup: int = 3) -> Dict[str, float]:
+    """Call `func` until `min_time` has passed; per-call statistics in milliseconds"""
+    for _ in range(warmup):
+        func()
+    durations = []
+    deadline = time.perf_counter() + min_time
+    while len(durations) < max_iterations and (len(durations) < 5 or time.perf_counter() < deadline):
+        started = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started)
+    durations.sort()
+    median = statistics.median(durations)
+    return {
+        'iterations': len(durations),
+        'median_ms': round(median * 1000, 4),
+        'p95_ms': round(durations[int(0.95 * (len(durations) - 1))] * 1000, 4),
+        'mean_ms': round(statistics.fmean(durations) * 1000, 4),
+        'min_ms': round(durations[0] * 1000, 4),
+        'ops_per_sec': round(1 / median, 2) if median else None
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    selected = [b for b in BENCHMARKS if not args.filter or any(f in b['name'] for f in args.filter)]
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f"🧪 Generating {args.users} users, {args.conversations} conversations, {args.plans} plans...")
+        ctx = Context(args, Path(workdir))
+        print(f"   done in {ctx.populate_seconds:.1f}s")
+        print(f"{'benchmark':<32} {'median ms':>12} {'p95 ms':>12} {'ops/sec':>12} {'runs':>8}")
+        for bench in selected:
+            try:
+                func = bench['factory'](ctx)
+            except ImportError as e:
+                print(f"{bench['name']:<32} skipped ({e})")
+                continue
+            stats = measure(func, bench['min_time'] * args.time_factor, bench['max_iterations'])
+            results[bench['name']] = stats
+            print(f"{bench['name']:<32} {stats['median_ms']:>12.4f} {stats['p95_ms']:>12.4f} "
+                  f"{stats['ops_per_sec'] or 0:>12.1f} {stats['iterations']:>8}")
+
+    return {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'data': {'users': args.users, 'conversations': args.conversations, 'plans': args.plans,
+                     'seed': args.seed, 'cassette': str(args.cassette) if args.cassette else None}
+        },
+        'results': results
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """Print a comparison table; returns the names of regressed benchmarks"""
+    regressions = []
+    print(f"{'benchmark':<32} {'baseline ms':>12} {'current ms':>12} {'change':>9}")
+    for name, stats in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            print(f"{name:<32} {'-':>12} {stats['median_ms']:>12.4f} {'new':>9}")
+            continue
+        change = stats['median_ms'] / base['median_ms'] - 1 if base['median_ms'] else 0.0
+        flag = ''
+        if change > threshold:
+            flag = '  ❌ regression'
+            regressions.append(name)
+        elif change < -threshold:
+            flag = '  ✅ faster'
+        print(f"{name:<32} {base['median_ms']:>12.4f} {stats['median_ms']:>12.4f} {change:>+8.1%}{flag}")
+    if baseline['meta'].get('data') != current['meta'].get('data'):
+        print("⚠️ Baseline was generated with different data settings")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Run the benchmarks')
+    run_parser.add_argument('--output', type=Path, default=Path('benchmark-results.json'))
+    run_parser.add_argument('--baseline', type=Path, help='Compare against this results file afterwards')
+    run_parser.add_argument('--threshold', type=float, default=0.15, help='Median slowdown flagged (0.15 = 15%%)')
+    run_parser.add_argument('--filter', action='append', help='Only benchmarks whose name contains this')
+    run_parser.add_argument('--users', type=int, default=2000)
+    run_parser.add_argument('--conversations', type=int, default=200000)
+    run_parser.add_argument('--plans', type=int, default=20000)
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--cassette', type=Path, help='Take Agoda payloads from a recorded cassette')
+    run_parser.add_argument('--time-factor', type=float, default=1.0,
+                            help='Scale the time spent per benchmark (e.g. 0.2 for a quick pass)')
+
+    compare_parser = commands.add_parser('compare', help='Compare two results files')
+    compare_parser.add_argument('baseline', type=Path)
+    compare_parser.add_argument('current', type=Path)
+    compare_parser.add_argument('--threshold', type=float, default=0.15)
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        current = run(args)
+        args.output.write_text(json.dumps(current, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"📄 Results written to {args.output}")
+        baseline_path = args.baseline
+    else:
+        current = json.loads(args.current.read_text(encoding='utf-8'))
+        baseline_path = args.baseline
+
+    if baseline_path:
+        regressions = compare(json.loads(baseline_path.read_text(encoding='utf-8')), current, args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+        print("✅ No regressions")
+
+
+if __name__ == '__main__':
+    main()
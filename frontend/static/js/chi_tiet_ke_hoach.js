@@ -1098,16 +1098,18 @@ function renderSummaryTab(plan) {
     if (startDateEl) startDateEl.textContent = plan.start_date || '-';
     if (groupEl) groupEl.textContent = plan.group_type || '-';
     
-    // Calculate ACTUAL cost from itinerary activities
+    // ACTUAL cost of the itinerary activities (summed by the server for normalized plans)
     const itinerary = Array.isArray(plan.itinerary) ? plan.itinerary : [];
-    let actualCost = 0;
+    let actualCost = typeof plan.activities_cost === 'number' ? plan.activities_cost : 0;
     
-    itinerary.forEach(day => {
-        const activities = day.activities || [];
-        activities.forEach(activity => {
-            actualCost += (activity.cost || 0);
+    if (typeof plan.activities_cost !== 'number') {
+        itinerary.forEach(day => {
+            const activities = day.activities || [];
+            activities.forEach(activity => {
+                actualCost += (activity.cost || 0);
+            });
         });
-    });
+    }
     
     console.log('Calculated actual cost from itinerary:', actualCost);
     console.log('Plan budget:', plan.budget);
@@ -1755,7 +1757,25 @@ if (downloadButton) {
             downloadButton.innerHTML = '<span class="material-symbols-outlined animate-spin">progress_activity</span><span class="truncate">Đang tạo PDF...</span>';
             
             // Call API to download PDF
-            const response = await fetch(`/api/plans/${planId}/download-pdf`);
+            let response = await fetch(`/api/plans/${planId}/download-pdf`);
+            
+            // 202: PDF is queued for rendering, poll until it is ready
+            while (response.status === 202) {
+                const { status_url } = await response.json();
+                await new Promise(resolve => setTimeout(resolve, 2000));
+                
+                const jobResponse = await fetch(status_url);
+                if (jobResponse.status === 202) {
+                    response = jobResponse;
+                    continue;
+                }
+                
+                const job = await jobResponse.json();
+                if (!jobResponse.ok || !job.success) {
+                    throw new Error(job.error || 'Không thể tải PDF');
+                }
+                response = await fetch(job.download_url);
+            }
             
             if (!response.ok) {
                 throw new Error('Không thể tải PDF');
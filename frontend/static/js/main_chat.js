@@ -307,6 +307,9 @@ async function handleSendMessage() {
                             const text = data.text || '';
                             fullResponse += text;
                             appendToStreamingMessage(streamingMsg, text);
+                        } else if (eventType === 'activity') {
+                            // Itinerary activity, sent while its day is still generating
+                            appendActivityPreview(thinkingMsg, data);
                         } else if (eventType === 'plan') {
                             // Plan data received
                             hasPlan = true;
@@ -595,6 +598,26 @@ function updateThinkingMessage(msgElement, status) {
     }
 }
 
+// List activities in the thinking bubble as they are generated
+function appendActivityPreview(msgElement, data) {
+    if (!msgElement || !msgElement.parentNode || !data.activity) return;
+    const bubble = msgElement.querySelector('.thinking-bubble');
+    if (!bubble) return;
+
+    let list = bubble.querySelector('.activity-preview');
+    if (!list) {
+        list = document.createElement('ul');
+        list.className = 'activity-preview mt-2 space-y-1 text-sm text-gray-600 dark:text-gray-300';
+        bubble.appendChild(list);
+    }
+
+    const item = document.createElement('li');
+    const time = data.activity.time ? `${escapeHtml(data.activity.time)} · ` : '';
+    item.innerHTML = `<span class="font-medium">Ngày ${Number(data.day) || ''}</span> ${time}${escapeHtml(data.activity.title || '')}`;
+    list.appendChild(item);
+    scrollToBottom();
+}
+
 // Create streaming bot message element
 function createStreamingBotMessage() {
     const msgDiv = document.createElement('div');
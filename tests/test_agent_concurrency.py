@@ -0,0 +1,133 @@
+"""
+Concurrent chat streams on one shared TravelAgent
+Every request carries its own history and summary (tagged with a per-request
+marker); no prompt may mix two requests' conversations, and each request's
+history-aware prompts must contain its own.
+"""
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+# Offline providers; backend modules are imported the way app.py imports them
+os.environ.setdefault('PROVIDER_MODE', 'stub')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+from agents.ai_agent import TravelAgent  # noqa: E402
+from agents.context import AgentContext  # noqa: E402
+from services.stubs import StubProviders  # noqa: E402
+
+REQUESTS = 48
+WORKERS = 16
+MARKER = re.compile(r'KHACH-\d{3}')
+INTENT_MARKER = '"mode": "plan|ask|edit_plan|chat"'
+REQUIREMENTS_MARKER = 'HÃY PHÂN TÍCH:'
+
+
+class RecordingModel:
+    """Stub Gemini model that records prompts with a random delay, to shuffle interleavings"""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        with self._lock:
+            self.prompts.append(prompt)
+        time.sleep(random.uniform(0, 0.004))
+        return self.inner.generate_content(prompt, stream=stream, **kwargs)
+
+
+@pytest.fixture
+def agent():
+    stubs = StubProviders('gemini=0/0/0,search=0/0/0,rapidapi=0/0/0,email=0/0/0', seed=1)
+    travel_agent = TravelAgent(api_key='', model=RecordingModel(stubs.gemini),
+                               search_tool=stubs.search_tool())
+    stubs.bind_agent(travel_agent)
+    return travel_agent
+
+
+def _request(i):
+    tag = f'KHACH-{i:03d}'
+    if i % 2:
+        message = f'Lên kế hoạch đi Đà Lạt 2 ngày, ngân sách 5 triệu ({tag})'
+    else:
+        message = f'Đà Lạt có gì vui? ({tag})'
+    return tag, {
+        'user_message': message,
+        'conversation_history': [{'user': f'Mình là {tag}', 'bot': f'Chào {tag}!'}],
+        'conversation_summary': f'- Người dùng {tag} thích cà phê',
+    }
+
+
+def _run(agent, i, with_intent):
+    tag, kwargs = _request(i)
+    if with_intent:
+        # Routed by the caller, without requirements: the plan handler
+        # extracts them itself from the request's history
+        mode = 'plan' if i % 2 else 'ask'
+        kwargs['intent_analysis'] = {'mode': mode, 'clean_message': kwargs['user_message']}
+    return tag, list(agent.chat_stream(**kwargs))
+
+
+def _prompt_markers(prompts):
+    return [set(MARKER.findall(prompt)) for prompt in prompts]
+
+
+@pytest.mark.parametrize('with_intent', [False, True])
+def test_parallel_streams_keep_their_own_history(agent, with_intent):
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        results = list(pool.map(lambda i: _run(agent, i, with_intent), range(REQUESTS)))
+
+    for markers in _prompt_markers(agent.model.prompts):
+        assert len(markers) <= 1, f'prompt mixes requests: {sorted(markers)}'
+
+    marker = REQUIREMENTS_MARKER if with_intent else INTENT_MARKER
+    history_prompts = [p for p in agent.model.prompts if marker in p]
+    for tag, events in results:
+        assert events, tag
+        own = [p for p in history_prompts if f'Chào {tag}!' in p]
+        if with_intent and tag.endswith(('0', '2', '4', '6', '8')):
+            # Ask mode: no history-aware prompt
+            assert not own
+        else:
+            assert len(own) == 1, tag
+            assert f'Người dùng {tag} thích cà phê' in own[0]
+
+
+def test_precomputed_intent_is_not_analysed_again(agent):
+    _, kwargs = _request(0)
+    intent = agent.analyze_intent(**kwargs)
+    prompts_before = len(agent.model.prompts)
+
+    events = list(agent.chat_stream(**kwargs, intent_analysis=intent))
+
+    assert events
+    assert not any(INTENT_MARKER in p for p in agent.model.prompts[prompts_before:])
+
+
+def test_agent_holds_no_conversation_state(agent):
+    _, kwargs = _request(1)
+    list(agent.chat_stream(**kwargs))
+    assert not hasattr(agent, 'conversation_history')
+    assert not hasattr(agent, 'conversation_summary')
+
+
+def test_context_is_immutable():
+    history = [{'user': 'Xin chào', 'bot': 'Chào bạn!'}]
+    ctx = AgentContext.create('Đà Lạt có gì vui?', history, conversation_summary='- tóm tắt')
+    history[0]['user'] = 'đã đổi'
+
+    assert ctx.history[0]['user'] == 'Xin chào'
+    with pytest.raises(TypeError):
+        ctx.history[0]['user'] = 'x'
+    with pytest.raises(AttributeError):
+        ctx.summary = 'x'
+    assert ctx.with_intent({'mode': 'ask'}).intent == {'mode': 'ask'}
+    assert ctx.intent is None
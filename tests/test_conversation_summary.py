@@ -0,0 +1,54 @@
+"""
+Conversation summaries are owned by a session
+A conversation session id comes from the request body: another session
+sending the same id must neither see the owner's summary nor fold its own
+turns into the owner's row.
+"""
+import os
+import sys
+
+import pytest
+
+# Offline providers; backend modules are imported the way app.py imports them
+os.environ.setdefault('PROVIDER_MODE', 'stub')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+from agents.conversation_summary import ConversationSummaries, ConversationSummarizer  # noqa: E402
+from database.db_manager import DatabaseManager  # noqa: E402
+
+CONVERSATION = 'conv-shared'
+
+
+@pytest.fixture
+def summaries(tmp_path):
+    db = DatabaseManager(tmp_path / 'travelmate.db')
+    return ConversationSummaries(db, ConversationSummarizer())
+
+
+def _say(db, session_id, *messages):
+    for message in messages:
+        db.save_conversation(session_id, message, f'Trả lời: {message}',
+                             conversation_session_id=CONVERSATION)
+
+
+def test_summary_is_private_to_its_session(summaries):
+    db = summaries.db
+    _say(db, 'session-a', 'Mình muốn đi Đà Lạt', 'Ngân sách 5 triệu', 'Đi 3 ngày')
+    assert summaries.update('session-a', CONVERSATION)
+    owner_row = db.get_conversation_summary('session-a', CONVERSATION)
+    assert 'Đà Lạt' in owner_row['summary']
+
+    # Session B reuses A's conversation session id
+    _say(db, 'session-b', 'Cho mình đi Phú Quốc', 'Ở 2 đêm', 'Có resort không?')
+    summary, turns = summaries.context('session-b', CONVERSATION)
+    assert summary == ''
+    assert [turn['user'] for turn in turns] == ['Cho mình đi Phú Quốc', 'Ở 2 đêm', 'Có resort không?']
+
+    assert not summaries.update('session-b', CONVERSATION)
+    assert db.get_conversation_summary('session-a', CONVERSATION) == owner_row
+    assert db.get_conversation_summary('session-b', CONVERSATION) is None
+
+    # A's latest turn is still the raw one after its summary
+    summary, turns = summaries.context('session-a', CONVERSATION)
+    assert 'Phú Quốc' not in summary
+    assert [turn['user'] for turn in turns] == ['Đi 3 ngày']
@@ -0,0 +1,71 @@
+"""
+Open LLM circuit breaker
+With the breaker open no Gemini call is made: every TravelAgent call site
+must go straight to its fallback, without the retry delays and without
+counting retries.
+"""
+import os
+import sys
+
+import pytest
+
+# Offline providers; backend modules are imported the way app.py imports them
+os.environ.setdefault('PROVIDER_MODE', 'stub')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+from agents import ai_agent as ai_agent_module  # noqa: E402
+from agents import instrumentation as llm_metrics  # noqa: E402
+from agents.ai_agent import TravelAgent  # noqa: E402
+from services.stubs import StubProviders  # noqa: E402
+from utils.circuit_breaker import OPEN, CircuitBreaker  # noqa: E402
+
+PLAN = {
+    'plan_name': 'Khám phá Đà Lạt',
+    'destination': 'Đà Lạt',
+    'duration_days': 1,
+    'itinerary': [{'day': 1, 'title': 'Ngày 1', 'activities': [
+        {'time': '07:00', 'type': 'breakfast', 'title': 'Bánh căn', 'description': '', 'cost': 50000}
+    ]}]
+}
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    breaker = CircuitBreaker('gemini-test', failure_threshold=1, reset_timeout=600)
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    monkeypatch.setattr(llm_metrics, 'LLM_BREAKER', breaker)
+
+    # Word-by-word streaming sleeps a few ms; a retry delay is seconds
+    delays = []
+    monkeypatch.setattr(ai_agent_module.time, 'sleep', lambda seconds: delays.append(seconds))
+
+    stubs = StubProviders('gemini=0/0/0,search=0/0/0,rapidapi=0/0/0,email=0/0/0', seed=1)
+    travel_agent = TravelAgent(api_key='', model=stubs.gemini, search_tool=stubs.search_tool(),
+                               speculative_search=False)
+    stubs.bind_agent(travel_agent)
+    travel_agent.delays = delays
+    return travel_agent
+
+
+@pytest.mark.parametrize('message, current_plan', [
+    ('Đà Lạt có gì vui?', None),
+    ('Lên kế hoạch đi Đà Lạt 2 ngày, ngân sách 5 triệu', None),
+    ('Sửa bữa sáng ngày 1 thành phở', PLAN),
+])
+def test_open_breaker_falls_back_without_retries(agent, message, current_plan):
+    with llm_metrics.track_llm_usage() as usage:
+        events = list(agent.chat_stream(message, current_plan=current_plan))
+
+    assert events
+    assert usage.calls == 0
+    assert usage.retries == 0
+    assert not [seconds for seconds in agent.delays if seconds >= 1]
+
+
+def test_open_breaker_outline_and_day_return_none(agent):
+    requirements = {'destination': 'Đà Lạt', 'duration_days': 2, 'budget': 5000000}
+
+    assert agent._generate_plan_outline(requirements, '') is None
+    assert agent._drain(agent._stream_single_day(1, 'Đà Lạt', 'Khám phá', '')) is None
+    assert not [seconds for seconds in agent.delays if seconds >= 1]
@@ -0,0 +1,168 @@
+"""
+Two-stage plan editing without the model
+Stage 1 must find the days and activities a real edit request names (and
+nothing else: dates are not day numbers); stage 2 must keep only the
+operations that fit the days sent and apply them against the indexes the
+model saw.
+"""
+import copy
+import os
+import sys
+
+import pytest
+
+# Offline providers; backend modules are imported the way app.py imports them
+os.environ.setdefault('PROVIDER_MODE', 'stub')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+from agents.plan_edit import apply_operations, locate, locate_days, validate_operations  # noqa: E402
+
+
+def _activity(time, type_, title, cost=0):
+    return {'time': time, 'type': type_, 'title': title, 'description': '', 'cost': cost}
+
+
+PLAN = {
+    'plan_name': 'Khám phá Đà Lạt',
+    'destination': 'Đà Lạt',
+    'duration_days': 3,
+    'itinerary': [
+        {'day': 1, 'title': 'Trung tâm', 'activities': [
+            _activity('07:00', 'breakfast', 'Bánh căn', 50000),
+            _activity('09:00', 'sightseeing', 'Hồ Xuân Hương'),
+            _activity('12:00', 'lunch', 'Cơm lam', 120000),
+            _activity('19:00', 'dinner', 'Lẩu gà lá é', 250000),
+        ]},
+        {'day': 2, 'title': 'Ngoại ô', 'activities': [
+            _activity('07:30', 'breakfast', 'Phở bò', 60000),
+            _activity('10:00', 'sightseeing', 'Thung lũng Tình Yêu', 100000),
+            _activity('18:30', 'dinner', 'Nướng ngói', 300000),
+        ]},
+        {'day': 3, 'title': 'Mua sắm', 'activities': [
+            _activity('08:00', 'cafe', 'Cà phê Mê Linh', 80000),
+            _activity('11:30', 'shopping', 'Chợ Đà Lạt'),
+        ]},
+    ]
+}
+
+
+# ===== STAGE 1: LOCATE =====
+
+@pytest.mark.parametrize('message, days, activities, source', [
+    ('Đổi bữa sáng ngày 2 thành bánh mì', [2], [(2, 0)], 'rules'),
+    ('Bỏ Thung lũng Tình Yêu đi, mình không thích', [2], [(2, 1)], 'rules'),
+    ('Ngày thứ hai ăn tối chỗ khác nhé', [2], [(2, 2)], 'rules'),
+    # No lunch on day 2; day 3 has no lunch activity but one at 11:30
+    ('Ngày 1-2 đổi bữa trưa rẻ hơn', [1, 2], [(1, 2)], 'rules'),
+    ('Ngày 3 bữa trưa ăn gì khác', [3], [(3, 1)], 'rules'),
+    ('Ngày cuối thêm một quán cà phê', [3], [], 'rules'),
+    ('Sửa các ngày 2 và 3 cho nhẹ nhàng hơn', [2, 3], [], 'rules'),
+    ('Đổi các ngày cho bớt di chuyển', [1, 2, 3], [], 'all'),
+    ('Giảm chi phí cho tất cả các ngày', [1, 2, 3], [], 'all'),
+])
+def test_locate_finds_the_named_days_and_activities(message, days, activities, source):
+    target = locate(message, PLAN)
+
+    assert target is not None
+    assert (target.days, target.activities, target.source) == (days, activities, source)
+
+
+@pytest.mark.parametrize('message', [
+    'Đổi bữa sáng ngày 20/12 thành phở',
+    'Chuyến đi ngày 2.12 có gì cần sửa không?',
+    'Cho lịch trình thú vị hơn',
+])
+def test_locate_leaves_dates_and_vague_requests_to_the_model(message):
+    assert locate(message, PLAN) is None
+
+
+@pytest.mark.parametrize('message, expected', [
+    ('Sửa ngày 2.', ([2], False)),
+    ('Ngày 1 và 3 dậy muộn hơn', ([1, 3], False)),
+    ('Ngày 12 đi đâu?', ([], False)),
+    ('Ngày 2 đến 4 bớt đi', ([2, 3], False)),
+])
+def test_locate_days(message, expected):
+    assert locate_days(message, 3) == expected
+
+
+# ===== STAGE 2: PATCH =====
+
+def test_validate_operations_keeps_only_applicable_ones():
+    data = {'operations': [
+        {'op': 'replace', 'day': 2, 'index': 0, 'activity': {'time': '07:30', 'type': 'breakfast',
+                                                              'title': 'Bánh mì xíu mại', 'cost': '40.000đ'}},
+        {'op': 'insert', 'day': 2, 'index': 3, 'activity': {'time': '21:00', 'title': 'Chợ đêm'}},
+        {'op': 'update', 'day': 2, 'index': 2, 'fields': {'cost': '200.000đ', 'rating': 5}},
+        {'op': 'remove', 'day': 1, 'index': 0},                    # day not sent
+        {'op': 'replace', 'day': 2, 'index': 3, 'activity': {'title': 'Ngoài danh sách'}},
+        {'op': 'remove', 'day': 2, 'index': -1},
+        {'op': 'insert', 'day': 2, 'index': 1, 'activity': {'time': '09:00'}},  # no title
+        {'op': 'update', 'day': 2, 'index': 1, 'fields': {'rating': 5}},        # nothing editable
+        {'op': 'move', 'day': 2, 'index': 1},
+    ]}
+
+    operations, dropped = validate_operations(data, PLAN, [2])
+
+    assert dropped
+    assert [(op['op'], op['day'], op['index']) for op in operations] == [
+        ('replace', 2, 0), ('insert', 2, 3), ('update', 2, 2)
+    ]
+    assert operations[0]['activity']['cost'] == 40000
+    assert operations[2]['fields'] == {'cost': 200000}
+
+
+def test_validate_operations_without_a_list():
+    assert validate_operations({'plan': PLAN}, PLAN, [1]) == (None, False)
+
+
+def test_apply_uses_the_indexes_the_model_saw():
+    operations = [
+        {'op': 'remove', 'day': 1, 'index': 0},
+        {'op': 'update', 'day': 1, 'index': 3, 'fields': {'cost': 200000}},
+        {'op': 'insert', 'day': 1, 'index': 2, 'activity': _activity('10:30', 'cafe', 'Cà phê Tùng')},
+    ]
+
+    modified, log = apply_operations(PLAN, operations)
+
+    assert [a['title'] for a in modified['itinerary'][0]['activities']] == [
+        'Hồ Xuân Hương', 'Cà phê Tùng', 'Cơm lam', 'Lẩu gà lá é'
+    ]
+    assert modified['itinerary'][0]['activities'][3]['cost'] == 200000
+    assert len(log) == 3
+
+
+def test_apply_remove_and_insert_at_one_index_replaces():
+    operations = [
+        {'op': 'insert', 'day': 2, 'index': 0, 'activity': _activity('07:30', 'breakfast', 'Bánh mì')},
+        {'op': 'remove', 'day': 2, 'index': 0},
+    ]
+
+    modified, _ = apply_operations(PLAN, operations)
+
+    assert [a['title'] for a in modified['itinerary'][1]['activities']] == [
+        'Bánh mì', 'Thung lũng Tình Yêu', 'Nướng ngói'
+    ]
+
+
+def test_apply_inserts_at_one_index_keep_their_order():
+    operations = [
+        {'op': 'insert', 'day': 3, 'index': 2, 'activity': _activity('14:00', 'sightseeing', 'Ga Đà Lạt')},
+        {'op': 'insert', 'day': 3, 'index': 2, 'activity': _activity('16:00', 'sightseeing', 'Đồi chè Cầu Đất')},
+        {'op': 'insert', 'day': 3, 'index': 0, 'activity': _activity('06:00', 'sightseeing', 'Ngắm bình minh')},
+    ]
+
+    modified, _ = apply_operations(PLAN, operations)
+
+    assert [a['title'] for a in modified['itinerary'][2]['activities']] == [
+        'Ngắm bình minh', 'Cà phê Mê Linh', 'Chợ Đà Lạt', 'Ga Đà Lạt', 'Đồi chè Cầu Đất'
+    ]
+
+
+def test_apply_leaves_the_plan_untouched():
+    original = copy.deepcopy(PLAN)
+
+    apply_operations(PLAN, [{'op': 'remove', 'day': 1, 'index': 0},
+                            {'op': 'update', 'day': 2, 'index': 0, 'fields': {'title': 'Bún bò'}}])
+
+    assert PLAN == original
@@ -0,0 +1,81 @@
+"""
+Speculative destination searches are released exactly once
+The search analyze_intent() starts is taken by the plan handler when the
+plan is for the same place, and discarded on every other exit: another
+destination, missing requirements, a caller that blocks the request.
+"""
+import os
+import sys
+
+import pytest
+
+# Offline providers; backend modules are imported the way app.py imports them
+os.environ.setdefault('PROVIDER_MODE', 'stub')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+from agents.ai_agent import TravelAgent  # noqa: E402
+from services.stubs import StubProviders  # noqa: E402
+
+MESSAGE = 'Lên kế hoạch đi Đà Lạt 2 ngày, ngân sách 5 triệu'
+
+
+@pytest.fixture
+def agent():
+    stubs = StubProviders('gemini=0/0/0,search=0/0/0,rapidapi=0/0/0,email=0/0/0', seed=1)
+    travel_agent = TravelAgent(api_key='', model=stubs.gemini, search_tool=stubs.search_tool())
+    stubs.bind_agent(travel_agent)
+    return travel_agent
+
+
+def _plan_intent(agent, **requirements):
+    intent = agent.analyze_intent(MESSAGE)
+    assert intent['mode'] == 'plan'
+    assert intent['speculative_destination'] == 'Đà Lạt'
+    assert agent.speculative_searches.pending() == 1
+    if requirements:
+        intent['requirements'] = dict({'destination': 'Đà Lạt', 'duration_days': 2, 'budget': 5000000},
+                                      **requirements)
+    return intent
+
+
+def test_same_destination_takes_the_search(agent):
+    list(agent.chat_stream(MESSAGE, intent_analysis=_plan_intent(agent)))
+
+    assert agent.speculative_searches.pending() == 0
+    assert agent.speculative_searches.stats['hits'] == 1
+
+
+@pytest.mark.parametrize('requirements', [
+    # The history named another city
+    {'destination': 'Nha Trang'},
+    # Still waiting for the duration and budget
+    {'duration_days': None, 'budget': None},
+])
+def test_plan_without_the_speculated_search_discards_it(agent, requirements):
+    intent = _plan_intent(agent, **requirements)
+
+    assert list(agent.chat_stream(MESSAGE, intent_analysis=intent))
+    assert agent.chat(MESSAGE, intent_analysis=_plan_intent(agent, **requirements))['success']
+
+    assert agent.speculative_searches.pending() == 0
+    assert agent.speculative_searches.stats['discarded'] == 2
+    assert agent.speculative_searches.stats['hits'] == 0
+
+
+def test_blocked_request_discards_its_search(agent):
+    agent.discard_speculative_search(_plan_intent(agent))
+
+    assert agent.speculative_searches.pending() == 0
+
+
+def test_discard_keeps_another_requests_claim(agent):
+    waiting = _plan_intent(agent)
+    other = _plan_intent(agent, destination='Nha Trang')
+    assert agent.speculative_searches.pending() == 1
+
+    list(agent.chat_stream(MESSAGE, intent_analysis=other))
+    assert agent.speculative_searches.pending() == 1
+
+    list(agent.chat_stream(MESSAGE, intent_analysis=waiting))
+    assert agent.speculative_searches.pending() == 0
+    assert agent.speculative_searches.stats['hits'] == 1